@@ -0,0 +1,9 @@
+'''
+Benchmarks for the weight tools. They run headless against the Maya stand-in in stubs/, on synthetic weight files and
+scenes, so they can be run anywhere and compared between releases:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json
+
+See benchmarks.run for the options.
+'''
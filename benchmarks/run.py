@@ -0,0 +1,531 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from timeit import default_timer as timer
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The benchmarks always run against the Maya stand-in, so it has to come before anything else called maya.
+for directory in (ROOT, os.path.join(ROOT, 'stubs')):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+from maya import cmds
+from benchmarks import synthetic
+from utils import binary_utils
+from utils import index_utils
+from utils import math_utils
+from utils import skin_utils
+from utils import transfer_utils
+from utils import xml_utils
+from utils import weight_utils
+
+'''
+Times check_weights, remap_weights, the nearest vertex transfer, bulk skinCluster reads and writes and the path
+resolution weight_import does, on synthetic files from 1k to 500k points and 10 to 500 joints, and writes throughput,
+latency and peak memory to JSON. Give --compare a previous results file to flag anything that got slower or bigger;
+the exit code is 1 if something did.
+
+Generated files are kept in --work-dir and reused by later runs. Peak memory is what tracemalloc traces where it
+exists. mayapy and the other Python 2 interpreters the tools run on don't have it, so there each case runs once more
+in a fresh interpreter and its peak is how far that interpreter's resident set grew (see probe_memory). Without
+the resource module (Windows) it is null. The two aren't comparable, so --compare only compares memory measured the
+same way.
+'''
+
+FORMAT_VERSION = 1
+POINTS = [1000, 10000, 100000, 500000]
+JOINTS = [10, 100, 500]
+MESHES = [100, 1000]
+QUICK_POINTS = [1000, 10000]
+QUICK_JOINTS = [10, 100]
+QUICK_MESHES = [100]
+# Joints folded into others by the remap cases.
+REMAP_SOURCE = ['joint0', 'joint1']
+REMAP_TARGET = ['joint2', 'joint3']
+# Most vertices the transfer cases transfer onto, and how many neighbours they blend.
+TRANSFER_POINTS = 10000
+TRANSFER_NEIGHBOURS = 4
+# Bytes per unit of ru_maxrss, which Linux reports in kilobytes and macOS in bytes.
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+# Resident set growth comes in whole pages and moves with the allocator, so smaller changes than this don't count.
+RSS_SLACK = 1048576
+# What a probe prints its result after.
+PROBE_PREFIX = 'probe peak_memory: '
+# The case group running now and how many times it has called measure, so probe_memory can ask a fresh interpreter
+# to run the same group and measure only that call.
+_group = {'name': None, 'kwargs': None, 'calls': 0}
+# Set in that fresh interpreter to the call to measure, every other call is skipped.
+_probe = {'call': None}
+
+
+class ProbeDone(Exception):
+    '''
+    Raised in a probe once the case it runs has been measured, with the growth in bytes as its argument.
+    '''
+
+
+def measure(function, repeat=3, setup=None):
+    '''
+    Times function repeat times, then runs it once more for its peak memory, under tracemalloc or failing that in a
+    fresh interpreter (see memory_source). Measuring slows everything down, so it is kept out of the timed runs.
+    setup is called before every run and isn't timed.
+    :param function:
+    :param repeat:
+    :param setup:
+    :return: {'runs': [seconds, ...], 'seconds': {'min', 'median', 'mean'}, 'peak_memory': bytes or None}
+    '''
+    call = _group['calls']
+    _group['calls'] += 1
+    if _probe['call'] is not None:
+        return probe_case(call, function, setup)
+    runs = []
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        start_time = timer()
+        function()
+        runs.append(timer() - start_time)
+    peak_memory = None
+    if tracemalloc is not None:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            function()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    else:
+        peak_memory = probe_memory(call)
+    ordered = sorted(runs)
+    middle = len(ordered) // 2
+    median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2.0
+    return {'runs': runs, 'seconds': {'min': ordered[0], 'median': median, 'mean': sum(runs) / len(runs)},
+            'peak_memory': peak_memory}
+
+
+def memory_source():
+    '''
+    Returns how measure gets peak memory here: 'tracemalloc', 'rss' or None.
+    :return:
+    '''
+    if tracemalloc is not None:
+        return 'tracemalloc'
+    if resource is not None:
+        return 'rss'
+    return None
+
+
+def probe_memory(call):
+    '''
+    Runs the case behind the current group's call'th measure call again on its own, in a fresh interpreter, and
+    returns how far its peak resident set size grew while it ran, in bytes. A fresh heap has nothing lying free for
+    the case to reuse, so unlike in this process the growth is what the case needed.
+    :param call:
+    :return: bytes, or None where there is no resource module or the probe failed.
+    '''
+    if memory_source() != 'rss' or _group['name'] is None:
+        return None
+    spec = json.dumps({'group': _group['name'], 'kwargs': _group['kwargs'], 'call': call})
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.run', '--probe', spec], cwd=ROOT,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output = process.communicate()[0].decode('utf-8', 'replace')
+    for line in output.splitlines():
+        if line.startswith(PROBE_PREFIX):
+            return int(line[len(PROBE_PREFIX):])
+    return None
+
+
+def probe_case(call, function, setup=None):
+    '''
+    measure in a probe: skips every call but the one asked for, and raises ProbeDone with that one's growth.
+    :param call:
+    :param function:
+    :param setup:
+    :return: a measurement of nothing, for the skipped calls.
+    '''
+    if call != _probe['call']:
+        return {'runs': [0.0], 'seconds': {'min': 0.0, 'median': 0.0, 'mean': 0.0}, 'peak_memory': None}
+    if setup is not None:
+        setup()
+    if reset_peak_rss():
+        # The peak starts again from here, so what the group did before can't hide the case's own growth.
+        before = proc_status('VmRSS')
+        function()
+        raise ProbeDone((proc_status('VmHWM') - before) * 1024)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    function()
+    raise ProbeDone((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * RSS_UNIT)
+
+
+def reset_peak_rss():
+    '''
+    Resets this process's peak resident set size to what it is now, which Linux allows through /proc.
+    :return: True if it was reset.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except (IOError, OSError):
+        return False
+    return proc_status('VmHWM') is not None
+
+
+def proc_status(field):
+    '''
+    Returns a field of /proc/self/status in kilobytes, e.g. 'VmRSS'.
+    :param field:
+    :return: kilobytes, or None if it isn't there.
+    '''
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return None
+
+
+def probe(spec):
+    '''
+    Runs a group in probe mode for probe_memory and prints the growth of the case it asked for.
+    :param spec: {'group', 'kwargs', 'call'}
+    :return: exit code
+    '''
+    _probe['call'] = spec['call']
+    try:
+        run_group(spec['group'], weight_utils.WeightTools(), **spec['kwargs'])
+    except ProbeDone as done:
+        print ('%s%d' % (PROBE_PREFIX, done.args[0]))
+        return 0
+    return 1
+
+
+def run_group(name, tools, **kwargs):
+    '''
+    Runs one of CASE_GROUPS, keeping track of it so probe_memory can run its cases again.
+    :param name:
+    :param tools:
+    :param kwargs: the group's arguments, which have to go through JSON.
+    :return: list of results
+    '''
+    _group.update(name=name, kwargs=kwargs, calls=0)
+    try:
+        return CASE_GROUPS[name](tools, **kwargs)
+    finally:
+        _group['name'] = None
+
+
+def result_key(case, params):
+    '''
+    Returns the key results are matched on between runs, e.g. 'check_weights[joints=10,points=1000]'.
+    :param case:
+    :param params:
+    :return:
+    '''
+    return '%s[%s]' % (case, ','.join(['%s=%s' % (x, params[x]) for x in sorted(params)]))
+
+
+def make_result(case, params, measured, count, unit):
+    '''
+    Bundles a measurement with its throughput, count units of work per median run.
+    :param case:
+    :param params:
+    :param measured: see measure
+    :param count:
+    :param unit:
+    :return:
+    '''
+    median = measured['seconds']['median']
+    result = {'key': result_key(case, params), 'case': case, 'params': params,
+              'throughput': count / median if median > 0 else None, 'unit': unit}
+    result.update(measured)
+    return result
+
+
+def weight_files(work_dir, points, joints):
+    '''
+    Returns (plain XML, XML with a fresh binary sidecar) for a size, generating whatever isn't in work_dir yet.
+    :param work_dir:
+    :param points:
+    :param joints:
+    :return:
+    '''
+    path = '%s/weights_p%d_j%d.xml' % (work_dir, points, joints)
+    cached_path = '%s/weights_p%d_j%d_sidecar.xml' % (work_dir, points, joints)
+    if not os.path.exists(path):
+        print ('Generating %s' % path)
+        synthetic.write_weights_file(path, points, joints)
+    if binary_utils.fresh_sidecar(cached_path) is None:
+        shutil.copyfile(path, cached_path)
+        binary_utils.xml_to_binary(cached_path)
+    return path, cached_path
+
+
+def file_cases(tools, work_dir, points, joints, repeat):
+    '''
+    Runs check_weights and remap_weights on one size of file, from the XML and from its sidecar.
+    :param tools:
+    :param work_dir:
+    :param points:
+    :param joints:
+    :param repeat:
+    :return: list of results
+    '''
+    path, cached_path = weight_files(work_dir, points, joints)
+    write_path = '%s/remapped.xml' % work_dir
+    params = {'points': points, 'joints': joints}
+    results = []
+    for suffix, file_path in (('', path), ('_sidecar', cached_path)):
+        # check_weights remembers headers by modification time, so forget them or only the first run reads the file.
+        measured = measure(lambda: tools.check_weights(path=file_path), repeat, setup=xml_utils.clear_header_cache)
+        results.append(make_result('check_weights' + suffix, params, measured, points, 'points/s'))
+        measured = measure(lambda: tools.remap_weights(REMAP_SOURCE, REMAP_TARGET, path=file_path,
+                                                       write_path=write_path), repeat)
+        results.append(make_result('remap_weights' + suffix, params, measured, points, 'points/s'))
+    if os.path.exists(write_path):
+        os.remove(write_path)
+    results.extend(transfer_cases(tools, cached_path, params, repeat))
+    return results
+
+
+def transfer_cases(tools, path, params, repeat):
+    '''
+    Builds the spatial index over a file's positions, then transfers the file's weights onto a jittered copy of up to
+    TRANSFER_POINTS of its own vertices with the index cached.
+    :param tools:
+    :param path:
+    :param params:
+    :param repeat:
+    :return: list of results
+    '''
+    positions = tools.read_positions(path)[1]
+    points = [x + 0.001 for x in positions[:TRANSFER_POINTS * 3]]
+    influences = xml_utils.read_joints(path)
+    count = len(points) // 3
+    # The index is timed on its own, next to the queries it is too small a part of a transfer to show.
+    results = [make_result('transfer_index', params,
+                           measure(lambda: transfer_utils.get_index(path, tools.read_positions), repeat,
+                                   setup=transfer_utils.clear_index_cache), len(positions) // 3, 'verts/s')]
+    # Transfers after the first find the index cached, as the meshes of an import from one file do.
+    transfer_utils.get_index(path, tools.read_positions)
+    measured = measure(lambda: tools.transfer_weights(path, [], [], influences, points, TRANSFER_NEIGHBOURS), repeat)
+    results.append(make_result('transfer_nearest', params, measured, count, 'verts/s'))
+    return results
+
+
+def skin_cases(points, joints, repeat):
+    '''
+    Reads a skinCluster's weights in one call, and prunes them to four influences and writes the changed rows back,
+    through skin_utils on its in memory backend.
+    :param points:
+    :param joints:
+    :param repeat:
+    :return: list of results
+    '''
+    backend = skin_utils.FakeBackend()
+    weights = [0.0] * points * joints
+    for vertex in range(points):
+        for offset in range(6):
+            weights[vertex * joints + (vertex + offset) % joints] = 1.0 / 6
+    backend.add_skin('skinCluster1', 'bodyShape', synthetic.joint_names(joints), weights)
+
+    def prune():
+        matrix, vertices = math_utils.prune_matrix(skin_utils.get_weights('skinCluster1')[0], 4)
+        skin_utils.set_weights('skinCluster1', matrix, vertices)
+
+    old_backend = skin_utils.set_backend(backend)
+    try:
+        params = {'points': points, 'joints': joints}
+        return [make_result('skin_read', params, measure(lambda: skin_utils.read_skin('skinCluster1'), repeat),
+                            points, 'verts/s'),
+                make_result('skin_prune_write', params,
+                            measure(prune, repeat, setup=lambda: backend.add_skin('skinCluster1', 'bodyShape',
+                                                                                  synthetic.joint_names(joints),
+                                                                                  weights)),
+                            points, 'verts/s')]
+    finally:
+        skin_utils.set_backend(old_backend)
+
+
+def resolve_imports(tools, root, transforms):
+    '''
+    The part of weight_import that works out which file and skinCluster go with each selection, without the dialogs
+    or the import itself.
+    :param tools:
+    :param root:
+    :param transforms:
+    :return: number of selections resolved.
+    '''
+    index = index_utils.WeightIndex(root)
+    resolver = tools.reset_resolver()
+    resolved = 0
+    for selection in transforms:
+        path = index.lookup(selection)
+        if path is None or not os.access(path, os.R_OK):
+            continue
+        deformer = resolver.find(selection)
+        if deformer is not None:
+            cmds.listConnections(deformer, type='joint')
+            resolved += 1
+    return resolved
+
+
+def resolve_cases(tools, work_dir, meshes, repeat):
+    '''
+    Times import path resolution over a scene of skinned meshes with a file for each, with no saved index (cold) and
+    with one (warm).
+    :param tools:
+    :param work_dir:
+    :param meshes:
+    :param repeat:
+    :return: list of results
+    '''
+    root = '%s/library_m%d' % (work_dir, meshes)
+    transforms = synthetic.build_scene(cmds, meshes)
+    synthetic.build_library(root, transforms)
+    if resolve_imports(tools, root, transforms) != len(transforms):
+        raise RuntimeError('Resolved the wrong number of files under %s' % root)
+    params = {'meshes': meshes}
+    results = [make_result('resolve_paths_cold', params,
+                           measure(lambda: resolve_imports(tools, root, transforms), repeat,
+                                   setup=lambda: index_utils.clear_index(root)), meshes, 'meshes/s')]
+    resolve_imports(tools, root, transforms)
+    results.append(make_result('resolve_paths_warm', params,
+                               measure(lambda: resolve_imports(tools, root, transforms), repeat), meshes, 'meshes/s'))
+    return results
+
+
+CASE_GROUPS = {'file_cases': file_cases,
+               'skin_cases': lambda tools, **kwargs: skin_cases(**kwargs),
+               'resolve_cases': resolve_cases}
+
+
+def compare(baseline, results, tolerance=0.2):
+    '''
+    Compares results with a baseline run, matching them by key.
+    :param baseline: a results file's contents.
+    :param results: a results file's contents.
+    :param tolerance: how much worse (0.2 for 20%) a median time or peak memory can get before it counts.
+    :return: list of (key, metric, before, after) that got worse by more than tolerance.
+    '''
+    before = dict([(x['key'], x) for x in baseline['results']])
+    # Files from before the source was recorded came from tracemalloc, the only source there was.
+    same_memory = baseline.get('memory', 'tracemalloc') == results.get('memory', 'tracemalloc')
+    slack = RSS_SLACK if results.get('memory') == 'rss' else 0
+    regressions = []
+    for result in results['results']:
+        old = before.get(result['key'])
+        if old is None:
+            continue
+        for metric, old_value, new_value in (('seconds', old['seconds']['median'], result['seconds']['median']),
+                                             ('peak_memory', old['peak_memory'], result['peak_memory'])):
+            if old_value is None or new_value is None:
+                continue
+            if metric == 'peak_memory' and not same_memory:
+                continue
+            if new_value > old_value * (1.0 + tolerance) + (slack if metric == 'peak_memory' else 0):
+                regressions.append((result['key'], metric, old_value, new_value))
+    return regressions
+
+
+def run(points, joints, meshes, repeat=3, work_dir=None):
+    '''
+    Runs every case and returns the results in the form written to JSON.
+    :param points: list of point counts.
+    :param joints: list of joint counts.
+    :param meshes: list of scene sizes for the path resolution cases.
+    :param repeat:
+    :param work_dir: where generated files are kept.
+    :return:
+    '''
+    if work_dir is None:
+        work_dir = os.path.join(tempfile.gettempdir(), 'weight_tools_benchmarks')
+    work_dir = work_dir.replace('\\', '/')
+    if not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+    tools = weight_utils.WeightTools()
+    results = []
+    for point_count in points:
+        for joint_count in joints:
+            results.extend(run_group('file_cases', tools, work_dir=work_dir, points=point_count, joints=joint_count,
+                                     repeat=repeat))
+            results.extend(run_group('skin_cases', tools, points=point_count, joints=joint_count, repeat=repeat))
+            print_results(results[-8:])
+    for mesh_count in meshes:
+        results.extend(run_group('resolve_cases', tools, work_dir=work_dir, meshes=mesh_count, repeat=repeat))
+        print_results(results[-2:])
+    return {'format': FORMAT_VERSION,
+            'tool_version': tools._version,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': repeat,
+            'memory': memory_source(),
+            'results': results}
+
+
+def print_results(results):
+    for result in results:
+        memory = result['peak_memory']
+        print ('%-48s %10.4fs %14.0f %-9s %s' % (result['key'], result['seconds']['median'], result['throughput'] or 0,
+                                                 result['unit'],
+                                                 '-' if memory is None else '%.1fMB' % (memory / 1048576.0)))
+
+
+def _numbers(text):
+    return [int(x) for x in text.split(',') if x.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run',
+                                     description='Benchmark the weight tools against the Maya stand-in.')
+    parser.add_argument('--points', type=_numbers, help='comma separated point counts (default %s)' % POINTS)
+    parser.add_argument('--joints', type=_numbers, help='comma separated joint counts (default %s)' % JOINTS)
+    parser.add_argument('--meshes', type=_numbers, help='comma separated scene sizes (default %s)' % MESHES)
+    parser.add_argument('--quick', action='store_true', help='small sizes only, for a quick check')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case')
+    parser.add_argument('--work-dir', help='where generated files are kept between runs')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='a previous results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slow down before flagging, 0.2 = 20%%')
+    parser.add_argument('--probe', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.probe:
+        return probe(json.loads(args.probe))
+    points = args.points or (QUICK_POINTS if args.quick else POINTS)
+    joints = args.joints or (QUICK_JOINTS if args.quick else JOINTS)
+    meshes = args.meshes or (QUICK_MESHES if args.quick else MESHES)
+    results = run(points, joints, meshes, repeat=args.repeat, work_dir=args.work_dir)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        print ('Wrote %s' % args.output)
+    if args.compare:
+        with open(args.compare) as input_file:
+            baseline = json.load(input_file)
+        regressions = compare(baseline, results, args.tolerance)
+        for key, metric, before, after in regressions:
+            print ('REGRESSION %s %s: %s -> %s (%s)' % (key, metric, before, after,
+                                                        '%+.0f%%' % ((after / float(before) - 1.0) * 100) if before
+                                                        else 'from 0'))
+        if regressions:
+            return 1
+        print ('No regressions against %s' % args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import os
+import random
+from utils import binary_utils
+
+'''
+Synthetic weight files and scenes for the benchmarks. Files are written in the layout Maya's own export uses (see
+export_utils.write_weights), straight from a generator so that half a million points never need a dense matrix.
+'''
+
+IDENTITY = ''.join(['%.6f ' % float(row == column) for row in range(4) for column in range(4)])
+
+
+def joint_names(count):
+    '''
+    Returns the joint names used in files with count joints.
+    :param count:
+    :return:
+    '''
+    return ['joint%d' % x for x in range(count)]
+
+
+def write_weights_file(path, points, joints, influences=4, seed=0, deformer='skinCluster1', shape='bodyShape'):
+    '''
+    Writes a deformerWeights XML with points vertices, each weighted to influences of the joints, normalized.
+    The same arguments always give the same file.
+    :param path:
+    :param points:
+    :param joints:
+    :param influences: influences per vertex.
+    :param seed:
+    :param deformer:
+    :param shape:
+    :return: path
+    '''
+    rnd = random.Random(seed)
+    names = joint_names(joints)
+    influences = max(1, min(influences, joints))
+    # Spread each vertex's influences evenly over the joints so every column gets used.
+    stride = max(1, joints // influences)
+    columns = [([], []) for _ in names]
+    for index in range(points):
+        first = rnd.randrange(joints)
+        values = [rnd.random() + 0.001 for _ in range(influences)]
+        total = sum(values)
+        for offset, value in enumerate(values):
+            column = columns[(first + offset * stride) % joints]
+            column[0].append(index)
+            column[1].append('%.3f' % (value / total))
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as output:
+        output.write('<?xml version="1.0"?>\n<deformerWeights>\n')
+        output.write('  <headerInfo%s/>\n' % binary_utils.xml_attributes([('fileName', path),
+                                                                          ('worldMatrix', IDENTITY)]))
+        output.write('  <shape%s>\n' % binary_utils.xml_attributes([('name', shape), ('group', '0'), ('stride', '3'),
+                                                                    ('size', str(points)), ('max', str(points))]))
+        for index in range(points):
+            output.write('    <point index="%d" value=" %.6f %.6f %.6f"/>\n' % (index, rnd.uniform(-1, 1),
+                                                                               rnd.uniform(-1, 1),
+                                                                               rnd.uniform(-1, 1)))
+        output.write('  </shape>\n')
+        for layer, (name, (indices, values)) in enumerate(zip(names, columns)):
+            attrib = [('deformer', deformer), ('source', name), ('shape', shape), ('layer', str(layer)),
+                      ('defaultValue', '0.000'), ('size', str(len(indices))),
+                      ('max', str(indices[-1] if indices else 0))]
+            output.write('  <weights%s>\n' % binary_utils.xml_attributes(attrib))
+            output.write(''.join(['    <point index="%d" value="%s"/>\n' % x for x in zip(indices, values)]))
+            output.write('  </weights>\n')
+        output.write('</deformerWeights>\n')
+    return path
+
+
+def build_scene(cmds, meshes, joints=10, parts=10, points=8):
+    '''
+    Builds a rig of skinned meshes in the Maya stand-in: |rig|part<n>|mesh<n>, spread over parts groups.
+    :param cmds: the stand-in maya.cmds module.
+    :param meshes:
+    :param joints:
+    :param parts:
+    :param points: vertices per mesh.
+    :return: long names of the mesh transforms.
+    '''
+    cmds.reset()
+    influences = [cmds.create_joint(x) for x in joint_names(joints)]
+    rig = cmds.create_group('rig')
+    groups = [cmds.create_group('part%d' % x, parent=rig) for x in range(max(1, parts))]
+    positions = [(float(x), 0.0, 0.0) for x in range(points)]
+    transforms = []
+    for index in range(meshes):
+        transform = cmds.create_mesh('mesh%d' % index, positions, parent=groups[index % len(groups)])
+        cmds.create_skin_cluster('skinCluster%d' % index, transform, influences)
+        transforms.append(transform)
+    return transforms
+
+
+def build_library(root, transforms, joints=10, points=8):
+    '''
+    Writes a weights file for every transform where weight_import looks for it: the transform's parent folders under
+    root. Files that already exist are left alone.
+    :param root:
+    :param transforms:
+    :param joints:
+    :param points:
+    :return: the file paths.
+    '''
+    paths = []
+    for transform in transforms:
+        path = '%s/%s.xml' % (root.rstrip('/'), transform[1:].replace('|', '/'))
+        if not os.path.exists(path):
+            write_weights_file(path, points, joints, seed=len(paths))
+        paths.append(path)
+    return paths
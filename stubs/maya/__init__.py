@@ -0,0 +1,9 @@
+'''
+A small stand-in for the parts of Maya the weight tools use, so they can run on a machine without Maya.
+Put the stubs directory at the front of sys.path before importing anything from utils:
+
+    sys.path.insert(0, '/path/to/weight_tools/stubs')
+
+Scenes are built with maya.cmds.create_mesh, maya.cmds.create_joint and maya.cmds.create_skin_cluster, and cleared
+with maya.cmds.reset. Only the flags the tools actually pass are implemented.
+'''
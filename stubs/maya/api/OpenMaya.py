@@ -0,0 +1,113 @@
+from maya import cmds
+
+'''
+Stand-in for the handful of maya.api.OpenMaya classes the weight tools use, backed by the maya.cmds stub scene.
+'''
+
+
+class MFn(object):
+    kMeshVertComponent = 550
+
+
+class MDoubleArray(list):
+    pass
+
+
+class MIntArray(list):
+    pass
+
+
+class MDagPath(object):
+    def __init__(self, name=None):
+        self._name = name
+
+    def fullPathName(self):
+        return self._name
+
+    def partialPathName(self):
+        return self._name.rsplit('|', 1)[-1]
+
+    def inclusiveMatrix(self):
+        return MMatrix()
+
+
+class MDagPathArray(list):
+    pass
+
+
+class MObject(object):
+    def __init__(self, name=None):
+        self._name = name
+
+
+class MSelectionList(object):
+    def __init__(self):
+        self._items = []
+
+    def add(self, name):
+        if not cmds.objExists(name):
+            raise RuntimeError('(kInvalidParameter): Object does not exist')
+        self._items.append(cmds._long(name))
+        return self
+
+    def length(self):
+        return len(self._items)
+
+    def getDependNode(self, index):
+        return MObject(self._items[index])
+
+    def getDagPath(self, index):
+        return MDagPath(self._items[index])
+
+
+class MFnSingleIndexedComponent(object):
+    def __init__(self, component=None):
+        self._component = component
+
+    def create(self, component_type):
+        self._component = MObject()
+        self._component.elements = []
+        return self._component
+
+    def setCompleteData(self, count):
+        self._component.elements = list(range(count))
+
+    def addElements(self, elements):
+        self._component.elements.extend(elements)
+
+
+class MFnMesh(object):
+    def __init__(self, path):
+        self._name = path.fullPathName()
+
+    @property
+    def numVertices(self):
+        return cmds.polyEvaluate(self._name, v=True)
+
+    def getPoints(self, space=None):
+        return MPointArray([MPoint(*x) for x in cmds._nodes[cmds._shape(self._name)]['positions']])
+
+
+class MSpace(object):
+    kObject = 2
+    kWorld = 4
+
+
+class MPoint(object):
+    def __init__(self, x=0.0, y=0.0, z=0.0, w=1.0):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.w = w
+
+
+class MPointArray(list):
+    pass
+
+
+class MMatrix(object):
+    def __init__(self, values=None):
+        self._values = list(values) if values is not None else [float(i % 5 == 0) for i in range(16)]
+
+    def getElement(self, row, column):
+        return self._values[row * 4 + column]
@@ -0,0 +1,41 @@
+from maya import cmds
+from maya.api import OpenMaya as om
+
+'''
+Stand-in for maya.api.OpenMayaAnim.MFnSkinCluster, backed by the maya.cmds stub scene.
+'''
+
+
+class MFnSkinCluster(object):
+    def __init__(self, obj):
+        self._name = obj._name
+        self._skin = cmds._nodes[self._name]
+
+    def name(self):
+        return self._name
+
+    def getPathAtIndex(self, index):
+        return om.MDagPath(self._skin['shape'])
+
+    def influenceObjects(self):
+        return om.MDagPathArray([om.MDagPath(cmds._long(x)) for x in self._skin['influences']])
+
+    def getWeights(self, path, components, influences=None):
+        rows = [self._skin['weights'][i] for i in components.elements]
+        if influences is not None:
+            return om.MDoubleArray([row[i] for row in rows for i in influences])
+        return om.MDoubleArray([x for row in rows for x in row]), len(self._skin['influences'])
+
+    def setWeights(self, path, components, influences, weights, normalize=True, returnOldWeights=False):
+        count = len(influences)
+        old = om.MDoubleArray()
+        for n, row_index in enumerate(components.elements):
+            row = self._skin['weights'][row_index]
+            for i, influence in enumerate(influences):
+                if returnOldWeights:
+                    old.append(row[influence])
+                row[influence] = float(weights[n * count + i])
+            if normalize:
+                cmds._normalize_row(row)
+        if returnOldWeights:
+            return old
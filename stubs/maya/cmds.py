@@ -0,0 +1,508 @@
+import xml.etree.ElementTree as et
+import os
+import re
+
+'''
+Stand-in for maya.cmds. The scene is a flat dictionary of nodes keyed by long name. Meshes are a transform plus a
+shape holding vertex positions, skinClusters hold their shape, influence names and a dense vertex x influence weight
+matrix.
+'''
+
+_nodes = {}
+_order = []
+# Long names by short name, so name lookups don't scan the whole scene.
+_short_names = {}
+_selection = []
+# Queued answers for the dialog commands, see queue_response.
+_responses = {}
+# Everything passed to warning, newest last.
+warnings = []
+# Scene builders cmds.file can open, see register_scene, and the scenes saved so far.
+_scenes = {}
+_scene_name = ['']
+saved = []
+# What about(batch=True) answers, True to behave like mayapy.
+batch_mode = [False]
+# How many isCancelled queries progressBar answers False before it answers True, None to never cancel.
+cancel_after = [None]
+# idleEvent scriptJobs by job number, see run_idle.
+_script_jobs = {}
+_idle = [False]
+# (command, True if it was opened from an idle event) for every dialog opened.
+dialogs = []
+
+
+def reset():
+    '''
+    Empties the scene.
+    :return:
+    '''
+    _nodes.clear()
+    del _order[:]
+    _short_names.clear()
+    del _selection[:]
+    _responses.clear()
+    del warnings[:]
+    del dialogs[:]
+    cancel_after[0] = None
+
+
+def register_scene(path, build):
+    '''
+    Registers a function that builds the scene file(path, open=True) opens.
+    :param path:
+    :param build:
+    :return:
+    '''
+    _scenes[path] = build
+
+
+def file(*args, **kwargs):
+    if kwargs.get('new', kwargs.get('n', False)):
+        reset()
+        _scene_name[0] = ''
+        return ''
+    if kwargs.get('open', kwargs.get('o', False)):
+        if args[0] not in _scenes:
+            raise RuntimeError('File not found: %s' % args[0])
+        reset()
+        _scenes[args[0]]()
+        _scene_name[0] = args[0]
+        return args[0]
+    if kwargs.get('save', kwargs.get('s', False)):
+        saved.append(_scene_name[0])
+        return _scene_name[0]
+    if kwargs.get('q', kwargs.get('query', False)):
+        return _scene_name[0]
+
+
+def about(**kwargs):
+    if kwargs.get('batch', kwargs.get('b', False)):
+        return batch_mode[0]
+    return None
+
+
+def create_mesh(name, positions, parent=None):
+    '''
+    Creates a transform with a mesh shape under it and returns the transform's long name.
+    :param name:
+    :param positions: list of (x, y, z) per vertex
+    :param parent:
+    :return:
+    '''
+    transform = '%s|%s' % (_long(parent) if parent else '', name)
+    _add(transform, 'transform', parent=_long(parent) if parent else None)
+    shape = '%s|%sShape' % (transform, name)
+    _add(shape, 'mesh', parent=transform, positions=[tuple(x) for x in positions])
+    return transform
+
+
+def create_group(name, parent=None):
+    '''
+    Creates an empty transform and returns its long name.
+    :param name:
+    :param parent:
+    :return:
+    '''
+    transform = '%s|%s' % (_long(parent) if parent else '', name)
+    _add(transform, 'transform', parent=_long(parent) if parent else None)
+    return transform
+
+
+def create_joint(name):
+    '''
+    Creates a joint at the root of the scene.
+    :param name:
+    :return:
+    '''
+    _add('|' + name, 'joint', parent=None)
+    return '|' + name
+
+
+def create_skin_cluster(name, mesh, influences, weights=None):
+    '''
+    Creates a skinCluster on mesh. weights is a list of rows, one per vertex, one value per influence.
+    :param name:
+    :param mesh:
+    :param influences:
+    :param weights:
+    :return:
+    '''
+    shape = _shape(mesh)
+    count = len(_nodes[shape]['positions'])
+    if weights is None:
+        weights = [[1.0] + [0.0] * (len(influences) - 1) for _ in range(count)]
+    _add(name, 'skinCluster', parent=None, shape=shape, influences=[_short(x) for x in influences],
+         weights=[list(x) for x in weights], normalize=1)
+    _nodes[shape]['history'] = [name]
+    return name
+
+
+def select(*items, **kwargs):
+    if kwargs.get('clear', kwargs.get('cl', False)):
+        del _selection[:]
+        return
+    if kwargs.get('r', kwargs.get('replace', False)) or not (kwargs.get('add') or kwargs.get('tgl')):
+        del _selection[:]
+    for item in _flatten(items):
+        _selection.append(_long(item))
+
+
+def ls(*items, **kwargs):
+    long_names = kwargs.get('l', kwargs.get('long', False))
+    node_type = kwargs.get('type', kwargs.get('typ'))
+    if kwargs.get('sl', kwargs.get('selection', False)):
+        result = list(_selection)
+    elif items:
+        result = [_long(x) for x in _flatten(items) if _find(x) is not None]
+    else:
+        result = list(_order)
+    if node_type is not None:
+        result = [x for x in result if _nodes[x]['type'] == node_type]
+    return [x if long_names else _short(x) for x in result]
+
+
+def objExists(name):
+    return _find(name) is not None
+
+
+def objectType(name):
+    return _nodes[_long(name)]['type']
+
+
+def listRelatives(*items, **kwargs):
+    full = kwargs.get('f', kwargs.get('fullPath', False))
+    node_type = kwargs.get('type', kwargs.get('typ'))
+    result = []
+    for item in _flatten(items):
+        node = _long(item)
+        if kwargs.get('p', kwargs.get('parent', False)):
+            found = [_nodes[node]['parent']] if _nodes[node]['parent'] else []
+        elif kwargs.get('ad', kwargs.get('allDescendents', False)):
+            found = [x for x in _order if x.startswith(node + '|')]
+            found.reverse()
+        else:
+            found = [x for x in _order if _nodes[x]['parent'] == node]
+        if node_type == 'shape':
+            found = [x for x in found if _nodes[x]['type'] == 'mesh']
+        elif node_type is not None:
+            found = [x for x in found if _nodes[x]['type'] == node_type]
+        result.extend(found)
+    if not result:
+        return None
+    return [x if full else _short(x) for x in result]
+
+
+def listHistory(item, **kwargs):
+    node = _long(item)
+    return [_short(node)] + list(_nodes[node].get('history', []))
+
+
+def listConnections(item, **kwargs):
+    node = _long(item)
+    node_type = kwargs.get('type', kwargs.get('t'))
+    data = _nodes[node]
+    if data['type'] == 'mesh':
+        found = list(data.get('history', []))
+    elif data['type'] == 'skinCluster':
+        found = list(data['influences'])
+    else:
+        found = [x for x in _order if _nodes[x]['type'] == 'skinCluster' and _short(node) in _nodes[x]['influences']]
+    if node_type is not None:
+        found = [x for x in found if _nodes[_long(x)]['type'] == node_type]
+    return [_short(x) for x in found] or None
+
+
+def polyEvaluate(item, **kwargs):
+    shape = _shape(item)
+    if shape is None:
+        return 'Nothing counted : no polygonal object is selected.'
+    return len(_nodes[shape]['positions'])
+
+
+def getAttr(attribute, **kwargs):
+    match = re.match(r'^(.+)\.(?:wl|weightList)\[(\d+)\]\.(?:w|weights)$', attribute)
+    if match is not None:
+        row = _nodes[_long(match.group(1))]['weights'][int(match.group(2))]
+        # Only the stored, non zero weights come back, like a sparse weightList.
+        return [tuple([x for x in row if x != 0.0])]
+    node, attr = attribute.split('.', 1)
+    return _nodes[_long(node)].get(attr)
+
+
+def setAttr(attribute, *values, **kwargs):
+    node, attr = attribute.split('.', 1)
+    _nodes[_long(node)][attr] = values[0] if len(values) == 1 else values
+
+
+def skinCluster(*items, **kwargs):
+    if kwargs.get('q', kwargs.get('query', False)):
+        skin = _nodes[_long(items[0])]
+        if kwargs.get('inf', kwargs.get('influence', False)):
+            return list(skin['influences'])
+        if kwargs.get('g', kwargs.get('geometry', False)):
+            return [_short(skin['shape'])]
+        return None
+    items = _flatten(items)
+    joints = [x for x in items if _nodes[_long(x)]['type'] == 'joint']
+    meshes = [x for x in items if _nodes[_long(x)]['type'] != 'joint']
+    if not joints or not meshes:
+        raise RuntimeError('Skin cluster needs joints and a mesh.')
+    shape = _shape(meshes[0])
+    if _nodes[shape].get('history'):
+        raise RuntimeError('Skin on %s was already bound.' % meshes[0])
+    name = kwargs.get('n', kwargs.get('name', 'skinCluster%d' % (len(ls(type='skinCluster')) + 1)))
+    return [create_skin_cluster(name, meshes[0], joints)]
+
+
+def skinPercent(deformer, *items, **kwargs):
+    skin = _nodes[_long(deformer)]
+    rows = _rows(skin, items)
+    if kwargs.get('q', kwargs.get('query', False)):
+        if kwargs.get('v', kwargs.get('value', False)):
+            return list(skin['weights'][rows[0]])
+        return None
+    if 'prw' in kwargs or 'pruneWeights' in kwargs:
+        limit = kwargs.get('prw', kwargs.get('pruneWeights'))
+        for row in rows:
+            values = skin['weights'][row]
+            for i in range(len(values)):
+                if values[i] < limit:
+                    values[i] = 0.0
+            _normalize_row(values)
+    if 'tv' in kwargs or 'transformValue' in kwargs:
+        pairs = kwargs.get('tv', kwargs.get('transformValue'))
+        for row in rows:
+            values = skin['weights'][row]
+            for influence, value in pairs:
+                values[skin['influences'].index(_short(influence))] = value
+            _normalize_row(values)
+    if kwargs.get('normalize', kwargs.get('nrm', False)):
+        for row in rows:
+            _normalize_row(skin['weights'][row])
+
+
+def deformerWeights(name, **kwargs):
+    path = kwargs.get('p', kwargs.get('path', ''))
+    full_path = os.path.join(path, name.lstrip('/')) if path else name
+    deformer = kwargs.get('deformer', kwargs.get('df'))
+    if isinstance(deformer, (list, tuple)):
+        deformer = deformer[0]
+    skin = _nodes[_long(deformer)]
+    if kwargs.get('ex', kwargs.get('export', False)):
+        _export_weights(full_path, deformer, skin, kwargs.get('vc', kwargs.get('vertexConnections', False)))
+    elif kwargs.get('im', kwargs.get('import', False)):
+        # Every method is applied by index here.
+        _import_weights(full_path, skin)
+    return full_path
+
+
+def progressBar(name, **kwargs):
+    if kwargs.get('q', kwargs.get('query', False)):
+        if kwargs.get('isCancelled', kwargs.get('ic', False)):
+            if cancel_after[0] is None:
+                return False
+            cancel_after[0] -= 1
+            return cancel_after[0] < 0
+        return 0
+    return None
+
+
+def waitCursor(**kwargs):
+    return False
+
+
+def scriptJob(**kwargs):
+    if 'idleEvent' in kwargs:
+        number = max(list(_script_jobs) + [0]) + 1
+        _script_jobs[number] = kwargs['idleEvent']
+        return number
+    if 'exists' in kwargs:
+        return kwargs['exists'] in _script_jobs
+    if 'kill' in kwargs:
+        _script_jobs.pop(kwargs['kill'], None)
+    return None
+
+
+def run_idle(limit=100000):
+    '''
+    Fires idle events, the way Maya does while it has nothing else to do, until no idleEvent scriptJob is left or
+    limit events have fired.
+    :param limit:
+    :return: number of idle events fired.
+    '''
+    count = 0
+    _idle[0] = True
+    try:
+        while _script_jobs and count < limit:
+            for number in sorted(_script_jobs):
+                if number in _script_jobs:
+                    _script_jobs[number]()
+            count += 1
+    finally:
+        _idle[0] = False
+    return count
+
+
+def warning(message):
+    warnings.append(message)
+
+
+def error(message):
+    raise RuntimeError(message)
+
+
+def queue_response(command, *values):
+    '''
+    Queues answers for promptDialog, confirmDialog or fileDialog2, consumed in order. A promptDialog answer is a
+    (button, text) tuple.
+    :param command:
+    :param values:
+    :return:
+    '''
+    _responses.setdefault(command, []).extend(values)
+
+
+def confirmDialog(**kwargs):
+    dialogs.append(('confirmDialog', _idle[0]))
+    if _responses.get('confirmDialog'):
+        return _responses['confirmDialog'].pop(0)
+    buttons = kwargs.get('button', kwargs.get('b', ['Confirm']))
+    return kwargs.get('defaultButton', kwargs.get('db', buttons[0]))
+
+
+_prompt_text = ['']
+
+
+def promptDialog(**kwargs):
+    if kwargs.get('q', kwargs.get('query', False)):
+        return _prompt_text[0]
+    dialogs.append(('promptDialog', _idle[0]))
+    if _responses.get('promptDialog'):
+        button, _prompt_text[0] = _responses['promptDialog'].pop(0)
+        return button
+    _prompt_text[0] = kwargs.get('text', kwargs.get('tx', ''))
+    return kwargs.get('dismissString', kwargs.get('ds', 'Cancel'))
+
+
+def fileDialog2(**kwargs):
+    dialogs.append(('fileDialog2', _idle[0]))
+    if _responses.get('fileDialog2'):
+        return _responses['fileDialog2'].pop(0)
+    return None
+
+
+def _add(name, node_type, **data):
+    data['type'] = node_type
+    if name not in _nodes:
+        _order.append(name)
+        _short_names.setdefault(_short(name), []).append(name)
+    _nodes[name] = data
+
+
+def _flatten(items):
+    result = []
+    for item in items:
+        if isinstance(item, (list, tuple)):
+            result.extend(_flatten(item))
+        elif item is not None:
+            result.append(item)
+    return result
+
+
+def _short(name):
+    return name.rsplit('|', 1)[-1]
+
+
+def _find(name):
+    name = name.split('.', 1)[0]
+    if name in _nodes:
+        return name
+    if '|' not in name:
+        matches = _short_names.get(name, [])
+        if len(matches) == 1:
+            return matches[0]
+    elif not name.startswith('|'):
+        matches = [x for x in _order if x.endswith('|' + name) or x == name]
+        if len(matches) == 1:
+            return matches[0]
+    return None
+
+
+def _long(name):
+    found = _find(name)
+    if found is None:
+        raise ValueError('No object matches name: %s' % name)
+    return found
+
+
+def _shape(item):
+    node = _long(item)
+    if _nodes[node]['type'] == 'mesh':
+        return node
+    shapes = [x for x in _order if _nodes[x]['parent'] == node and _nodes[x]['type'] == 'mesh']
+    return shapes[0] if shapes else None
+
+
+def _rows(skin, items):
+    rows = []
+    for item in _flatten(items):
+        match = re.match(r'^.+\.vtx\[(\d+)(?::(\d+))?\]$', item)
+        if match is None:
+            rows.extend(range(len(skin['weights'])))
+        elif match.group(2) is not None:
+            rows.extend(range(int(match.group(1)), int(match.group(2)) + 1))
+        else:
+            rows.append(int(match.group(1)))
+    return rows
+
+
+def _normalize_row(values):
+    total = sum(values)
+    if total > 0:
+        for i in range(len(values)):
+            values[i] /= total
+
+
+def _export_weights(path, deformer, skin, vertex_connections):
+    shape = _nodes[skin['shape']]
+    shape_name = _short(skin['shape'])
+    lines = ['<?xml version="1.0"?>', '<deformerWeights>',
+             '  <headerInfo fileName="%s" worldMatrix="1.000000 0.000000 0.000000 0.000000 0.000000 1.000000 '
+             '0.000000 0.000000 0.000000 0.000000 1.000000 0.000000 0.000000 0.000000 0.000000 1.000000 "/>' % path]
+    count = len(shape['positions'])
+    if vertex_connections:
+        lines.append('  <shape name="%s" group="0" stride="3" size="%d" max="%d">' % (shape_name, count, count))
+        for index, position in enumerate(shape['positions']):
+            lines.append('    <point index="%d" value=" %.3f %.3f %.3f"/>' % ((index,) + tuple(position)))
+        lines.append('  </shape>')
+    for layer, influence in enumerate(skin['influences']):
+        points = [(i, row[layer]) for i, row in enumerate(skin['weights']) if row[layer] != 0.0]
+        lines.append('  <weights deformer="%s" source="%s" shape="%s" layer="%d" defaultValue="0.000" size="%d" '
+                     'max="%d">' % (_short(deformer), influence, shape_name, layer, len(points),
+                                    points[-1][0] if points else 0))
+        for index, value in points:
+            lines.append('    <point index="%d" value="%.3f"/>' % (index, value))
+        lines.append('  </weights>')
+    lines.append('</deformerWeights>')
+    with open(path, 'w') as output:
+        output.write('\n'.join(lines) + '\n')
+
+
+def _import_weights(path, skin):
+    root = et.parse(path).getroot()
+    count = len(skin['weights'])
+    incoming = {}
+    for weight in root.findall('weights'):
+        if weight.get('source') not in skin['influences']:
+            raise RuntimeError('%s is not an influence of the deformer.' % weight.get('source'))
+        column = skin['influences'].index(weight.get('source'))
+        for point in weight:
+            index = int(point.get('index'))
+            if index < count:
+                incoming.setdefault(index, {})[column] = float(point.get('value'))
+    for index, values in incoming.items():
+        row = [0.0] * len(skin['influences'])
+        for column, value in values.items():
+            row[column] = value
+        skin['weights'][index] = row
@@ -0,0 +1,9 @@
+'''
+Stand-in for maya.mel. Only knows about the main progress bar.
+'''
+
+
+def eval(command):
+    if 'ProgressBar' in command or 'progress_bar' in command:
+        return 'MainProgressBar'
+    return None
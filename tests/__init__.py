@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The tests always run against the Maya stand-in, so it has to come before anything else called maya.
+for directory in (ROOT, os.path.join(ROOT, 'stubs')):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
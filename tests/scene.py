@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+import unittest
+from maya import cmds
+from utils import export_utils
+from utils import math_utils
+from utils import skin_utils
+from utils import weight_utils
+
+'''
+What the tests share: a scene of the Maya stand-in whose skinClusters keep their weights in a skin_utils.FakeBackend,
+a WeightTools to run against it and a scratch folder. A test case runs on plain Python lists, its subclass with numpy
+set runs it again on NumPy arrays (skipped where NumPy isn't installed).
+'''
+
+NUMPY = math_utils.np
+JOINTS = ['j0', 'j1', 'j2', 'j3', 'j4']
+
+
+class SceneTest(unittest.TestCase):
+    numpy = False
+
+    def setUp(self):
+        if self.numpy and NUMPY is None:
+            self.skipTest('NumPy is not installed')
+        self.old_numpy = math_utils.np
+        math_utils.np = NUMPY if self.numpy else None
+        cmds.reset()
+        self.backend = skin_utils.FakeBackend()
+        self.old_backend = skin_utils.set_backend(self.backend)
+        self.tools = weight_utils.WeightTools()
+        self.temp_dir = tempfile.mkdtemp(prefix='weight_tests_').replace('\\', '/')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        skin_utils.set_backend(self.old_backend)
+        math_utils.np = self.old_numpy
+
+    def add_mesh(self, name, rows, joints=JOINTS, deformer=None, parent=None):
+        '''
+        Adds a mesh with a vertex per row, spread out along x, and a skinCluster holding rows.
+        :param name:
+        :param rows: one weight per joint for each vertex.
+        :param joints: created if they aren't in the scene yet.
+        :param deformer: the skinCluster's name, name + 'Skin' if None.
+        :param parent:
+        :return: the mesh's long name
+        '''
+        for joint in joints:
+            if not cmds.objExists(joint):
+                cmds.create_joint(joint)
+        positions = [(float(i), 0.0, 0.0) for i in range(len(rows))]
+        mesh = cmds.create_mesh(name, positions, parent=parent)
+        deformer = deformer or name + 'Skin'
+        cmds.create_skin_cluster(deformer, mesh, joints, rows)
+        self.backend.add_skin(deformer, '%s|%sShape' % (mesh, name), joints, rows,
+                              points=[x for point in positions for x in point])
+        return mesh
+
+    def set_rows(self, deformer, rows):
+        '''
+        Replaces every weight of a skinCluster in the backend.
+        :param deformer:
+        :param rows:
+        :return:
+        '''
+        data = self.backend.skins[deformer]
+        self.backend.add_skin(deformer, data.shape, data.influences, rows, points=self.backend.positions[deformer])
+
+    def export(self, deformer, path):
+        '''
+        Writes a weights file of deformer the way the export pipeline does, from the backend.
+        :param deformer:
+        :param path:
+        :return: path
+        '''
+        export_utils.write_weights(path, skin_utils.get_export_data(deformer))
+        return path
+
+    def rows(self, deformer):
+        return [[float(x) for x in row] for row in skin_utils.get_weights(deformer)[0]]
+
+    def assertRowsEqual(self, matrix, rows, places=9):
+        self.assertEqual(len(matrix), len(rows))
+        for vertex, (row, expected) in enumerate(zip(matrix, rows)):
+            for value, expected_value in zip(row, expected):
+                self.assertAlmostEqual(float(value), expected_value, places=places, msg='vertex %s: %s != %s' % (
+                    vertex, [float(x) for x in row], expected))
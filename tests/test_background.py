@@ -0,0 +1,148 @@
+import os
+import shutil
+import threading
+import unittest
+from maya import cmds
+from tests import scene
+from utils import async_utils
+
+'''
+Checks running operations in the background (see async_utils) against the Maya stand-in, whose idle events fire from
+cmds.run_idle:
+
+    python -m unittest tests.test_background
+'''
+
+ROWS = [[1.0, 0.0, 0.0, 0.0, 0.0],
+        [0.0, 0.5, 0.5, 0.0, 0.0],
+        [0.0, 0.0, 0.0, 0.25, 0.75]]
+
+
+class BackgroundTest(scene.SceneTest):
+    '''
+    Import, bind and export as background jobs: nothing slow on the main thread and no dialogs from idle events.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        group = cmds.create_group('char')
+        self.meshes = [self.add_mesh(name, ROWS, parent=group) for name in ('body', 'arm')]
+        self.root = self.temp_dir + '/weights'
+        for name in ('body', 'arm'):
+            self.export(name + 'Skin', '%s/char/%s.xml' % (self.root, name))
+        self.tools.background = True
+        self.queue = async_utils.IdleQueue()
+        self.events = []
+
+    def run_job(self, steps):
+        job = async_utils.Job('test', steps, self.queue, on_status=lambda job, event: self.events.append(event))
+        job.start()
+        cmds.run_idle()
+        self.assertTrue(job.finished)
+        self.assertEqual(job.error, None)
+        # Whatever was asked was asked when the job started, not from an idle event.
+        self.assertEqual([x for x in cmds.dialogs if x[1]], [])
+        return job
+
+    def record_index_threads(self):
+        threads = []
+        read_index = self.tools.read_index
+
+        def record(path):
+            threads.append(threading.current_thread().name)
+            return read_index(path)
+        self.tools.read_index = record
+        return threads
+
+    def move(self, name, folder):
+        # Leaves a file where it no longer mirrors the scene hierarchy.
+        os.makedirs('%s/%s' % (self.root, folder))
+        shutil.move('%s/char/%s.xml' % (self.root, name), '%s/%s/%s.xml' % (self.root, folder, name))
+
+    def test_index_on_worker(self):
+        threads = self.record_index_threads()
+        job = self.run_job(self.tools.import_steps(self.root, self.meshes, method='index'))
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.current_thread().name)
+        # Waited on as a step of its own, before any mesh is resolved.
+        self.assertEqual([x['state'] for x in self.events[:2]], ['reading', 'resolving'])
+        self.assertEqual(self.events[0]['path'], self.root)
+        self.assertEqual(job.result['imported'], self.meshes)
+
+    def test_index_in_foreground(self):
+        threads = self.record_index_threads()
+        self.tools.background = False
+        result = self.tools.weight_import(self.root, self.meshes, method='index')
+        self.assertEqual(threads, [threading.current_thread().name])
+        self.assertEqual(result['imported'], self.meshes)
+
+    def test_bind_index_on_worker(self):
+        threads = self.record_index_threads()
+        self.run_job(self.tools.bind_steps(self.root, self.meshes))
+        self.assertNotEqual(threads, [threading.current_thread().name])
+        self.assertEqual(self.events[0]['state'], 'reading')
+
+    def test_method_asked_on_start(self):
+        cmds.queue_response('confirmDialog', 'Index')
+        job = self.run_job(self.tools.import_steps(self.root, self.meshes))
+        self.assertEqual(cmds.dialogs, [('confirmDialog', False)])
+        self.assertEqual(job.result['imported'], self.meshes)
+
+    def test_path_asked_on_start(self):
+        cmds.queue_response('fileDialog2', [self.root])
+        cmds.queue_response('confirmDialog', 'Index')
+        job = self.run_job(self.tools.import_steps(items=self.meshes))
+        self.assertEqual(cmds.dialogs, [('fileDialog2', False), ('confirmDialog', False)])
+        self.assertEqual(job.result['imported'], self.meshes)
+
+    def test_repath_skipped(self):
+        self.move('body', 'other')
+        job = self.run_job(self.tools.import_steps(self.root, self.meshes, method='index'))
+        self.assertEqual(cmds.dialogs, [])
+        self.assertEqual(job.statuses[self.meshes[0]], 'skipped')
+        self.assertEqual(job.result['imported'], self.meshes[1:])
+        # In the foreground the user is asked instead.
+        self.tools.background = False
+        result = self.tools.weight_import(self.root, self.meshes, method='index')
+        self.assertEqual(cmds.dialogs, [('confirmDialog', False)])
+        self.assertEqual(result['imported'], self.meshes)
+
+    def test_unknown_joint_skipped(self):
+        # The body's file comes from a skinCluster with a joint the body's doesn't have, and no plan to place it.
+        other = self.add_mesh('other', ROWS, joints=scene.JOINTS[:-1] + ['extra'])
+        self.export(other[1:] + 'Skin', self.root + '/char/body.xml')
+        job = self.run_job(self.tools.import_steps(self.root, self.meshes, method='index'))
+        self.assertEqual(cmds.dialogs, [])
+        self.assertEqual(job.statuses[self.meshes[0]], 'skipped')
+        self.tools.background = False
+        self.tools.weight_import(self.root, self.meshes, method='index')
+        self.assertEqual(cmds.dialogs, [('promptDialog', False)])
+
+    def test_bind_repath_skipped(self):
+        self.move('body', 'other')
+        job = self.run_job(self.tools.bind_steps(self.root, self.meshes))
+        self.assertEqual(cmds.dialogs, [])
+        self.assertEqual(job.statuses[self.meshes[0]], 'skipped')
+
+    def test_export_overwrite_asked_on_start(self):
+        with open(self.root + '/char/body.xml') as input_file:
+            body = input_file.read()
+        self.set_rows('bodySkin', [list(reversed(x)) for x in ROWS])
+        cmds.queue_response('confirmDialog', 'No')
+        job = self.run_job(self.tools.export_steps(self.root, self.meshes, parallel=True, workers=1))
+        self.assertEqual(cmds.dialogs, [('confirmDialog', False)])
+        self.assertEqual(job.result['written'], [])
+        with open(self.root + '/char/body.xml') as input_file:
+            self.assertEqual(input_file.read(), body)
+        cmds.queue_response('confirmDialog', 'Yes')
+        job = self.run_job(self.tools.export_steps(self.root, self.meshes))
+        self.assertEqual(sorted(job.result['written']), [self.root + '/char/arm.xml', self.root + '/char/body.xml'])
+
+    def test_export_into_empty_folder(self):
+        job = self.run_job(self.tools.export_steps(self.temp_dir + '/new', self.meshes))
+        self.assertEqual(cmds.dialogs, [])
+        self.assertEqual(len(job.result['written']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+from maya import cmds
+from tests import scene
+from utils import math_utils
+
+'''
+Checks importing weights a range of vertices at a time (WeightTools.apply_chunked) and putting them back on cancel,
+against skinClusters kept in memory (skin_utils.FakeBackend):
+
+    python -m unittest tests.test_import
+'''
+
+OLD = [[1.0, 0.0, 0.0, 0.0, 0.0],
+       [0.0, 1.0, 0.0, 0.0, 0.0],
+       [0.0, 0.0, 1.0, 0.0, 0.0],
+       [0.0, 0.0, 0.0, 1.0, 0.0],
+       [0.0, 0.0, 0.0, 0.0, 1.0]]
+NEW = [[0.0, 0.5, 0.5, 0.0, 0.0],
+       [0.25, 0.25, 0.25, 0.25, 0.0],
+       [0.0, 0.0, 0.0, 0.25, 0.75],
+       [0.5, 0.0, 0.0, 0.0, 0.5],
+       [0.1, 0.2, 0.3, 0.4, 0.0]]
+CHUNKS = [(0, 2), (2, 4), (4, 5)]
+
+
+class ChunkedImportTest(scene.SceneTest):
+    '''
+    Chunked apply and rollback on plain Python lists.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        group = cmds.create_group('char')
+        self.meshes = [self.add_mesh(name, OLD, parent=group) for name in ('body', 'arm')]
+        self.written = []
+        write = self.backend.write
+
+        def record(deformer, weights, vertices=None, return_old=False):
+            self.written.append((deformer, None if vertices is None else list(vertices)))
+            return write(deformer, weights, vertices, return_old)
+        self.backend.write = record
+
+    def test_apply_chunked(self):
+        matrix = math_utils.to_matrix([x for row in NEW for x in row], len(scene.JOINTS))
+        self.assertTrue(self.tools.apply_chunked('bodySkin', self.meshes[0], matrix, CHUNKS, 'bar'))
+        self.assertEqual(self.written, [('bodySkin', [0, 1]), ('bodySkin', [2, 3]), ('bodySkin', [4])])
+        self.assertRowsEqual(self.rows('bodySkin'), NEW)
+
+    def test_rollback(self):
+        matrix = math_utils.to_matrix([x for row in NEW for x in row], len(scene.JOINTS))
+        # Cancelled before the third range: the two written are put back, the last first.
+        cmds.cancel_after[0] = 2
+        self.assertFalse(self.tools.apply_chunked('bodySkin', self.meshes[0], matrix, CHUNKS, 'bar'))
+        self.assertEqual(self.written, [('bodySkin', [0, 1]), ('bodySkin', [2, 3]),
+                                        ('bodySkin', [2, 3]), ('bodySkin', [0, 1])])
+        self.assertRowsEqual(self.rows('bodySkin'), OLD)
+
+    def test_import_in_chunks(self):
+        root = self.export_new()
+        result = self.tools.weight_import(root, self.meshes, method='index', chunk_size=2)
+        self.assertEqual(result['imported'], self.meshes)
+        self.assertFalse(result['cancelled'])
+        self.assertEqual([x[1] for x in self.written if x[0] == 'armSkin'], [[0, 1], [2, 3], [4]])
+        self.assertRowsEqual(self.rows('bodySkin'), NEW)
+        self.assertRowsEqual(self.rows('armSkin'), NEW)
+
+    def test_cancel_restores_current_mesh(self):
+        root = self.export_new()
+        # Cancelled once the second mesh has had its first range.
+        progress_bar = self.tools.progress_bar
+
+        def cancel_in_arm(bar, **kwargs):
+            if kwargs.get('isCancelled'):
+                return ('armSkin', [0, 1]) in self.written
+            return progress_bar(bar, **kwargs)
+        self.tools.progress_bar = cancel_in_arm
+        self.tools.main_progress_bar = lambda: 'bar'
+        result = self.tools.weight_import(root, self.meshes, method='index', chunk_size=2)
+        self.assertTrue(result['cancelled'])
+        self.assertEqual(result['imported'], self.meshes[:1])
+        # The mesh it was on goes back to how it was, the one finished before keeps its new weights.
+        self.assertRowsEqual(self.rows('armSkin'), OLD)
+        self.assertRowsEqual(self.rows('bodySkin'), NEW)
+
+    def export_new(self):
+        '''
+        Exports NEW for both meshes under a folder mirroring the scene, leaving the skinClusters with OLD.
+        :return: the folder
+        '''
+        root = self.temp_dir + '/weights'
+        for name in ('body', 'arm'):
+            self.set_rows(name + 'Skin', NEW)
+            self.export(name + 'Skin', '%s/char/%s.xml' % (root, name))
+            self.set_rows(name + 'Skin', OLD)
+        del self.written[:]
+        return root
+
+
+class ChunkedImportNumPyTest(ChunkedImportTest):
+    '''
+    The same on NumPy arrays.
+    '''
+    numpy = True
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from tests import scene
+from utils import remap_utils
+
+'''
+Checks remap plans, and remapping weights files between joint sets against the fixture in tests/data/remap:
+
+    python -m unittest tests.test_remap
+
+source.xml is skinned to rigA, plan.json takes it to rigB by a namespace rule, a wildcard rule and an exact rule for
+rigA:helper, which rigB dropped. renamed.xml is the result checked by hand, dropped.xml is what the ElementTree remap
+that xml_utils.remap_xml replaced wrote for rigA:helper alone. The _py2 files are the same under Python 2, whose
+ElementTree leaves out the XML declaration and sorts attributes.
+'''
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'remap').replace('\\', '/')
+SUFFIX = '_py2' if sys.version_info[0] == 2 else ''
+FILE_JOINTS = ['rigA:root', 'rigA:spine', 'rigA:L_arm_old', 'rigA:R_arm_old', 'rigA:helper']
+SKIN_JOINTS = ['rigB:root', 'rigB:spine', 'rigB:L_arm_jnt', 'rigB:R_arm_jnt']
+
+
+def read_file(path):
+    with open(path, 'rb') as input_file:
+        return input_file.read()
+
+
+class RemapFixtureTest(scene.SceneTest):
+    '''
+    Remaps the fixture and compares the result with the expected file byte for byte.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        self.source = DATA + '/source.xml'
+
+    def test_plan_mapping(self):
+        joints = self.tools.check_weights(path=self.source)
+        self.assertEqual(joints, FILE_JOINTS)
+        results = [[x for x in joints if x not in SKIN_JOINTS], [x for x in SKIN_JOINTS if x not in joints]]
+        plan = remap_utils.load_plan(DATA + '/plan.json')
+        sources, targets = self.tools.plan_mapping(results, SKIN_JOINTS, plan)
+        # Joints missing from the file map to themselves, then the file's joints go where the plan sends them.
+        self.assertEqual(sources, SKIN_JOINTS + FILE_JOINTS)
+        self.assertEqual(targets, SKIN_JOINTS + ['rigB:root', 'rigB:spine', 'rigB:L_arm_jnt', 'rigB:R_arm_jnt',
+                                                 'rigB:spine'])
+        write_path = self.temp_dir + '/renamed.xml'
+        self.tools.remap_weights(sources, targets, self.source, write_path)
+        self.assertEqual(read_file(write_path), read_file('%s/renamed%s.xml' % (DATA, SUFFIX)))
+        self.assertEqual(self.tools.check_weights(path=write_path), SKIN_JOINTS)
+
+    def test_dropped_joint(self):
+        write_path = self.temp_dir + '/dropped.xml'
+        self.tools.remap_weights(['rigA:helper'], ['rigA:spine'], self.source, write_path)
+        self.assertEqual(read_file(write_path), read_file('%s/dropped%s.xml' % (DATA, SUFFIX)))
+
+
+class RemapPlanTest(unittest.TestCase):
+    '''
+    Rules, their order, and plans saved and loaded back.
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='weight_tests_').replace('\\', '/')
+        self.old_directory = os.environ.get(remap_utils.PLANS_VARIABLE)
+        os.environ[remap_utils.PLANS_VARIABLE] = self.temp_dir + '/plans'
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        if self.old_directory is None:
+            del os.environ[remap_utils.PLANS_VARIABLE]
+        else:
+            os.environ[remap_utils.PLANS_VARIABLE] = self.old_directory
+
+    def mapping(self, plan, joints=FILE_JOINTS, available=SKIN_JOINTS):
+        return dict([(x, plan.resolve(x, set(available))) for x in joints])
+
+    def test_first_available_rule(self):
+        plan = remap_utils.RemapPlan(rules=[{'match': 'rigA:L_arm_old', 'target': 'rigB:L_arm'},
+                                            {'match': 'rigA:*_old', 'target': 'rigB:*_jnt'},
+                                            {'match': 'rigA:*_old', 'target': 'rigB:*'}])
+        # rigB:L_arm isn't on the skinCluster, so the wildcard answers.
+        self.assertEqual(plan.resolve('rigA:L_arm_old', set(SKIN_JOINTS)), 'rigB:L_arm_jnt')
+        self.assertEqual(plan.resolve('rigA:L_arm_old', set(SKIN_JOINTS + ['rigB:L_arm'])), 'rigB:L_arm')
+        self.assertEqual(plan.resolve('rigA:R_arm_old', set(['rigB:R_arm'])), 'rigB:R_arm')
+        self.assertEqual(plan.resolve('rigA:root', set(SKIN_JOINTS)), None)
+
+    def test_added_rule_goes_first(self):
+        plan = remap_utils.load_plan(DATA + '/plan.json')
+        self.assertEqual(plan.resolve('rigA:helper', set(SKIN_JOINTS)), 'rigB:spine')
+        plan.add_rule('rigA:helper', 'rigB:root')
+        plan.add_rule('rigA:helper', 'rigB:L_arm_jnt')
+        self.assertTrue(plan.changed)
+        # The answer replaces the exact rule for the joint, and what was remembered for it is forgotten.
+        self.assertEqual(plan.rules[0], {'match': 'rigA:helper', 'target': 'rigB:L_arm_jnt'})
+        self.assertEqual(len(plan.rules), 3)
+        self.assertEqual(plan.resolve('rigA:helper', set(SKIN_JOINTS)), 'rigB:L_arm_jnt')
+
+    def test_wildcards(self):
+        plan = remap_utils.RemapPlan(rules=[{'match': '?_*_old', 'target': '*_?_jnt'},
+                                            {'match': 'spine??', 'target': 'back?'}])
+        # The target's wildcards take what the match's matched in order, whichever kind they are.
+        self.assertEqual(plan.resolve('L_arm_old', set(['L_arm_jnt'])), 'L_arm_jnt')
+        self.assertEqual(plan.resolve('spine01', set(['back0'])), 'back0')
+        # Patterns match the whole name.
+        self.assertEqual(plan.resolve('L_arm_old1', set(['L_arm_jnt'])), None)
+        self.assertEqual(plan.resolve('rigA:spine01', set(['back0'])), None)
+
+    def test_namespaces(self):
+        plan = remap_utils.RemapPlan(rules=[{'namespace': ':rigA:', 'target': 'rigB'},
+                                            {'namespace': 'char:rigC', 'target': ''},
+                                            {'namespace': '*', 'target': 'rigD'}])
+        available = set(['rigB:spine', 'neck', 'rigD:head', 'rigD:hand'])
+        self.assertEqual(plan.resolve('rigA:spine', available), 'rigB:spine')
+        # Only the last name is the joint, everything before it is the namespace.
+        self.assertEqual(plan.resolve('char:rigC:neck', available), 'neck')
+        self.assertEqual(plan.resolve('rigC:neck', available), None)
+        # '*' is any namespace, but not none.
+        self.assertEqual(plan.resolve('rigX:head', available), 'rigD:head')
+        self.assertEqual(plan.resolve('hand', available), None)
+
+    def test_bad_rule(self):
+        self.assertRaises(ValueError, remap_utils.RemapPlan, None, [{'match': 'spine'}])
+
+    def test_save_and_load(self):
+        plan = remap_utils.load_plan(DATA + '/plan.json')
+        plan.add_rule('rigA:root', 'rigB:spine')
+        path = remap_utils.save_plan(plan, self.temp_dir + '/saved/plan.json')
+        self.assertFalse(plan.changed)
+        loaded = remap_utils.load_plan(path)
+        self.assertEqual((loaded.name, loaded.path, loaded.rules), ('rigA_to_rigB', path, plan.rules))
+        self.assertEqual(self.mapping(loaded), self.mapping(plan))
+        self.assertEqual(self.mapping(loaded), {'rigA:root': 'rigB:spine', 'rigA:spine': 'rigB:spine',
+                                                'rigA:L_arm_old': 'rigB:L_arm_jnt',
+                                                'rigA:R_arm_old': 'rigB:R_arm_jnt', 'rigA:helper': 'rigB:spine'})
+
+    def test_named_plans(self):
+        plan = remap_utils.get_plan('rigs')
+        self.assertEqual((plan.name, plan.rules), ('rigs', []))
+        plan.add_rule('rigA:helper', 'rigB:spine')
+        self.assertEqual(remap_utils.save_plan(plan), self.temp_dir + '/plans/rigs.json')
+        self.assertEqual(remap_utils.list_plans(), ['rigs'])
+        self.assertEqual(self.mapping(remap_utils.get_plan('rigs')), self.mapping(plan))
+
+    def test_wrong_version(self):
+        with open(self.temp_dir + '/old.json', 'w') as output:
+            json.dump({'version': 0, 'rules': []}, output)
+        self.assertRaises(ValueError, remap_utils.load_plan, self.temp_dir + '/old.json')
+
+
+if __name__ == '__main__':
+    unittest.main()
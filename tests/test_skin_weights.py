@@ -0,0 +1,278 @@
+import gzip
+import os
+import unittest
+from maya import cmds
+from tests import scene
+from utils import delta_utils
+from utils import export_utils
+from utils import math_utils
+from utils import skin_utils
+
+'''
+Checks finding skinClusters, the influence audit, pruning and weight deltas against skinClusters kept in memory
+(skin_utils.FakeBackend) on a scene of the Maya stand-in, so no Maya is needed:
+
+    python -m unittest tests.test_skin_weights
+
+Every test runs twice, once on plain Python lists and once on NumPy arrays. The NumPy runs are skipped where NumPy
+isn't installed.
+'''
+
+# One row per vertex, one weight per joint.
+ROWS = [[0.25, 0.25, 0.25, 0.25, 0.0],
+        [0.2, 0.2, 0.2, 0.2, 0.2],
+        [0.1, 0.3, 0.1, 0.5, 0.0],
+        [1.0, 0.0, 0.0, 0.0, 0.0],
+        [0.05, 0.05, 0.3, 0.3, 0.3],
+        [0.3, 0.3, 0.0, 0.0, 0.0]]
+# ROWS pruned to three influences: ties drop the lower index first and the rows that lost weights sum to one again.
+# The last row is under the limit, so it is left as it is even though it doesn't sum to one.
+PRUNED = [[0.0, 1 / 3.0, 1 / 3.0, 1 / 3.0, 0.0],
+          [0.0, 0.0, 1 / 3.0, 1 / 3.0, 1 / 3.0],
+          [0.0, 0.3 / 0.9, 0.1 / 0.9, 0.5 / 0.9, 0.0],
+          [1.0, 0.0, 0.0, 0.0, 0.0],
+          [0.0, 0.0, 1 / 3.0, 1 / 3.0, 1 / 3.0],
+          [0.3, 0.3, 0.0, 0.0, 0.0]]
+# ROWS with vertices 1 and 4 painted differently.
+PAINTED = [ROWS[0], [0.0, 0.5, 0.5, 0.0, 0.0], ROWS[2], ROWS[3], [0.0, 0.0, 0.0, 0.25, 0.75], ROWS[5]]
+
+
+class SkinWeightsTest(scene.SceneTest):
+    '''
+    Audit, prune and deltas on plain Python lists.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        self.mesh = self.add_mesh('body', ROWS, deformer='skinCluster1')
+
+    def matrix(self):
+        return math_utils.to_matrix(self.backend.read('skinCluster1').weights, len(scene.JOINTS))
+
+    def test_matrix_type(self):
+        self.assertEqual(math_utils.is_array(self.matrix()), self.numpy)
+
+    def test_influence_counts(self):
+        self.assertEqual([int(x) for x in math_utils.influence_counts(self.matrix())], [4, 5, 4, 1, 5, 2])
+
+    def test_audit_influences(self):
+        self.assertEqual(math_utils.audit_influences(self.matrix(), 3), (5, [0, 1, 2, 4]))
+        self.assertEqual(math_utils.audit_influences(self.matrix(), 4), (5, [1, 4]))
+        self.assertEqual(math_utils.audit_influences(self.matrix(), 5), (5, []))
+
+    def test_audit_vert_influences(self):
+        report = self.tools.audit_vert_influences(3, self.mesh)
+        self.assertEqual(report, {self.mesh: {'max': 5, 'vertices': [0, 1, 2, 4]}})
+
+    def test_prune_ties(self):
+        pruned, vertices = math_utils.prune_matrix(self.matrix(), 4)
+        self.assertEqual(vertices, [1, 4])
+        # Of five equal weights the first goes, and of two equal lowest weights the first.
+        self.assertRowsEqual(pruned[1:2], [[0.0, 0.25, 0.25, 0.25, 0.25]])
+        self.assertRowsEqual(pruned[4:5], [[0.0, 0.05 / 0.95, 0.3 / 0.95, 0.3 / 0.95, 0.3 / 0.95]])
+
+    def test_prune_renormalizes(self):
+        pruned, vertices = math_utils.prune_matrix(self.matrix(), 3)
+        self.assertEqual(vertices, [0, 1, 2, 4])
+        self.assertRowsEqual(pruned, PRUNED)
+        self.assertEqual(math_utils.unnormalized(pruned, 1e-9), [5])
+
+    def test_prune_under_limit(self):
+        pruned, vertices = math_utils.prune_matrix(self.matrix(), 5)
+        self.assertEqual(vertices, [])
+        self.assertRowsEqual(pruned, ROWS)
+
+    def test_prune_over_influenced_verts(self):
+        self.tools.prune_over_influenced_verts(3, self.mesh)
+        self.assertRowsEqual(self.rows('skinCluster1'), PRUNED)
+        self.assertEqual(math_utils.audit_influences(self.matrix(), 3), (3, []))
+
+    def painted_files(self):
+        '''
+        Exports ROWS and PAINTED, leaving the skinCluster with ROWS.
+        :return: (old path, new path)
+        '''
+        old_path = self.export('skinCluster1', self.temp_dir + '/old.xml')
+        self.set_rows('skinCluster1', PAINTED)
+        new_path = self.export('skinCluster1', self.temp_dir + '/new.xml')
+        self.set_rows('skinCluster1', ROWS)
+        return old_path, new_path
+
+    def test_diff_weights(self):
+        delta = self.tools.diff_weights(*self.painted_files())
+        self.assertEqual(delta_utils.stats(delta), {'entries': 10, 'vertices': 2, 'joints': 5})
+        self.assertEqual(delta['changes']['j4'], [[1, 4], [0.0, 0.75]])
+        self.assertEqual((delta['vertex_count'], delta['added'], delta['removed']), (6, [], []))
+
+    def test_delta_round_trip(self):
+        old_path, new_path = self.painted_files()
+        self.tools.diff_weights(old_path, new_path, write_path=self.temp_dir + '/paint.wdelta')
+        result = self.tools.import_delta(self.temp_dir + '/paint.wdelta', self.mesh)
+        self.assertEqual((result['deformer'], result['vertices']), ('skinCluster1', 2))
+        self.assertRowsEqual(self.rows('skinCluster1'), PAINTED)
+
+    def test_compressed_delta(self):
+        old_path, new_path = self.painted_files()
+        delta = self.tools.diff_weights(old_path, new_path, write_path=self.temp_dir + '/paint.wdelta.gz')
+        with gzip.open(self.temp_dir + '/paint.wdelta.gz') as delta_file:
+            self.assertTrue(delta_file.read().startswith(b'{'))
+        self.assertEqual(delta_utils.read_delta(self.temp_dir + '/paint.wdelta.gz'), delta)
+        self.tools.import_delta(self.temp_dir + '/paint.wdelta.gz', self.mesh)
+        self.assertRowsEqual(self.rows('skinCluster1'), PAINTED)
+
+    def test_import_delta_writes_touched_vertices(self):
+        old_path, new_path = self.painted_files()
+        self.tools.diff_weights(old_path, new_path, write_path=self.temp_dir + '/paint.wdelta')
+        written = []
+        write = self.backend.write
+
+        def record(deformer, weights, vertices=None, return_old=False):
+            written.append(None if vertices is None else list(vertices))
+            return write(deformer, weights, vertices, return_old)
+        self.backend.write = record
+        self.tools.import_delta(self.temp_dir + '/paint.wdelta', self.mesh)
+        self.assertEqual(written, [[1, 4]])
+        self.assertRowsEqual(self.rows('skinCluster1'), PAINTED)
+
+    def test_export_delta(self):
+        old_path = self.export('skinCluster1', self.temp_dir + '/old.xml')
+        self.set_rows('skinCluster1', PAINTED)
+        delta = self.tools.export_delta(old_path, self.mesh)
+        new_path = self.export('skinCluster1', self.temp_dir + '/new.xml')
+        self.assertEqual(delta['changes'], self.tools.diff_weights(old_path, new_path)['changes'])
+        self.assertEqual(delta_utils.read_delta(self.temp_dir + '/old.wdelta'), delta)
+
+
+class SkinWeightsNumPyTest(SkinWeightsTest):
+    '''
+    The same on NumPy arrays.
+    '''
+    numpy = True
+
+
+class SkinResolverTest(scene.SceneTest):
+    '''
+    Finding the skinClusters of meshes, once per operation.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        group = cmds.create_group('char')
+        self.meshes = [self.add_mesh(name, ROWS, parent=group) for name in ('body', 'arm')]
+        self.prop = cmds.create_mesh('prop', [(0.0, 0.0, 0.0)], parent=group)
+        self.queries = []
+        skin_cluster = cmds.skinCluster
+        list_history = cmds.listHistory
+
+        def record_skin_cluster(*items, **kwargs):
+            if kwargs.get('q') and kwargs.get('g'):
+                self.queries.append(items[0])
+            return skin_cluster(*items, **kwargs)
+
+        def record_history(item, **kwargs):
+            self.queries.append(('history', item))
+            return list_history(item, **kwargs)
+        cmds.skinCluster = record_skin_cluster
+        cmds.listHistory = record_history
+        self.addCleanup(setattr, cmds, 'skinCluster', skin_cluster)
+        self.addCleanup(setattr, cmds, 'listHistory', list_history)
+
+    def test_find(self):
+        resolver = skin_utils.SkinResolver()
+        self.assertEqual(resolver.find(self.meshes[0]), 'bodySkin')
+        self.assertEqual(resolver.find(self.meshes[0] + '|bodyShape'), 'bodySkin')
+        self.assertEqual(resolver.find('arm'), 'armSkin')
+        self.assertEqual(resolver.find_all(self.meshes[1]), ['armSkin'])
+        # The scene was mapped once, one query per skinCluster.
+        self.assertEqual(sorted(self.queries), ['armSkin', 'bodySkin'])
+
+    def test_no_skin_cluster(self):
+        resolver = skin_utils.SkinResolver()
+        self.assertEqual(resolver.find(self.prop), None)
+        self.assertEqual(resolver.find(self.prop + '|propShape'), None)
+        self.assertEqual(resolver.find_all(self.prop), [])
+        self.assertEqual(resolver.find(self.meshes[0]), 'bodySkin')
+        self.assertEqual(len(self.queries), 2)
+
+    def test_once_per_export(self):
+        root = self.temp_dir + '/weights'
+        result = self.tools.weight_export(root, self.meshes + [self.prop], overwrite=True)
+        self.assertEqual(sorted(self.queries), ['armSkin', 'bodySkin'])
+        self.assertEqual(sorted(result['written']), [root + '/char/arm.xml', root + '/char/body.xml'])
+        self.assertFalse(os.path.exists(root + '/char/prop.xml'))
+        # The next operation maps the scene again, and sees what changed since.
+        cmds.create_skin_cluster('propSkin', self.prop, scene.JOINTS, [ROWS[0]])
+        self.backend.add_skin('propSkin', self.prop + '|propShape', scene.JOINTS, [ROWS[0]], points=[0.0, 0.0, 0.0])
+        del self.queries[:]
+        result = self.tools.weight_export(root, self.meshes + [self.prop], overwrite=True)
+        self.assertEqual(sorted(self.queries), ['armSkin', 'bodySkin', 'propSkin'])
+        self.assertEqual(len(result['written']), 3)
+
+    def test_once_per_import(self):
+        root = self.temp_dir + '/weights'
+        self.tools.weight_export(root, self.meshes, overwrite=True)
+        del self.queries[:]
+        result = self.tools.weight_import(root, self.meshes + [self.prop], method='index', interactive=False)
+        self.assertEqual(sorted(self.queries), ['armSkin', 'bodySkin'])
+        self.assertEqual(result['imported'], self.meshes)
+        self.assertEqual(self.tools.resolve_times['weight_import'], result['resolve_seconds'])
+
+
+class BufferParityTest(scene.SceneTest):
+    '''
+    The scene layer gives the same answers on array('d') buffers as on NumPy ones.
+    '''
+    numpy = True
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        self.add_mesh('body', ROWS)
+
+    def run_on(self, numpy):
+        '''
+        Reads, hashes, paints and restores a skinCluster with or without NumPy.
+        :param numpy:
+        :return: everything it saw, as plain Python values.
+        '''
+        math_utils.np = scene.NUMPY if numpy else None
+        cmds.reset()
+        self.backend = skin_utils.FakeBackend()
+        skin_utils.set_backend(self.backend)
+        self.add_mesh('body', ROWS)
+        data = skin_utils.read_skin('bodySkin')
+        self.assertEqual(math_utils.is_array(data.weights), numpy)
+        matrix, influences = skin_utils.get_weights('bodySkin')
+        self.assertEqual(math_utils.is_array(matrix), numpy)
+        seen = {'matrix': [[float(x) for x in row] for row in matrix], 'influences': influences,
+                'hash': skin_utils.content_hash('bodySkin'),
+                'sparse_hash': skin_utils.content_hash('bodySkin', (0.01, 3))}
+        old = skin_utils.set_rows('bodySkin', math_utils.flatten(math_utils.to_matrix(
+            [x for row in PAINTED for x in row], len(scene.JOINTS)), [1, 4]), [1, 4], return_old=True)
+        seen['old'] = old
+        seen['painted'] = math_utils.flatten(skin_utils.get_weights('bodySkin')[0])
+        seen['painted_hash'] = skin_utils.content_hash('bodySkin')
+        self.assertEqual(skin_utils.set_rows('bodySkin', old, [1, 4]), None)
+        seen['restored_hash'] = skin_utils.content_hash('bodySkin')
+        return seen
+
+    def test_same_results(self):
+        on_lists = self.run_on(False)
+        on_arrays = self.run_on(True)
+        self.assertEqual(on_arrays, on_lists)
+        self.assertEqual(on_lists['old'], ROWS[1] + ROWS[4])
+        self.assertEqual(on_lists['painted'], [x for row in PAINTED for x in row])
+        self.assertEqual(on_lists['restored_hash'], on_lists['hash'])
+        self.assertNotEqual(on_lists['painted_hash'], on_lists['hash'])
+
+    def test_hash_of_plain_list(self):
+        # Export data built by hand, with the weights as a list, hashes like the buffer read from the scene.
+        data = skin_utils.get_export_data('bodySkin')
+        self.assertTrue(math_utils.is_array(data['weights']))
+        expected = export_utils.content_hash(data)
+        data['weights'] = [float(x) for x in data['weights']]
+        self.assertEqual(export_utils.content_hash(data), expected)
+        self.assertEqual(expected, self.run_on(False)['hash'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import math
+import random
+import unittest
+from utils import transfer_utils
+
+'''
+Checks the grid nearest neighbour search and inverse distance blending of utils/transfer_utils.py against a brute
+force search over every point:
+
+    python -m unittest tests.test_transfer
+
+The KD-tree is left out so the grid is what runs, first in plain Python and then in NumPy blocks (skipped where
+NumPy isn't installed).
+'''
+
+NUMPY = transfer_utils.np
+NEIGHBOURS = 4
+
+
+def scatter(seed):
+    '''
+    Returns indexed positions and query points: a dense patch, a few points far off and a sparse line, queried at
+    random spots in and around them, at some of the indexed positions exactly and well outside the bounds.
+    :param seed:
+    :return: (positions, points), flat x, y, z values.
+    '''
+    generator = random.Random(seed)
+    positions = []
+    for _ in range(300):
+        positions.extend([generator.uniform(0, 1), generator.uniform(0, 1), generator.uniform(0, 0.1)])
+    for _ in range(5):
+        positions.extend([generator.uniform(20, 30), generator.uniform(-5, 5), generator.uniform(-5, 5)])
+    for i in range(20):
+        positions.extend([-10.0 + i * 0.5, 3.0, generator.uniform(-0.01, 0.01)])
+    points = []
+    for _ in range(200):
+        points.extend([generator.uniform(-12, 32), generator.uniform(-6, 6), generator.uniform(-6, 6)])
+    for _ in range(100):
+        points.extend([generator.uniform(-0.2, 1.2), generator.uniform(-0.2, 1.2), generator.uniform(-0.1, 0.2)])
+    for i in range(0, 60, 3):
+        points.extend(positions[i * 3:i * 3 + 3])
+    points.extend([500.0, -500.0, 0.0, -1000.0, 0.0, 0.0])
+    return positions, points
+
+
+def brute_force(ids, positions, points, neighbours):
+    '''
+    Sorts every indexed position by its distance to each point.
+    :return: [[(distance, id), ...], ...] a row per point, nearest first.
+    '''
+    rows = []
+    for i in range(0, len(points), 3):
+        found = []
+        for j, vertex in enumerate(ids):
+            found.append((math.sqrt(sum([(positions[j * 3 + axis] - points[i + axis]) ** 2 for axis in range(3)])),
+                          vertex))
+        found.sort()
+        rows.append(found[:neighbours])
+    return rows
+
+
+class GridTransferTest(unittest.TestCase):
+    '''
+    The grid in plain Python.
+    '''
+    numpy = False
+
+    def setUp(self):
+        if self.numpy and NUMPY is None:
+            self.skipTest('NumPy is not installed')
+        self.old = transfer_utils.np, transfer_utils.cKDTree
+        transfer_utils.np = NUMPY if self.numpy else None
+        transfer_utils.cKDTree = None
+        self.positions, self.points = scatter(7)
+        count = len(self.positions) // 3
+        # Ids that aren't the point order, as in a file whose vertices were written out of order.
+        self.ids = [(i * 7) % count for i in range(count)]
+        generator = random.Random(11)
+        self.matrix = [[generator.random() for _ in range(3)] for _ in range(count)]
+
+    def tearDown(self):
+        transfer_utils.np, transfer_utils.cKDTree = self.old
+
+    def index(self):
+        index = transfer_utils.SpatialIndex(self.ids, self.positions)
+        self.assertEqual(index._tree, None)
+        return index
+
+    def assertNearest(self, index, neighbours):
+        distances, ids = index.query(self.points, neighbours)
+        expected = brute_force(self.ids, self.positions, self.points, neighbours)
+        self.assertEqual(len(distances), len(expected))
+        for row_distances, row_ids, row in zip(distances, ids, expected):
+            self.assertEqual([int(x) for x in row_ids], [x[1] for x in row])
+            for distance, (expected_distance, _) in zip(row_distances, row):
+                self.assertAlmostEqual(float(distance), expected_distance, places=9)
+
+    def test_nearest(self):
+        self.assertNearest(self.index(), 1)
+
+    def test_neighbours(self):
+        self.assertNearest(self.index(), NEIGHBOURS)
+
+    def test_more_neighbours_than_points(self):
+        index = transfer_utils.SpatialIndex(self.ids[:3], self.positions[:9])
+        distances, ids = index.query(self.points[:30], 10)
+        self.assertEqual([len(x) for x in ids], [3] * 10)
+
+    def test_blend(self):
+        index = self.index()
+        matrix = NUMPY.array(self.matrix) if self.numpy else self.matrix
+        result = transfer_utils.transfer(index, matrix, self.points, NEIGHBOURS)
+        expected = brute_force(self.ids, self.positions, self.points, NEIGHBOURS)
+        for row, found in zip(result, expected):
+            if found[0][0] < transfer_utils.EPSILON:
+                blend = [(1.0, found[0][1])]
+            else:
+                blend = [(1.0 / distance ** 2, vertex) for distance, vertex in found]
+            total = sum([x[0] for x in blend])
+            for layer in range(3):
+                value = sum([amount * self.matrix[vertex][layer] for amount, vertex in blend]) / total
+                self.assertAlmostEqual(float(row[layer]), value, places=9)
+
+    def test_nearest_copies(self):
+        matrix = NUMPY.array(self.matrix) if self.numpy else self.matrix
+        result = transfer_utils.transfer(self.index(), matrix, self.points, 1)
+        expected = brute_force(self.ids, self.positions, self.points, 1)
+        for row, found in zip(result, expected):
+            self.assertEqual([float(x) for x in row], self.matrix[found[0][1]])
+
+
+class GridTransferNumPyTest(GridTransferTest):
+    '''
+    The grid in NumPy blocks.
+    '''
+    numpy = True
+
+    def test_split_blocks(self):
+        # Small blocks and candidate budgets answer the same as one block.
+        old = transfer_utils.QUERY_BLOCK, transfer_utils.CANDIDATE_BUDGET
+        transfer_utils.QUERY_BLOCK, transfer_utils.CANDIDATE_BUDGET = 16, 64
+        try:
+            self.assertNearest(self.index(), NEIGHBOURS)
+        finally:
+            transfer_utils.QUERY_BLOCK, transfer_utils.CANDIDATE_BUDGET = old
+
+
+if __name__ == '__main__':
+    unittest.main()
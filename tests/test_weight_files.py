@@ -0,0 +1,584 @@
+import os
+import re
+import xml.etree.ElementTree as et
+import shutil
+import time
+import unittest
+from maya import cmds
+from tests import scene
+from utils import binary_utils
+from utils import bundle_utils
+from utils import compress_utils
+from utils import index_utils
+from utils import manifest_utils
+from utils import skin_utils
+from utils import xml_utils
+
+'''
+Checks the weights files the tools write and read back, on a scene of the Maya stand-in:
+
+    python -m unittest tests.test_weight_files
+'''
+
+BODY = [[1.0, 0.0, 0.0, 0.0, 0.0],
+        [0.5, 0.5, 0.0, 0.0, 0.0],
+        [0.0, 0.25, 0.75, 0.0, 0.0]]
+ARM = [[0.0, 0.0, 1.0, 0.0, 0.0],
+       [0.0, 0.0, 0.4, 0.6, 0.0],
+       [0.0, 0.0, 0.0, 0.2, 0.8]]
+
+
+def without_file_name(data):
+    '''
+    Takes the path deformerWeights writes into the header out of a file's text, it being the only thing that differs
+    between the same weights written to two places.
+    :param data:
+    :return:
+    '''
+    return re.sub(b'fileName="[^"]*"', b'fileName=""', data)
+
+
+def read_file(path):
+    with open(path, 'rb') as input_file:
+        return input_file.read()
+
+
+class SidecarTest(scene.SceneTest):
+    '''
+    Binary sidecars against the XML they are written from.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        self.body = self.add_mesh('body', BODY)
+        self.arm = self.add_mesh('arm', ARM)
+        self.path = self.temp_dir + '/body.xml'
+
+    def test_round_trip(self):
+        self.tools.weight_export(self.path, [self.body], overwrite=True)
+        binary_path = binary_utils.sidecar_path(self.path)
+        self.assertEqual(binary_path, self.temp_dir + '/body.wbin')
+        binary_utils.binary_to_xml(binary_path, self.temp_dir + '/copy.xml')
+        self.assertEqual(read_file(self.temp_dir + '/copy.xml'), read_file(self.path))
+        # Converting the copy again gives the same sidecar.
+        binary_utils.xml_to_binary(self.temp_dir + '/copy.xml')
+        self.assertEqual(read_file(self.temp_dir + '/copy.wbin'), read_file(binary_path))
+
+    def test_round_trip_written_sidecar(self):
+        # Sidecars written alongside the XML rather than converted from it, as pipeline exports do.
+        self.export('bodySkin', self.path)
+        binary_utils.binary_to_xml(binary_utils.sidecar_path(self.path), self.temp_dir + '/copy.xml')
+        self.assertEqual(read_file(self.temp_dir + '/copy.xml'), read_file(self.path))
+
+    def test_reads_fresh_sidecar(self):
+        self.tools.weight_export(self.path, [self.body], overwrite=True)
+        with binary_utils.read_binary(binary_utils.sidecar_path(self.path)) as weights:
+            self.assertEqual(list(weights.joints), scene.JOINTS)
+        self.assertEqual(self.tools.read_columns(self.path), xml_utils.read_columns(self.path))
+
+    def test_stale_sidecar(self):
+        self.tools.weight_export(self.path, [self.body], overwrite=True)
+        binary_path = binary_utils.sidecar_path(self.path)
+        sidecar = self.tools.read_columns(self.path)
+        # Replace the XML by hand with the arm's weights, leaving the body's sidecar next to it.
+        self.tools.weight_export(self.temp_dir + '/arm.xml', [self.arm], overwrite=True)
+        with open(self.path, 'wb') as output:
+            output.write(read_file(self.temp_dir + '/arm.xml'))
+        os.utime(binary_path, (1000000000, 1000000000))
+        os.utime(self.path, (1000000100, 1000000100))
+        self.assertEqual(binary_utils.fresh_sidecar(self.path), None)
+        self.assertEqual(self.tools.read_columns(self.path), xml_utils.read_columns(self.temp_dir + '/arm.xml'))
+        self.assertEqual(self.tools.read_positions(self.path), xml_utils.read_positions(self.path))
+        self.assertNotEqual(self.tools.read_columns(self.path), sidecar)
+        # The same sidecar as new as the XML is read instead of it.
+        os.utime(binary_path, (1000000100, 1000000100))
+        self.assertEqual(binary_utils.fresh_sidecar(self.path), binary_path)
+        self.assertEqual(self.tools.read_columns(self.path), sidecar)
+
+
+class CompressedTest(scene.SceneTest):
+    '''
+    Compressed exports against the plain export of the same mesh, each read the way the tools read them.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        self.body = self.add_mesh('body', BODY)
+        for folder in ('plain', 'gz', 'out'):
+            os.makedirs('%s/%s' % (self.temp_dir, folder))
+        self.plain = self.temp_dir + '/plain/body.xml'
+        self.path = self.temp_dir + '/gz/body.xml.gz'
+        self.tools.weight_export(self.plain, [self.body], overwrite=True)
+        self.tools.weight_export(self.path, [self.body], overwrite=True)
+
+    def test_written_compressed(self):
+        self.assertEqual(os.listdir(self.temp_dir + '/gz'), ['body.xml.gz'])
+        with compress_utils.open_read(self.path) as stream:
+            self.assertEqual(without_file_name(stream.read()), without_file_name(read_file(self.plain)))
+
+    def test_check(self):
+        self.assertEqual(self.tools.check_weights(path=self.path), scene.JOINTS)
+        self.assertEqual(self.tools.check_weights(path=self.path), xml_utils.read_joints(self.plain))
+        self.assertEqual(self.tools.check_weights('bodySkin', path=self.path), [[], []])
+
+    def test_read(self):
+        self.assertEqual(self.tools.read_columns(self.path), xml_utils.read_columns(self.plain))
+        self.assertEqual(self.tools.read_positions(self.path), xml_utils.read_positions(self.plain))
+
+    def test_iterparse(self):
+        def elements(path):
+            return [(event, element.tag, sorted(element.attrib.items()))
+                    for event, element in compress_utils.iterparse(path, events=('start', 'end'))
+                    if element.tag != 'headerInfo']
+        self.assertEqual(elements(self.path), elements(self.plain))
+
+    def test_remap(self):
+        source, target = ['j0', 'j1'], ['j4', 'j3']
+        self.tools.remap_weights(source, target, self.path, self.temp_dir + '/out/gz.xml')
+        self.tools.remap_weights(source, target, self.plain, self.temp_dir + '/out/plain.xml')
+        self.assertEqual(without_file_name(read_file(self.temp_dir + '/out/gz.xml')),
+                         without_file_name(read_file(self.temp_dir + '/out/plain.xml')))
+        joints, columns, vertex_count = xml_utils.read_columns(self.temp_dir + '/out/gz.xml')
+        # j0 and j1 are merged into j4 and j3.
+        self.assertEqual((joints, vertex_count), (['j2', 'j3', 'j4'], len(BODY)))
+        self.assertEqual([(list(x), list(y)) for x, y in columns],
+                         [([2], [0.75]), ([1, 2], [0.5, 0.25]), ([0, 1], [1.0, 0.5])])
+        self.assertEqual(self.tools.remap_in_memory(self.path, source, target, scene.JOINTS, len(BODY)),
+                         self.tools.remap_in_memory(self.plain, source, target, scene.JOINTS, len(BODY)))
+
+
+class IterElementsTest(scene.SceneTest):
+    '''
+    The lazy reader under check, remap and the readers: what it keeps in memory and the files it leaves open.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        self.add_mesh('body', BODY)
+        self.path = self.export('bodySkin', self.temp_dir + '/body.xml')
+        self.streams = []
+        self.elements = []
+        self.open_read = compress_utils.open_read
+        self.iterparse = compress_utils.iterparse
+        compress_utils.open_read = self.record_stream
+        compress_utils.iterparse = self.record_elements
+
+    def tearDown(self):
+        compress_utils.open_read = self.open_read
+        compress_utils.iterparse = self.iterparse
+        scene.SceneTest.tearDown(self)
+
+    def record_stream(self, path):
+        stream = self.open_read(path)
+        self.streams.append(stream)
+        return stream
+
+    def record_elements(self, path, events=('end',)):
+        for event, elem in self.iterparse(path, events):
+            if event == 'start':
+                self.elements.append(elem)
+            yield event, elem
+
+    def test_clears_elements(self):
+        tags = []
+        done = []
+        for tag, attributes, points in xml_utils.iter_elements(self.path):
+            root, elem = self.elements[0], self.elements[-1]
+            # The parser builds the tree a block ahead, but whatever has been read is gone from it.
+            self.assertEqual([x for x in done if x in list(root)], [])
+            read = []
+            for index, value in points:
+                self.assertEqual([x for x in elem if int(x.get('index')) in read], [])
+                read.append(index)
+            self.assertEqual(len(elem), 0)
+            tags.append(tag)
+            done.append(elem)
+        self.assertEqual(tags, ['headerInfo', 'shape'] + ['weights'] * len(scene.JOINTS))
+        self.assertEqual([len(x) for x in self.elements], [0] * len(self.elements))
+
+    def test_skipped_points_cleared(self):
+        # Points nobody reads are dropped all the same.
+        for tag, attributes, points in xml_utils.iter_elements(self.path):
+            pass
+        self.assertEqual([len(x) for x in self.elements], [0] * len(self.elements))
+
+    def check_closed_early(self, path):
+        elements = xml_utils.iter_elements(path)
+        self.assertEqual(next(elements)[0], 'headerInfo')
+        self.assertEqual(len(self.streams), 1)
+        self.assertFalse(self.streams[0].closed)
+        elements.close()
+        self.assertTrue(self.streams[0].closed)
+
+    def test_closed_early(self):
+        self.check_closed_early(self.path)
+
+    def test_compressed_closed_early(self):
+        path = compress_utils.compress_file(self.path)
+        del self.streams[:]
+        self.check_closed_early(path)
+
+    def test_member_closed_early(self):
+        bundle_utils.write_bundle(self.temp_dir + '/rig.wbundle', {'|body': ('body.xml', self.path, scene.JOINTS)})
+        self.check_closed_early(self.temp_dir + '/rig.wbundle/body.xml')
+        bundle_utils.clear_toc_cache()
+
+    def test_read_positions_closes(self):
+        ids, values = xml_utils.read_positions(self.path)
+        self.assertEqual(list(ids), list(range(len(BODY))))
+        self.assertEqual([x.closed for x in self.streams], [True])
+
+
+class BundleTest(scene.SceneTest):
+    '''
+    Bundles against the plain folder export of the same meshes.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        self.body = self.add_mesh('body', BODY)
+        self.arm = self.add_mesh('arm', ARM, parent=cmds.create_group('char'))
+        self.path = self.temp_dir + '/rig.wbundle'
+
+    def tearDown(self):
+        bundle_utils.clear_toc_cache()
+        scene.SceneTest.tearDown(self)
+
+    def read_member(self, name):
+        '''
+        Reads a member straight out of the bundle file at the offset its table of contents gives.
+        :param name:
+        :return:
+        '''
+        entry = bundle_utils.read_toc(self.path).entry(name)
+        with open(self.path, 'rb') as input_file:
+            input_file.seek(entry['offset'])
+            return input_file.read(entry['length'])
+
+    def export_plain(self, *items):
+        '''
+        Exports items the usual way, into a plain folder next to the bundle.
+        :param items:
+        :return:
+        '''
+        if len(items) > 1:
+            return self.tools.weight_export(self.temp_dir + '/plain', list(items), overwrite=True)
+        # A single item goes to the file it is given, in a folder that has to exist.
+        path = '%s/plain/%s.xml' % (self.temp_dir, items[0][1:].replace('|', '/'))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        return self.tools.weight_export(path, list(items), overwrite=True)
+
+    def read_plain(self, name):
+        return read_file('%s/plain/%s' % (self.temp_dir, name))
+
+    def test_table_of_contents(self):
+        result = self.tools.export_bundle(self.path, [self.body, self.arm], overwrite=True)
+        self.assertEqual(result['written'], [self.path + '/body.xml', self.path + '/char/arm.xml'])
+        toc = bundle_utils.read_toc(self.path)
+        self.assertEqual(sorted(toc.entries), ['|body', '|char|arm'])
+        self.assertEqual([toc.entries[x]['name'] for x in ('|body', '|char|arm')], ['body.xml', 'char/arm.xml'])
+        self.assertEqual(toc.joints('char/arm.xml'), scene.JOINTS)
+        self.assertEqual(toc.lookup(self.arm), self.path + '/char/arm.xml')
+
+    def test_members_match_plain_export(self):
+        self.tools.export_bundle(self.path, [self.body, self.arm], overwrite=True)
+        self.export_plain(self.body, self.arm)
+        for name in ('body.xml', 'char/arm.xml'):
+            data = self.read_member(name)
+            self.assertEqual(without_file_name(data), without_file_name(self.read_plain(name)))
+            with bundle_utils.open_member(bundle_utils.member_path(self.path, name)) as member:
+                self.assertEqual(member.read(), data)
+            self.assertEqual(xml_utils.read_columns(bundle_utils.member_path(self.path, name)),
+                             xml_utils.read_columns('%s/plain/%s' % (self.temp_dir, name)))
+
+    def test_export_into_existing_bundle(self):
+        self.tools.export_bundle(self.path, [self.body, self.arm], overwrite=True)
+        body = self.read_member('body.xml')
+        arm = self.read_member('char/arm.xml')
+        cmds.skinPercent('armSkin', self.arm + '.vtx[0]', tv=[('j4', 1.0)])
+        result = self.tools.export_bundle(self.path, [self.arm], overwrite=True)
+        self.assertEqual(result['written'], [self.path + '/char/arm.xml'])
+        self.assertEqual(sorted(bundle_utils.read_toc(self.path).entries), ['|body', '|char|arm'])
+        self.assertEqual(self.read_member('body.xml'), body)
+        self.assertNotEqual(self.read_member('char/arm.xml'), arm)
+        self.export_plain(self.arm)
+        self.assertEqual(without_file_name(self.read_member('char/arm.xml')),
+                         without_file_name(self.read_plain('char/arm.xml')))
+
+    def test_keep_existing_members(self):
+        self.tools.export_bundle(self.path, [self.body], overwrite=True)
+        body = self.read_member('body.xml')
+        cmds.skinPercent('bodySkin', self.body + '.vtx[0]', tv=[('j4', 1.0)])
+        result = self.tools.export_bundle(self.path, [self.body, self.arm], overwrite=False)
+        self.assertEqual(result['written'], [self.path + '/char/arm.xml'])
+        self.assertEqual(self.read_member('body.xml'), body)
+
+
+class IncrementalExportTest(scene.SceneTest):
+    '''
+    Incremental exports against the manifest in the export root.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        self.body = self.add_mesh('body', BODY)
+        self.arm = self.add_mesh('arm', ARM)
+        self.root = self.temp_dir + '/weights'
+        os.makedirs(self.root)
+
+    def paint(self, mesh, deformer):
+        '''
+        Moves vertex 0 of mesh onto the last joint, in the scene and in the backend alike.
+        :param mesh:
+        :param deformer:
+        :return:
+        '''
+        cmds.skinPercent(deformer, mesh + '.vtx[0]', tv=[(scene.JOINTS[-1], 1.0)])
+        self.set_rows(deformer, [cmds.skinPercent(deformer, '%s.vtx[%d]' % (mesh, i), q=True, v=True)
+                                 for i in range(len(BODY))])
+
+    def export(self, **kwargs):
+        return self.tools.weight_export(self.root, [self.body, self.arm], incremental=True, **kwargs)
+
+    def check_skips_unchanged(self, **kwargs):
+        result = self.export(**kwargs)
+        self.assertEqual(sorted(result['written']), [self.root + '/arm.xml', self.root + '/body.xml'])
+        self.assertEqual(result['unchanged'], [])
+        with open(self.root + '/body.xml') as input_file:
+            body = input_file.read()
+        self.paint(self.arm, 'armSkin')
+        result = self.export(**kwargs)
+        self.assertEqual(result['written'], [self.root + '/arm.xml'])
+        self.assertEqual(result['unchanged'], [self.root + '/body.xml'])
+        with open(self.root + '/body.xml') as input_file:
+            self.assertEqual(input_file.read(), body)
+        manifest = manifest_utils.ExportManifest(self.root)
+        self.assertEqual(sorted(manifest.entries), ['arm.xml', 'body.xml'])
+        self.assertTrue(manifest.unchanged(self.root + '/arm.xml', skin_utils.content_hash('armSkin')))
+
+    def test_skips_unchanged(self):
+        self.check_skips_unchanged()
+
+    def test_pipeline_skips_unchanged(self):
+        self.check_skips_unchanged(parallel=True, workers=1)
+
+    def test_rewrites_edited_file(self):
+        self.export()
+        with open(self.root + '/body.xml', 'a') as output:
+            output.write('\n')
+        result = self.export()
+        self.assertEqual(result['written'], [self.root + '/body.xml'])
+        self.assertEqual(result['unchanged'], [self.root + '/arm.xml'])
+
+    def test_no_manifest(self):
+        self.export()
+        os.remove(self.root + '/' + manifest_utils.MANIFEST_NAME)
+        result = self.export()
+        self.assertEqual(sorted(result['written']), [self.root + '/arm.xml', self.root + '/body.xml'])
+        self.assertTrue(os.path.exists(self.root + '/' + manifest_utils.MANIFEST_NAME))
+
+
+class WeightIndexTest(scene.SceneTest):
+    '''
+    The saved index of a weights root, refreshed from the folders that changed.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        self.root = self.temp_dir + '/weights'
+        for path in ('char/body.xml', 'char/arm.xml.gz', 'props/cup.xml', 'props/old/cup.xml'):
+            self.touch(path)
+        self.stamp = time.time() - index_utils.MTIME_SLACK - 100
+        self.age()
+        self.listed = []
+        list_folder = index_utils.WeightIndex._list
+        test = self
+
+        def record(index, full, mtime, now):
+            test.listed.append(full[len(test.root):])
+            return list_folder(index, full, mtime, now)
+        index_utils.WeightIndex._list = record
+        self.addCleanup(setattr, index_utils.WeightIndex, '_list', list_folder)
+        self.addCleanup(index_utils.clear_index, self.root)
+
+    def touch(self, path):
+        path = '%s/%s' % (self.root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as output:
+            output.write('<deformerWeights/>')
+
+    def age(self, *folders):
+        '''
+        Dates folders (all of them if none are given) past index_utils.MTIME_SLACK, each a second apart, so their
+        modification times are trusted and a folder that changed since the last time it was aged looks changed.
+        '''
+        for folder in folders or ('char', 'props', 'props/old', ''):
+            self.stamp += 1
+            os.utime(self.root + ('/' + folder if folder else ''), (self.stamp, self.stamp))
+
+    def index(self):
+        del self.listed[:]
+        index = index_utils.WeightIndex(self.root)
+        # The root is listed every time: saving the index into it changes it.
+        self.assertEqual(self.listed[:1], [''])
+        self.listed.pop(0)
+        return index
+
+    def test_first_walk_lists_everything(self):
+        index = self.index()
+        self.assertEqual(sorted(self.listed), ['/char', '/props', '/props/old'])
+        self.assertEqual(sorted(index.paths()), ['props/old/cup.xml', 'weights/char/arm.xml.gz',
+                                                 'weights/char/body.xml', 'weights/props/cup.xml'])
+        self.assertTrue(os.path.exists(self.root + '/' + index_utils.INDEX_NAME))
+
+    def test_unchanged_folders_not_listed(self):
+        self.index()
+        index = self.index()
+        self.assertEqual(self.listed, [])
+        self.assertEqual(index.lookup('|char|body'), self.root + '/char/body.xml')
+        self.assertEqual(index.lookup('|char|arm'), self.root + '/char/arm.xml.gz')
+
+    def test_added_file(self):
+        self.index()
+        self.touch('props/plate.xml')
+        self.age('props')
+        index = self.index()
+        self.assertEqual(self.listed, ['/props'])
+        self.assertEqual(index.candidates('plate'), ['weights/props/plate.xml'])
+        self.assertEqual(index.candidates('cup'), ['props/old/cup.xml', 'weights/props/cup.xml'])
+
+    def test_deleted_file(self):
+        self.index()
+        os.remove(self.root + '/char/body.xml')
+        self.age('char')
+        index = self.index()
+        self.assertEqual(self.listed, ['/char'])
+        self.assertEqual(index.lookup('|char|body'), None)
+        self.assertEqual(index.candidates('body'), [])
+        self.assertEqual(index.lookup('|char|arm'), self.root + '/char/arm.xml.gz')
+
+    def test_deleted_folder(self):
+        self.index()
+        shutil.rmtree(self.root + '/props/old')
+        self.age('props')
+        index = self.index()
+        self.assertEqual(self.listed, ['/props'])
+        self.assertEqual(index.candidates('cup'), ['weights/props/cup.xml'])
+        self.assertEqual(sorted(index.paths()), ['weights/char/arm.xml.gz', 'weights/char/body.xml',
+                                                 'weights/props/cup.xml'])
+
+    def test_recent_folder_listed_again(self):
+        self.index()
+        # A folder changed within MTIME_SLACK of the scan is listed again, in case a change hid in the same instant.
+        stamp = time.time()
+        os.utime(self.root + '/char', (stamp, stamp))
+        self.index()
+        self.assertEqual(self.listed, ['/char'])
+        self.index()
+        self.assertEqual(self.listed, ['/char'])
+
+
+# Weights tags written by hand: single quotes, attributes over several lines, escaped characters, an empty element and
+# tags whose names only start with weights.
+HAND_WRITTEN = b'''<?xml version="1.0"?>
+<deformerWeights>
+  <headerInfo fileName="hand.xml" worldMatrix="1 0 0 0 0 1 0 0 0 0 1 0 0 0 0 1"/>
+  <weightsInfo source="not_a_joint"/>
+  <weights deformer='skin' source='rig:hip' shape="body" layer="0" size="1" max="0">
+    <point index="0" value="1.000"/>
+  </weights>
+  <weights
+      deformer="skin" source="rig:knee&amp;calf" shape="body"
+      layer="1" size="0" max="0"/>
+  <weights deformer="skin" source="rig:toe" note="a &quot;b&quot; &lt;c&gt;" shape="body" layer="2" size="0"></weights>
+  <weightsExtra source="nor_this"></weightsExtra>
+</deformerWeights>
+'''
+
+
+class HeaderScanTest(scene.SceneTest):
+    '''
+    Joint lists read from the weights start tags against a full parse, and the cache of them.
+    '''
+
+    def setUp(self):
+        scene.SceneTest.setUp(self)
+        self.body = self.add_mesh('body', BODY, joints=['rig:' + x for x in scene.JOINTS])
+        self.path = self.export('bodySkin', self.temp_dir + '/body.xml')
+        # Without its sidecar check_weights reads the XML too.
+        os.remove(binary_utils.sidecar_path(self.path))
+        self.addCleanup(xml_utils.clear_header_cache)
+
+    def parsed(self, path):
+        with compress_utils.open_read(path) as stream:
+            return [x.attrib for x in et.parse(stream).getroot().iter('weights')]
+
+    def check_matches_parse(self, path):
+        headers = xml_utils.read_headers(path)
+        self.assertEqual(headers, self.parsed(path))
+        self.assertEqual(xml_utils.read_joints(path), [x['source'] for x in headers])
+        self.assertEqual(self.tools.check_weights(path=path), [x['source'] for x in headers])
+
+    def test_exported(self):
+        self.check_matches_parse(self.path)
+        self.assertEqual(xml_utils.read_joints(self.path), ['rig:' + x for x in scene.JOINTS])
+
+    def test_hand_written(self):
+        path = self.temp_dir + '/hand.xml'
+        with open(path, 'wb') as output:
+            output.write(HAND_WRITTEN)
+        self.check_matches_parse(path)
+        self.assertEqual(xml_utils.read_joints(path), ['rig:hip', 'rig:knee&calf', 'rig:toe'])
+
+    def test_compressed(self):
+        path = self.temp_dir + '/hand.xml'
+        with open(path, 'wb') as output:
+            output.write(HAND_WRITTEN)
+        compressed = compress_utils.compress_file(path, self.temp_dir + '/hand.xml.gz')
+        # Blocks shorter than a tag, so tags are cut off at every block boundary.
+        old_block_size = compress_utils.BLOCK_SIZE
+        compress_utils.BLOCK_SIZE = 5
+        try:
+            self.check_matches_parse(compressed)
+        finally:
+            compress_utils.BLOCK_SIZE = old_block_size
+
+    def test_cached(self):
+        scans = []
+        scan_headers = xml_utils._scan_headers
+
+        def record(path, size):
+            scans.append(path)
+            return scan_headers(path, size)
+        xml_utils._scan_headers = record
+        self.addCleanup(setattr, xml_utils, '_scan_headers', scan_headers)
+        joints = xml_utils.read_joints(self.path)
+        # What was handed out can be changed without changing the cache.
+        joints.append('extra')
+        xml_utils.read_headers(self.path)[0]['source'] = 'changed'
+        self.assertEqual(xml_utils.read_joints(self.path), ['rig:' + x for x in scene.JOINTS])
+        self.assertEqual(len(scans), 1)
+
+    def test_edit_invalidates(self):
+        # Whole seconds, which every file system and os.utime keep exactly.
+        stamp = int(os.stat(self.path).st_mtime) - 100
+        os.utime(self.path, (stamp, stamp))
+        self.assertEqual(xml_utils.read_joints(self.path), ['rig:' + x for x in scene.JOINTS])
+        data = read_file(self.path)
+        # An edit of the same size is seen by its modification time...
+        with open(self.path, 'wb') as output:
+            output.write(data.replace(b'source="rig:j1"', b'source="rig:jX"'))
+        os.utime(self.path, (stamp + 10, stamp + 10))
+        self.assertEqual(xml_utils.read_joints(self.path)[1], 'rig:jX')
+        # ...and one in the same second by its size.
+        with open(self.path, 'wb') as output:
+            output.write(data.replace(b'source="rig:j1"', b'source="rig:j1_new"'))
+        os.utime(self.path, (stamp + 10, stamp + 10))
+        self.assertEqual(xml_utils.read_joints(self.path)[1], 'rig:j1_new')
+        self.check_matches_parse(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,9 +11,9 @@ from PySide2 import QtCore, QtGui, QtWidgets
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         MainWindow.setObjectName("MainWindow")
-        MainWindow.resize(168, 228)
-        MainWindow.setMinimumSize(QtCore.QSize(168, 228))
-        MainWindow.setMaximumSize(QtCore.QSize(168, 228))
+        MainWindow.resize(360, 228)
+        MainWindow.setMinimumSize(QtCore.QSize(360, 228))
+        MainWindow.setMaximumSize(QtCore.QSize(360, 228))
         self.centralwidget = QtWidgets.QWidget(MainWindow)
         self.centralwidget.setObjectName("centralwidget")
         self.weight_export = QtWidgets.QPushButton(self.centralwidget)
@@ -28,6 +28,18 @@ class Ui_MainWindow(object):
         self.bind_from_file = QtWidgets.QPushButton(self.centralwidget)
         self.bind_from_file.setGeometry(QtCore.QRect(10, 70, 151, 61))
         self.bind_from_file.setObjectName("bind_from_file")
+        self.background = QtWidgets.QCheckBox(self.centralwidget)
+        self.background.setGeometry(QtCore.QRect(80, 190, 81, 17))
+        self.background.setChecked(True)
+        self.background.setObjectName("background")
+        self.mesh_status = QtWidgets.QTreeWidget(self.centralwidget)
+        self.mesh_status.setGeometry(QtCore.QRect(170, 10, 181, 151))
+        self.mesh_status.setRootIsDecorated(False)
+        self.mesh_status.setObjectName("mesh_status")
+        self.cancel = QtWidgets.QPushButton(self.centralwidget)
+        self.cancel.setEnabled(False)
+        self.cancel.setGeometry(QtCore.QRect(170, 166, 181, 41))
+        self.cancel.setObjectName("cancel")
         MainWindow.setCentralWidget(self.centralwidget)
         self.statusbar = QtWidgets.QStatusBar(MainWindow)
         self.statusbar.setObjectName("statusbar")
@@ -43,6 +55,10 @@ class Ui_MainWindow(object):
         self.weight_import.setText(_translate("MainWindow", "Import"))
         self.batch_mode.setText(_translate("MainWindow", "Batch"))
         self.bind_from_file.setText(_translate("MainWindow", "Bind From File"))
+        self.background.setText(_translate("MainWindow", "Background"))
+        self.mesh_status.headerItem().setText(0, _translate("MainWindow", "Mesh"))
+        self.mesh_status.headerItem().setText(1, _translate("MainWindow", "State"))
+        self.cancel.setText(_translate("MainWindow", "Cancel"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+import maya.cmds as cmds
+from timeit import default_timer as timer
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+'''
+Running WeightTools operations without blocking Maya. Maya's scene may only be touched from the main thread, so an
+operation is written as a generator of steps (see WeightTools.import_steps): each step does a little work on the
+main thread and yields an event saying what happened. The file side (reading, parsing, remapping, compressing,
+writing) already runs on worker threads, and a step that needs a worker's result before it can go on yields
+{'wait': async_result} instead of blocking on it.
+
+An IdleQueue runs queued callables on the main thread from an idle scriptJob, a time budget's worth per idle event,
+and anything (a worker thread included) can put work on it. A Job advances its generator from the queue until it
+would have to wait or its budget is spent, then puts itself back on the queue for the next idle event, so Maya
+stays responsive between steps.
+
+A Job's first step runs where it is started, so an operation asks for its paths and settings there. Nothing it does
+from the idle events after that may open a dialog: what would need an answer is skipped instead.
+'''
+
+# Seconds of main thread work per idle event before handing control back to Maya.
+BUDGET = 0.05
+
+
+class IdleQueue(object):
+    '''
+    Callables to run on Maya's main thread. The idle scriptJob is only installed while there is something queued.
+    '''
+
+    def __init__(self, budget=BUDGET):
+        self.budget = budget
+        self._queue = queue.Queue()
+        self._script_job = None
+
+    def put(self, function, *args):
+        '''
+        Queues function(*args) for the main thread. Safe to call from any thread, the idle scriptJob is installed by
+        the next drain or start on the main thread.
+        :param function:
+        :param args:
+        :return:
+        '''
+        self._queue.put((function, args))
+
+    def start(self):
+        '''
+        Installs the idle scriptJob. Call from the main thread.
+        :return:
+        '''
+        if self._script_job is None:
+            self._script_job = cmds.scriptJob(idleEvent=self.drain)
+
+    def stop(self):
+        '''
+        Removes the idle scriptJob, leaving anything queued where it is.
+        :return:
+        '''
+        if self._script_job is not None:
+            if cmds.scriptJob(exists=self._script_job):
+                cmds.scriptJob(kill=self._script_job, force=True)
+            self._script_job = None
+
+    def drain(self):
+        '''
+        Runs what is queued until the queue is empty or the budget is spent. Callables queued while draining, a Job
+        putting itself back for example, wait for the next call. Removes the scriptJob once nothing is left.
+        :return: number of callables run.
+        '''
+        deadline = timer() + self.budget
+        count = self._queue.qsize()
+        done = 0
+        while done < count and timer() < deadline:
+            try:
+                function, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            done += 1
+            try:
+                function(*args)
+            except Exception as e:
+                cmds.warning('Background step failed: %s' % e)
+        if self._queue.empty():
+            self.stop()
+        return done
+
+    def empty(self):
+        return self._queue.empty()
+
+
+class Job(object):
+    '''
+    Runs a generator of steps from an IdleQueue and keeps count of what it reported. on_status is called on the main
+    thread with every event and on_done with the job once the generator finishes, fails or is cancelled.
+    Events are dicts with a 'state' ('resolving', 'reading', 'applying', 'writing', 'done', 'skipped', 'failed' or
+    'finished') and usually the 'mesh' and 'path' they are about. The 'finished' event carries the operation's
+    'result'.
+    '''
+
+    def __init__(self, name, steps, idle_queue, on_status=None, on_done=None):
+        self.name = name
+        self.result = None
+        self.error = None
+        self.finished = False
+        self.cancelled = False
+        self.statuses = {}
+        self.counts = {}
+        self.start_time = None
+        self.seconds = 0.0
+        self._steps = steps
+        self._queue = idle_queue
+        self._on_status = on_status
+        self._on_done = on_done
+        self._waiting = None
+
+    def start(self):
+        '''
+        Runs the first step on the calling thread, then queues the rest and makes sure the queue is being drained.
+        Call from the main thread. Operations ask for their paths and settings before their first event, and modal
+        dialogs mustn't be opened from an idle event, so they are answered here.
+        :return:
+        '''
+        self.start_time = timer()
+        if self._next():
+            self._queue.put(self._step)
+            self._queue.start()
+        return self
+
+    def run(self):
+        '''
+        Runs the whole generator on the calling thread instead, blocking on anything it waits for, and reports the
+        same way.
+        :return:
+        '''
+        self.start_time = timer()
+        try:
+            for event in self._steps:
+                if 'state' in event:
+                    self._report(event)
+                if event.get('state') == 'finished':
+                    self.result = event.get('result')
+        finally:
+            self._finish()
+        return self
+
+    def cancel(self):
+        '''
+        Stops the job at its next step. What has already been applied stays applied.
+        :return:
+        '''
+        self.cancelled = True
+
+    def throughput(self):
+        '''
+        Returns meshes finished per second so far.
+        :return:
+        '''
+        seconds = self.seconds if self.finished else timer() - (self.start_time or timer())
+        done = sum([self.counts.get(x, 0) for x in ('done', 'skipped', 'failed')])
+        return done / seconds if seconds > 0 else 0.0
+
+    def _step(self):
+        deadline = timer() + self._queue.budget
+        while timer() < deadline:
+            # Checked before every step, not once a slice, or a job that fits in one slice never sees its cancel.
+            if self.cancelled:
+                self._steps.close()
+                self._finish()
+                return
+            if self._waiting is not None and not self._waiting.ready():
+                break
+            self._waiting = None
+            if not self._next():
+                return
+        self._queue.put(self._step)
+
+    def _next(self):
+        '''
+        Advances the generator by one event and reports it.
+        :return: False once the job has finished.
+        '''
+        try:
+            event = next(self._steps)
+        except StopIteration:
+            self._finish()
+            return False
+        except Exception as e:
+            self.error = '%s: %s' % (type(e).__name__, e)
+            self._finish()
+            return False
+        if 'state' in event:
+            self._report(event)
+        if 'wait' in event:
+            self._waiting = event['wait']
+        if event.get('state') == 'finished':
+            self.result = event.get('result')
+        return True
+
+    def _report(self, event):
+        state = event.get('state')
+        self.counts[state] = self.counts.get(state, 0) + 1
+        if event.get('mesh') is not None:
+            self.statuses[event['mesh']] = state
+        if self._on_status is not None:
+            self._on_status(self, event)
+
+    def _finish(self):
+        self.finished = True
+        self.seconds = timer() - self.start_time
+        if self._on_done is not None:
+            self._on_done(self)
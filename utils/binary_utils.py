@@ -0,0 +1,373 @@
+import xml.etree.ElementTree as et
+from xml.sax.saxutils import quoteattr
+from array import array
+import json
+import mmap
+import os
+import struct
+import sys
+from utils import compress_utils
+from utils import xml_utils
+
+'''
+A compact binary sidecar for deformerWeights XML files. The XML stays the interchange format, the sidecar sits next to
+it (foo.xml -> foo.wbin) and is what the tool reads on the hot path.
+
+Layout, little endian:
+    magic       4 bytes     'WTWB'
+    version     uint32
+    length      uint32      size of the JSON header in bytes
+    header      JSON        deformer, shape, joints, element attributes, value precision and block offsets
+    padding                 up to the next 8 byte boundary
+    blocks                  for the shape and every influence an int32 index column followed by a float64 value
+                            column (three values per index for the shape positions)
+
+Block offsets in the header are relative to the start of the blocks. Values are stored as doubles, and the number of
+decimals the XML used is recorded so converting back gives the same numbers and the same text.
+'''
+
+MAGIC = b'WTWB'
+VERSION = 1
+EXTENSION = '.wbin'
+_PREAMBLE = struct.Struct('<4sII')
+# Attribute order used by deformerWeights when writing XML.
+_HEADER_KEYS = ['fileName', 'worldMatrix']
+_SHAPE_KEYS = ['name', 'group', 'stride', 'size', 'max']
+_WEIGHTS_KEYS = ['deformer', 'source', 'shape', 'layer', 'defaultValue', 'size', 'max']
+
+
+def sidecar_path(path):
+    '''
+    Returns the binary sidecar path for a weights XML, compressed or not.
+    :param path:
+    :return:
+    '''
+    return os.path.splitext(compress_utils.plain_path(path))[0] + EXTENSION
+
+
+def fresh_sidecar(path):
+    '''
+    Returns the sidecar path for the XML at path if one exists and is at least as new as the XML, otherwise None.
+    :param path:
+    :return:
+    '''
+    binary_path = sidecar_path(path)
+    try:
+        if os.path.getmtime(binary_path) >= os.path.getmtime(path):
+            return binary_path
+    except OSError:
+        pass
+    return None
+
+
+def xml_to_binary(path, binary_path=None):
+    '''
+    Converts a deformerWeights XML, compressed or not, to the binary format in a single lazy pass (see
+    xml_utils.iter_elements).
+    :param path:
+    :param binary_path:
+    :return:
+    '''
+    if binary_path is None:
+        binary_path = sidecar_path(path)
+    header = {'header_info': None, 'shape_info': None, 'weights': []}
+    columns = []
+    positions = None
+    weight_decimals = _Decimals()
+    position_decimals = _Decimals()
+    for tag, attributes, points in xml_utils.iter_elements(path):
+        if tag == 'headerInfo':
+            header['header_info'] = list(attributes.items())
+        elif tag == 'shape':
+            header['shape_info'] = list(attributes.items())
+            positions = (array('i'), array('d'))
+            for index, value in points:
+                positions[0].append(index)
+                for component in value.split():
+                    positions[1].append(float(component))
+                    position_decimals.check(component)
+        elif tag == 'weights':
+            header['weights'].append(list(attributes.items()))
+            column = (array('i'), array('d'))
+            for index, value in points:
+                column[0].append(index)
+                column[1].append(float(value))
+                weight_decimals.check(value)
+            columns.append(column)
+    return write_columns(binary_path, header['header_info'], header['shape_info'], header['weights'], positions,
+                         columns, {'weights': weight_decimals.value, 'positions': position_decimals.value})
+
+
+def write_columns(binary_path, header_info, shape_info, weights, positions, columns, decimals):
+    '''
+    Writes a binary weights file from data that is already in memory.
+    :param binary_path:
+    :param header_info: headerInfo attributes as (key, value) pairs, or None
+    :param shape_info: shape attributes as (key, value) pairs, or None
+    :param weights: attributes of every weights element as (key, value) pairs
+    :param positions: (indices, xyz values) of the shape points, or None
+    :param columns: (indices, values) of every weights element
+    :param decimals: {'weights': decimals, 'positions': decimals} used when writing XML
+    :return:
+    '''
+    header = {'header_info': header_info, 'shape_info': shape_info, 'weights': weights, 'decimals': decimals}
+    weights = [dict(x) for x in weights]
+    header['joints'] = [x.get('source') for x in weights]
+    header['deformer'] = weights[0].get('deformer') if weights else None
+    header['shape'] = weights[0].get('shape') if weights else None
+    blocks = []
+    offset = 0
+    if positions is not None:
+        header['positions'] = [offset, len(positions[0])]
+        blocks.extend(_columns(positions))
+        offset += _block_size(positions)
+    else:
+        header['positions'] = None
+    header['columns'] = []
+    for column in columns:
+        header['columns'].append([offset, len(column[0])])
+        blocks.extend(_columns(column))
+        offset += _block_size(column)
+    _write_binary(binary_path, header, blocks)
+    return binary_path
+
+
+def binary_to_xml(binary_path, path):
+    '''
+    Converts a binary weights file back to a deformerWeights XML.
+    :param binary_path:
+    :param path:
+    :return:
+    '''
+    with BinaryWeights(binary_path) as weights:
+        with open(path, 'w') as output:
+            output.write('<?xml version="1.0"?>\n<deformerWeights>\n')
+            if weights.header['header_info'] is not None:
+                attrib = _ordered(weights.header['header_info'], _HEADER_KEYS)
+                output.write('  <headerInfo%s/>\n' % xml_attributes(attrib))
+            if weights.header['shape_info'] is not None:
+                output.write('  <shape%s>\n' % xml_attributes(_ordered(weights.header['shape_info'], _SHAPE_KEYS)))
+                indices, values = weights.positions()
+                decimals = weights.header['decimals']['positions']
+                for i, index in enumerate(indices):
+                    value = ' '.join([_format(x, decimals) for x in values[i * 3:i * 3 + 3]])
+                    output.write('    <point index="%s" value=" %s"/>\n' % (index, value))
+                output.write('  </shape>\n')
+            decimals = weights.header['decimals']['weights']
+            for layer, attrib in enumerate(weights.header['weights']):
+                indices, values = weights.column(layer)
+                output.write('  <weights%s>\n' % xml_attributes(_ordered(attrib)))
+                for i, index in enumerate(indices):
+                    output.write('    <point index="%s" value="%s"/>\n' % (index, _format(values[i], decimals)))
+                output.write('  </weights>\n')
+            output.write('</deformerWeights>\n')
+    return path
+
+
+class BinaryWeights(object):
+    '''
+    Read access to a binary weights file. The file is memory mapped and columns are copied straight out of the map
+    into arrays, so no Python object is created per point.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            self._file.close()
+            raise IOError('%s is not a binary weights file' % path)
+        magic, version, length = _PREAMBLE.unpack(self._map[:_PREAMBLE.size])
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise IOError('%s is not a binary weights file' % path)
+        start = _PREAMBLE.size
+        self.header = json.loads(self._map[start:start + length].decode('utf-8'))
+        self._data = _align(start + length)
+        self.joints = self.header['joints']
+        self.deformer = self.header['deformer']
+        self.shape = self.header['shape']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def column(self, layer):
+        '''
+        Returns the (indices, values) arrays of the influence at layer.
+        :param layer:
+        :return:
+        '''
+        offset, count = self.header['columns'][layer]
+        return self._read(offset, count, 1)
+
+    def points(self, joint):
+        '''
+        Returns the (indices, values) arrays of joint. Duplicate joints are concatenated in file order.
+        :param joint:
+        :return:
+        '''
+        indices = array('i')
+        values = array('d')
+        for layer, name in enumerate(self.joints):
+            if name == joint:
+                column = self.column(layer)
+                indices.extend(column[0])
+                values.extend(column[1])
+        return indices, values
+
+    def vertex_count(self):
+        '''
+        Returns the vertex count from the shape element of the original XML, or None if it had none.
+        :return:
+        '''
+        size = dict(self.header['shape_info'] or []).get('size')
+        return int(size) if size is not None else None
+
+    def positions(self):
+        '''
+        Returns the (indices, values) arrays of the shape positions, values holding x, y, z per index.
+        :return:
+        '''
+        if self.header['positions'] is None:
+            return array('i'), array('d')
+        offset, count = self.header['positions']
+        return self._read(offset, count, 3)
+
+    def remap_index(self, joints):
+        '''
+        Builds the same index xml_utils builds with its first iterparse pass, or None if the value text of the
+        original XML can't be reproduced exactly.
+        :param joints:
+        :return:
+        '''
+        decimals = self.header['decimals']['weights']
+        if decimals is None:
+            return None
+        points = {}
+        for layer, joint in enumerate(self.joints):
+            if joint in joints:
+                joint_points = points.setdefault(joint, {})
+                indices, values = self.column(layer)
+                for i, index in enumerate(indices):
+                    joint_points[index] = _format(values[i], decimals)
+        return self.shape, self.deformer, points, set(self.joints)
+
+    def _read(self, offset, count, stride):
+        start = self._data + offset
+        indices = _from_bytes('i', self._map[start:start + count * 4])
+        start += _pad(count * 4)
+        values = _from_bytes('d', self._map[start:start + count * stride * 8])
+        return indices, values
+
+
+class _Decimals(object):
+    '''
+    Tracks whether every value in a file was written with the same number of decimals.
+    '''
+
+    def __init__(self):
+        self.value = None
+        self._consistent = True
+
+    def check(self, text):
+        if not self._consistent:
+            return
+        if self.value is None:
+            self.value = len(text.split('.', 1)[1]) if '.' in text else 0
+        if _format(float(text), self.value) != text:
+            self._consistent = False
+            self.value = None
+
+
+def read_binary(path):
+    '''
+    Opens a binary weights file.
+    :param path:
+    :return:
+    '''
+    return BinaryWeights(path)
+
+
+def _format(value, decimals):
+    if decimals is None:
+        return repr(value)
+    return '%.*f' % (decimals, value)
+
+
+def _ordered(attrib, order=_WEIGHTS_KEYS):
+    # Keep the deformerWeights attribute order, anything unexpected goes on the end. Python 2 parses attributes into
+    # a plain dict, which loses the order of the file.
+    lookup = dict(attrib)
+    keys = [x for x in order if x in lookup] + [x for x, _ in attrib if x not in order]
+    return [(x, lookup[x]) for x in keys]
+
+
+def xml_attributes(items):
+    '''
+    Formats (key, value) pairs as XML attributes, keeping their order.
+    :param items:
+    :return:
+    '''
+    return ''.join([' %s=%s' % (key, quoteattr(value)) for key, value in items])
+
+
+def _pad(size):
+    return size + (-size % 8)
+
+
+def _align(position):
+    return position + (-position % 8)
+
+
+def _block_size(column):
+    return _pad(len(column[0]) * 4) + _pad(len(column[1]) * 8)
+
+
+def _columns(column):
+    # Accept plain lists as well as arrays.
+    indices, values = column
+    if not isinstance(indices, array):
+        indices = array('i', indices)
+    if not isinstance(values, array):
+        values = array('d', values)
+    return indices, values
+
+
+def _from_bytes(typecode, data):
+    column = array(typecode)
+    if hasattr(column, 'frombytes'):
+        column.frombytes(data)
+    else:
+        column.fromstring(data)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column
+
+
+def _to_bytes(column):
+    if sys.byteorder != 'little':
+        column = array(column.typecode, column)
+        column.byteswap()
+    if hasattr(column, 'tobytes'):
+        return column.tobytes()
+    return column.tostring()
+
+
+def _write_binary(path, header, blocks):
+    header = json.dumps(header).encode('utf-8')
+    with open(path, 'wb') as output:
+        output.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        output.write(header)
+        output.write(b'\0' * (_align(_PREAMBLE.size + len(header)) - _PREAMBLE.size - len(header)))
+        for block in blocks:
+            data = _to_bytes(block)
+            output.write(data)
+            output.write(b'\0' * (_pad(len(data)) - len(data)))
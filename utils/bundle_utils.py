@@ -0,0 +1,274 @@
+import json
+import os
+import shutil
+import struct
+
+'''
+Weights bundles: the weights files of many meshes in one file (foo.wbundle) instead of a folder tree with a file per
+mesh, for file systems where opening and stat'ing thousands of small files costs more than reading them.
+
+Layout, little endian:
+    magic       4 bytes     'WTBD'
+    version     uint32
+    toc         uint64      offset of the table of contents
+    length      uint64      size of the table of contents in bytes
+    members                 each weights file exactly as an export writes it, XML or gzip compressed XML
+    toc         JSON        {'version', 'entries': {full DAG path: {'name', 'offset', 'length', 'joints'}}}
+
+A member is addressed like a file in a folder named after the bundle, foo.wbundle/char1/body.xml, name being the path
+the export would have written under its root. Readers open members through compress_utils.open_read, which seeks
+straight to them, so nothing is extracted to read a member. Nothing in here touches Maya.
+'''
+
+MAGIC = b'WTBD'
+VERSION = 1
+EXTENSION = '.wbundle'
+_PREAMBLE = struct.Struct('<4sIQQ')
+# Size of the blocks copied into a bundle.
+BLOCK_SIZE = 1024 * 1024
+# Tables of contents keyed by (path, mtime, size).
+_toc_cache = {}
+
+
+def is_bundle(path):
+    return path.lower().rstrip('/').endswith(EXTENSION)
+
+
+def split_member(path):
+    '''
+    Splits a member path into the bundle path and the member name.
+    :param path:
+    :return: (bundle path, name), or None if path isn't inside a bundle.
+    '''
+    position = path.lower().find(EXTENSION + '/')
+    if position == -1:
+        return None
+    return path[:position + len(EXTENSION)], path[position + len(EXTENSION) + 1:]
+
+
+def is_member(path):
+    return split_member(path) is not None
+
+
+def member_path(path, name):
+    return '%s/%s' % (path, name)
+
+
+def real_path(path):
+    '''
+    Returns the file on disk holding path: the bundle for a member, else path itself.
+    :param path:
+    :return:
+    '''
+    member = split_member(path)
+    return member[0] if member is not None else path
+
+
+def stat(path):
+    '''
+    os.stat of the file on disk holding path (see real_path), for caches keyed on modification time and size.
+    :param path:
+    :return:
+    '''
+    return os.stat(real_path(path))
+
+
+def exists(path):
+    '''
+    os.path.exists that also knows about members.
+    :param path:
+    :return:
+    '''
+    member = split_member(path)
+    if member is None:
+        return os.path.exists(path)
+    try:
+        return read_toc(member[0]).entry(member[1]) is not None
+    except (IOError, OSError, ValueError):
+        return False
+
+
+def read_toc(path):
+    '''
+    Returns the table of contents of a bundle, reading only the preamble and the table itself. Results are cached
+    against the path, modification time and size of the bundle.
+    :param path:
+    :return: a BundleContents
+    '''
+    info = os.stat(path)
+    key = (os.path.abspath(path), info.st_mtime, info.st_size)
+    if key not in _toc_cache:
+        with open(path, 'rb') as input_file:
+            preamble = input_file.read(_PREAMBLE.size)
+            if len(preamble) != _PREAMBLE.size:
+                raise ValueError('%s is not a weights bundle.' % path)
+            magic, version, offset, length = _PREAMBLE.unpack(preamble)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('%s is not a version %s weights bundle.' % (path, VERSION))
+            input_file.seek(offset)
+            data = json.loads(input_file.read(length).decode('utf-8'))
+        _toc_cache[key] = BundleContents(path, data['entries'])
+    return _toc_cache[key]
+
+
+def clear_toc_cache():
+    _toc_cache.clear()
+
+
+def open_member(path):
+    '''
+    Opens a member for reading, positioned at its first byte, as a binary stream that ends where the member ends.
+    :param path: member path
+    :return:
+    '''
+    bundle_path, name = split_member(path)
+    entry = read_toc(bundle_path).entry(name)
+    if entry is None:
+        raise IOError('%s is not in %s' % (name, bundle_path))
+    return _Member(bundle_path, entry['offset'], entry['length'])
+
+
+class BundleContents(object):
+    '''
+    The table of contents of a bundle. Answers lookups the same way index_utils.WeightIndex does for a folder, so
+    import and bind can take either.
+    '''
+
+    def __init__(self, path, entries):
+        self.path = path.replace('\\', '/').rstrip('/')
+        self.entries = entries
+        self._names = dict([(x['name'], x) for x in entries.values()])
+        # Keys like WeightIndex uses, the bundle standing in for the root folder.
+        root = os.path.splitext(self.path)[0].split('/')
+        self._paths = {}
+        self._short_names = {}
+        for name in sorted(self._names):
+            key = '/'.join((root + name.split('/'))[-3:])
+            self._paths[key] = member_path(self.path, name)
+            short_name = name.rsplit('/', 1)[-1].split('.xml', 1)[0].lower()
+            self._short_names.setdefault(short_name, []).append(key)
+
+    def entry(self, name):
+        return self._names.get(name)
+
+    def paths(self):
+        '''
+        Returns {'parent/folder/file.xml': member path} for every member.
+        :return:
+        '''
+        return self._paths
+
+    def lookup(self, selection):
+        '''
+        Returns the member path of the weights of a long DAG path, or failing that of the member under a folder named
+        after its parent and grandparent, or None.
+        :param selection:
+        :return:
+        '''
+        entry = self.entries.get(selection)
+        if entry is not None:
+            return member_path(self.path, entry['name'])
+        parts = selection.split('|')
+        if len(parts) < 3:
+            return None
+        key = '%s/%s/%s.xml' % (parts[-3], parts[-2], parts[-1])
+        return self._paths.get(key, self._paths.get(key + '.gz'))
+
+    def candidates(self, short_name):
+        '''
+        See index_utils.WeightIndex.candidates
+        :param short_name:
+        :return:
+        '''
+        keys = self._short_names.get(short_name.lower())
+        if keys:
+            return list(keys)
+        return [x for x in self._paths if short_name in x]
+
+    def joints(self, name):
+        '''
+        Returns the joints of a member, from the table of contents.
+        :param name:
+        :return:
+        '''
+        return list(self._names[name]['joints'])
+
+
+def write_bundle(path, members):
+    '''
+    Writes a bundle, by way of a temp file so a failed write never leaves a truncated bundle behind.
+    :param path:
+    :param members: {full DAG path: (name, path of the weights file, or of a member of another bundle, joints)}
+    :return: path
+    '''
+    temp = '%s.%s.tmp' % (path, os.getpid())
+    entries = {}
+    try:
+        with open(temp, 'wb') as output:
+            output.write(_PREAMBLE.pack(MAGIC, VERSION, 0, 0))
+            for dag_path in sorted(members):
+                name, source, joints = members[dag_path]
+                offset = output.tell()
+                with (open_member(source) if is_member(source) else open(source, 'rb')) as input_file:
+                    shutil.copyfileobj(input_file, output, BLOCK_SIZE)
+                entries[dag_path] = {'name': name, 'offset': offset, 'length': output.tell() - offset,
+                                     'joints': list(joints)}
+            data = json.dumps({'version': VERSION, 'entries': entries}, sort_keys=True).encode('utf-8')
+            offset = output.tell()
+            output.write(data)
+            output.seek(0)
+            output.write(_PREAMBLE.pack(MAGIC, VERSION, offset, len(data)))
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return path
+
+
+class _Member(object):
+    '''
+    Read only binary stream over one member of a bundle. Seeks stay inside the member, the way gzip on Python 2 expects
+    of a file.
+    '''
+
+    def __init__(self, path, offset, length):
+        self._file = open(path, 'rb')
+        self._offset = offset
+        self._length = length
+        self._position = 0
+        self._file.seek(offset)
+
+    def read(self, size=-1):
+        left = self._length - self._position
+        if size is None or size < 0 or size > left:
+            size = left
+        data = self._file.read(size)
+        self._position += len(data)
+        return data
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._position
+        elif whence == 2:
+            offset += self._length
+        self._position = max(0, min(offset, self._length))
+        self._file.seek(self._offset + self._position)
+        return self._position
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,156 @@
+import xml.etree.ElementTree as et
+import gzip
+import os
+import shutil
+from utils import bundle_utils
+
+'''
+Gzip compressed weights files (foo.xml.gz), standard library only. Weights XML is mostly the same point elements over
+and over, so it compresses very well. Readers open either kind with open_read and get the XML as a stream,
+decompressed as it is read, so a compressed file is only ever inflated to disk when deformerWeights has to read it.
+'''
+
+EXTENSION = '.gz'
+# zlib level, 6 is gzip's own default and most of the gain of 9 for a fraction of the time.
+LEVEL = 6
+# Size of the blocks copied when compressing or decompressing whole files.
+BLOCK_SIZE = 1024 * 1024
+
+
+def is_compressed(path):
+    return path.lower().endswith(EXTENSION)
+
+
+def plain_path(path):
+    '''
+    Returns the path of the uncompressed XML for a weights path of either kind.
+    :param path:
+    :return:
+    '''
+    return path[:-len(EXTENSION)] if is_compressed(path) else path
+
+
+def compressed_path(path):
+    '''
+    Returns the path of the compressed file for a weights path of either kind.
+    :param path:
+    :return:
+    '''
+    return path if is_compressed(path) else path + EXTENSION
+
+
+def existing(path):
+    '''
+    Returns path if it exists, else the other kind of the same weights file (foo.xml for foo.xml.gz and the other
+    way around) if that exists, else None.
+    :param path:
+    :return:
+    '''
+    for candidate in (path, plain_path(path) if is_compressed(path) else compressed_path(path)):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def is_packed(path):
+    '''
+    Returns True for weights files deformerWeights can't read where they are: compressed files and members of a
+    bundle (see bundle_utils).
+    :param path:
+    :return:
+    '''
+    return is_compressed(path) or bundle_utils.is_member(path)
+
+
+def open_read(path):
+    '''
+    Opens a weights file of either kind, or a member of a bundle, for reading as a binary stream of its XML.
+    :param path:
+    :return:
+    '''
+    if bundle_utils.is_member(path):
+        member = bundle_utils.open_member(path)
+        if not is_compressed(path):
+            return member
+        stream = gzip.GzipFile(fileobj=member, mode='rb')
+        # GzipFile closes myfileobj, and only that, when it is closed.
+        stream.myfileobj = member
+        return stream
+    if is_compressed(path):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def open_write(path, level=LEVEL):
+    '''
+    Opens a weights file for writing as a binary stream, compressing if path is a compressed path.
+    :param path:
+    :param level:
+    :return:
+    '''
+    if is_compressed(path):
+        return gzip.open(path, 'wb', level)
+    return open(path, 'wb')
+
+
+def iterparse(path, events=('end',)):
+    '''
+    ElementTree.iterparse over a weights file of either kind, closing the file once iteration finishes or the
+    generator is thrown away.
+    :param path:
+    :param events:
+    :return:
+    '''
+    with open_read(path) as stream:
+        for item in et.iterparse(stream, events=events):
+            yield item
+
+
+def compress_file(path, write_path=None, level=LEVEL):
+    '''
+    Compresses the XML at path to write_path (path + '.gz' by default) and removes the XML.
+    :param path:
+    :param write_path:
+    :param level:
+    :return: write_path
+    '''
+    if write_path is None:
+        write_path = compressed_path(path)
+    _copy(path, write_path, level)
+    os.remove(path)
+    return write_path
+
+
+def decompress_file(path, write_path):
+    '''
+    Inflates the compressed file at path to the XML write_path, a block at a time.
+    :param path:
+    :param write_path:
+    :return: write_path
+    '''
+    _copy(path, write_path)
+    return write_path
+
+
+def _copy(path, write_path, level=LEVEL):
+    '''
+    Streams path to write_path through open_read and open_write, by way of a temp file so a failed copy never leaves
+    a truncated file behind.
+    :param path:
+    :param write_path:
+    :param level:
+    :return:
+    '''
+    temp = '%s.%s.tmp' % (write_path, os.getpid())
+    try:
+        with open_read(path) as source:
+            # The temp name hides the extension, so pick the writer from write_path.
+            output = gzip.open(temp, 'wb', level) if is_compressed(write_path) else open(temp, 'wb')
+            with output:
+                shutil.copyfileobj(source, output, BLOCK_SIZE)
+        if os.path.exists(write_path):
+            os.remove(write_path)
+        os.rename(temp, write_path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
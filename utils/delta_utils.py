@@ -0,0 +1,128 @@
+import json
+from utils import compress_utils
+from utils import math_utils
+from utils import xml_utils
+
+'''
+Weight deltas: the (vertex, influence, weight) entries that differ between two versions of a skin's weights. A delta
+shows a reviewer what a weights change touched, and ships and applies just that change instead of a whole new file.
+Nothing in here touches Maya.
+
+A delta file is JSON, gzip compressed if its path ends in .gz (see compress_utils):
+
+{"version": 1, "deformer": "skinCluster1", "shape": "bodyShape", "vertex_count": 1200,
+ "influences": ["joint1", "joint2"], "added": ["joint2"], "removed": [],
+ "changes": {"joint1": [[vertex ids], [weights]], "joint2": [[3, 4], [0.25, 0.5]]}}
+
+influences, added and removed are the joints of the new version and the joints only it or only the old version has.
+changes holds the new weight of every point that changed, a weight of zero meaning the point was removed.
+'''
+
+VERSION = 1
+EXTENSION = '.wdelta'
+
+
+def diff_files(old_path, new_path, tolerance=0.0, reader=xml_utils.read_columns):
+    '''
+    Diffs two weights files of the same mesh, streaming each one in a single pass (see xml_utils.read_columns) and
+    lining their weights up by joint name and vertex id.
+    :param old_path:
+    :param new_path:
+    :param tolerance: how far apart two weights may be and still count as the same.
+    :param reader: reads a file as (joints, columns, vertex count), WeightTools.read_columns reads binary sidecars.
+    :return: the delta, see diff_columns
+    '''
+    headers = xml_utils.read_headers(new_path) or xml_utils.read_headers(old_path)
+    deformer = headers[0].get('deformer') if headers else None
+    shape = headers[0].get('shape') if headers else None
+    return diff_columns(reader(old_path), reader(new_path), tolerance, deformer, shape)
+
+
+def diff_columns(old, new, tolerance=0.0, deformer=None, shape=None):
+    '''
+    Diffs two versions of a mesh's weights.
+    :param old: (joints, (vertex ids, weights) per joint, vertex count or None), as xml_utils.read_columns returns.
+    :param new:
+    :param tolerance:
+    :param deformer:
+    :param shape:
+    :return: the delta, laid out like the delta file.
+    '''
+    old_joints, old_columns, old_count = old
+    new_joints, new_columns, new_count = new
+    if old_count is not None and new_count is not None and old_count != new_count:
+        raise ValueError('The vertex count changed from %s to %s, a delta only works on the same topology.' %
+                         (old_count, new_count))
+    old_points = dict(zip(old_joints, old_columns))
+    new_points = dict(zip(new_joints, new_columns))
+    empty = ([], [])
+    changes = {}
+    for joint in new_joints + [x for x in old_joints if x not in new_points]:
+        if joint in changes:
+            continue
+        ids, values = math_utils.diff_column(old_points.get(joint, empty), new_points.get(joint, empty), tolerance)
+        if len(ids):
+            changes[joint] = [ids, values]
+    vertex_count = new_count if new_count is not None else old_count
+    if vertex_count is None:
+        vertex_count = max([max(x[0]) + 1 for x in new_columns + old_columns if len(x[0])] or [0])
+    return {'version': VERSION, 'deformer': deformer, 'shape': shape, 'vertex_count': vertex_count,
+            'influences': list(new_joints), 'added': [x for x in new_joints if x not in old_points],
+            'removed': [x for x in old_joints if x not in new_points], 'changes': changes}
+
+
+def stats(delta):
+    '''
+    Counts what a delta changes.
+    :param delta:
+    :return: {'entries': weights changed, 'vertices': vertices touched, 'joints': joints with changes}
+    '''
+    vertices = set()
+    entries = 0
+    for ids, values in delta['changes'].values():
+        vertices.update(ids)
+        entries += len(ids)
+    return {'entries': entries, 'vertices': len(vertices), 'joints': len(delta['changes'])}
+
+
+def apply_delta(matrix, influences, delta):
+    '''
+    Applies a delta to the weight matrix of a skinCluster.
+    :param matrix:
+    :param influences: influence name of each column of matrix.
+    :param delta:
+    :return: (the new matrix, ids of the vertices the delta touched)
+    '''
+    if len(matrix) != delta['vertex_count']:
+        raise ValueError('The delta is for %s vertices, the skinCluster has %s.' % (delta['vertex_count'],
+                                                                                     len(matrix)))
+    layers = math_utils.influence_layers(influences)
+    missing = sorted([x for x in delta['changes'] if x not in layers])
+    if missing:
+        raise ValueError('The delta has weights on joints that are not influences: %s' % ', '.join(missing))
+    return math_utils.set_points(matrix, delta['changes'], influences)
+
+
+def write_delta(path, delta):
+    '''
+    Writes a delta file, compressed if path ends in .gz.
+    :param path:
+    :param delta:
+    :return: path
+    '''
+    with compress_utils.open_write(path) as output:
+        output.write(json.dumps(delta, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    return path
+
+
+def read_delta(path):
+    '''
+    Reads a delta file of either kind.
+    :param path:
+    :return:
+    '''
+    with compress_utils.open_read(path) as input_file:
+        delta = json.loads(input_file.read().decode('utf-8'))
+    if delta.get('version') != VERSION:
+        raise ValueError('%s is not a version %s weights delta.' % (path, VERSION))
+    return delta
@@ -0,0 +1,245 @@
+from array import array
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+from timeit import default_timer as timer
+from utils import binary_utils
+from utils import compress_utils
+from utils import math_utils
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+
+'''
+Writes deformerWeights files from weight data that has already been pulled out of the scene (see
+skin_utils.get_export_data). Nothing in here touches Maya, so the writing can happen on a pool of worker processes
+while Maya carries on.
+'''
+
+# Decimal places deformerWeights uses for weights and shape positions.
+WEIGHT_PRECISION = 3
+POSITION_PRECISION = 6
+_POINT = '    <point index="%d" value="%s"/>'
+
+
+def make_job(index, path, data, precision=WEIGHT_PRECISION, sparse=None):
+    '''
+    Bundles everything a worker needs to write one file.
+    :param index: position of the job in the batch, used to report ordering.
+    :param path: full path of the XML to write, ending in .gz to write it compressed.
+    :param data: see skin_utils.get_export_data
+    :param precision:
+    :param sparse: (threshold, max influences) to sparsify the weights with before writing (see sparsify), or None.
+    :return:
+    '''
+    return {'index': index, 'path': path, 'data': data, 'precision': precision, 'sparse': sparse}
+
+
+def content_hash(data, sparse=None):
+    '''
+    Returns a hash of everything that ends up in a weights file: the deformer and shape names, the influence list,
+    the weights, the vertex count and positions, and the world matrix. Two exports of the same hash write the same file.
+    :param data: see skin_utils.get_export_data
+    :param sparse: sparsify settings the file is written with, see make_job.
+    :return:
+    '''
+    digest = hashlib.sha1()
+    names = [data['deformer'], data['shape'], list(data['influences']), len(data['positions']) // 3]
+    if sparse is not None:
+        names.append(list(sparse))
+    digest.update(json.dumps(names).encode('utf-8'))
+    for key in ('weights', 'positions', 'world_matrix'):
+        # Weights may come as a NumPy buffer (see skin_utils.SkinData), whose bytes are those of the array('d').
+        values = math_utils.to_buffer(data[key]) if math_utils.is_array(data[key]) else array('d', data[key])
+        digest.update(values.tobytes() if hasattr(values, 'tobytes') else values.tostring())
+    return digest.hexdigest()
+
+
+def run_jobs(jobs, workers=None):
+    '''
+    Writes every job on a pool of worker processes, yielding each result as soon as it finishes. Uses
+    concurrent.futures where available and multiprocessing otherwise.
+    :param jobs:
+    :param workers: number of processes, None for one per core.
+    :return:
+    '''
+    if workers == 1 or len(jobs) < 2:
+        for job in jobs:
+            yield write_job(job)
+        return
+    _use_mayapy()
+    if futures is not None:
+        with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = [executor.submit(write_job, job) for job in jobs]
+            for future in futures.as_completed(pending):
+                yield future.result()
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            for result in pool.imap_unordered(write_job, jobs):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+
+def write_job(job):
+    '''
+    Worker entry point. Writes one job and reports how long it took instead of raising, so one bad file doesn't take
+    the rest of the batch down.
+    :param job:
+    :return:
+    '''
+    start_time = timer()
+    result = {'index': job['index'], 'path': job['path'], 'error': None, 'size': 0}
+    try:
+        data = job['data']
+        if job.get('sparse') is not None:
+            data, result['sparse'] = sparsify(data, job['sparse'][0], job['sparse'][1], job['precision'])
+        write_weights(job['path'], data, job['precision'])
+        result['size'] = os.path.getsize(job['path'])
+    except (IOError, OSError, ValueError, KeyError) as e:
+        result['error'] = str(e)
+    result['seconds'] = timer() - start_time
+    return result
+
+
+def sparsify(data, threshold=0.0, limit=None, precision=WEIGHT_PRECISION):
+    '''
+    Drops the weights below threshold and all but the limit highest weights of each vertex from export data,
+    renormalizing the vertices that lost weights (see math_utils.sparsify_matrix), and counts what that takes out of
+    the file.
+    :param data: see skin_utils.get_export_data
+    :param threshold:
+    :param limit: most influences kept per vertex, None for no limit.
+    :param precision:
+    :return: (sparse copy of data, {'points': weight points the file would have had, 'dropped': points left out,
+     'vertices': vertices renormalized, 'saved': bytes of XML the dropped points would have taken})
+    '''
+    influences = data['influences']
+    matrix = math_utils.to_matrix(data['weights'], len(influences))
+    sparse, vertices = math_utils.sparsify_matrix(matrix, threshold, limit)
+    stats = {'points': 0, 'dropped': 0, 'vertices': len(vertices), 'saved': 0}
+    for layer in range(len(influences)):
+        indices, values = math_utils.column(matrix, layer, precision)
+        kept = set(math_utils.column(sparse, layer, precision)[0])
+        stats['points'] += len(indices)
+        for index, value in zip(indices, values):
+            if index not in kept:
+                stats['dropped'] += 1
+                stats['saved'] += len(_POINT % (index, '%.*f' % (precision, value))) + 1
+    data = dict(data)
+    data['weights'] = math_utils.flatten(sparse)
+    return data, stats
+
+
+def write_weights(path, data, precision=WEIGHT_PRECISION):
+    '''
+    Writes data as a deformerWeights XML (the layout Maya's own export uses, including vertex positions) plus its
+    binary sidecar. A compressed path (see compress_utils) gets the XML gzipped and no sidecar.
+    :param path:
+    :param data:
+    :param precision:
+    :return:
+    '''
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Another worker may have just made it.
+            if not os.path.isdir(directory):
+                raise
+    influences = data['influences']
+    matrix = math_utils.to_matrix(data['weights'], len(influences))
+    positions = data['positions']
+    vertex_count = len(positions) // 3
+    header_info = [('fileName', path),
+                   ('worldMatrix', ''.join(['%.6f ' % x for x in data['world_matrix']]))]
+    shape_info = [('name', data['shape']), ('group', '0'), ('stride', '3'), ('size', str(vertex_count)),
+                  ('max', str(vertex_count))]
+    lines = ['<?xml version="1.0"?>', '<deformerWeights>',
+             '  <headerInfo%s/>' % binary_utils.xml_attributes(header_info),
+             '  <shape%s>' % binary_utils.xml_attributes(shape_info)]
+    position_text = ['%.*f' % (POSITION_PRECISION, x) for x in positions]
+    for index in range(vertex_count):
+        position = ' '.join(position_text[index * 3:index * 3 + 3])
+        lines.append(_POINT % (index, ' ' + position))
+    lines.append('  </shape>')
+    weights = []
+    columns = []
+    for layer, influence in enumerate(influences):
+        indices, values = math_utils.column(matrix, layer, precision)
+        texts = ['%.*f' % (precision, x) for x in values]
+        attrib = [('deformer', data['deformer']), ('source', influence), ('shape', data['shape']),
+                  ('layer', str(layer)), ('defaultValue', '%.*f' % (precision, 0.0)), ('size', str(len(indices))),
+                  ('max', str(indices[-1] if len(indices) else 0))]
+        lines.append('  <weights%s>' % binary_utils.xml_attributes(attrib))
+        lines.extend([_POINT % (index, text) for index, text in zip(indices, texts)])
+        lines.append('  </weights>')
+        weights.append(attrib)
+        # The sidecar holds exactly what the XML says, so round trips stay lossless.
+        columns.append((indices, [float(x) for x in texts]))
+    lines.append('</deformerWeights>')
+    if compress_utils.is_compressed(path):
+        with compress_utils.open_write(path) as output:
+            output.write(('\n'.join(lines) + '\n').encode('utf-8'))
+        discard_stale(path)
+        return path
+    with open(path, 'w') as output:
+        output.write('\n'.join(lines) + '\n')
+    discard_stale(path)
+    binary_utils.write_columns(binary_utils.sidecar_path(path), header_info, shape_info, weights,
+                               (list(range(vertex_count)), [float(x) for x in position_text]), columns,
+                               {'weights': precision, 'positions': POSITION_PRECISION})
+    return path
+
+
+def file_columns(data, precision=WEIGHT_PRECISION):
+    '''
+    Returns the weights of export data as they would read back from the file write_weights writes for it, without
+    writing it.
+    :param data: see skin_utils.get_export_data
+    :param precision:
+    :return: see xml_utils.read_columns
+    '''
+    influences = data['influences']
+    matrix = math_utils.to_matrix(data['weights'], len(influences))
+    columns = []
+    for layer in range(len(influences)):
+        indices, values = math_utils.column(matrix, layer, precision)
+        columns.append((indices, [float('%.*f' % (precision, x)) for x in values]))
+    return list(influences), columns, len(data['positions']) // 3
+
+
+def discard_stale(path):
+    '''
+    Removes what an earlier export of the same mesh may have left next to a freshly written weights file: the other
+    kind of the file (foo.xml for foo.xml.gz and the other way around) and, for a compressed file, the binary sidecar,
+    so readers never pick up an out of date copy.
+    :param path:
+    :return:
+    '''
+    if compress_utils.is_compressed(path):
+        stale = [compress_utils.plain_path(path), binary_utils.sidecar_path(path)]
+    else:
+        stale = [compress_utils.compressed_path(path)]
+    for stale_path in stale:
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+
+def _use_mayapy():
+    '''
+    Inside the Maya GUI sys.executable is maya itself, so worker processes have to be started with mayapy instead.
+    :return:
+    '''
+    executable = os.path.basename(sys.executable).lower()
+    if executable.startswith('maya') and not executable.startswith('mayapy'):
+        mayapy = os.path.join(os.path.dirname(sys.executable), 'mayapy')
+        if sys.platform.startswith('win32'):
+            mayapy += '.exe'
+        multiprocessing.set_executable(mayapy)
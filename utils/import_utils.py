@@ -0,0 +1,117 @@
+from collections import deque
+from multiprocessing.pool import ThreadPool
+import os
+import tempfile
+
+'''
+Helpers for overlapping the file side of an import (reading, parsing, remapping) with the Maya side (applying the
+weights). Nothing in here touches Maya, the functions handed to prefetch must not either.
+'''
+
+# Size of the blocks warm_file reads.
+BLOCK_SIZE = 1024 * 1024
+# Vertices applied at a time when a mesh is imported in chunks.
+CHUNK_SIZE = 50000
+# How far from one the weights of a vertex may sum before an import normalizes it. Weights files hold three decimals,
+# so a normalized export read back is routinely a thousandth out.
+NORMALIZE_TOLERANCE = 1e-3
+# Ways weight_import can normalize: fold into the weights in memory and fix deformerWeights imports in a bulk pass,
+# only report, leave alone, or skinPercent every imported mesh.
+NORMALIZE_MODES = ['auto', 'validate', 'none', 'skinPercent']
+
+
+def prefetch(items, function, lookahead=4, workers=2):
+    '''
+    Runs function over items on a pool of threads while the caller works through the results, keeping at most
+    lookahead items in flight so memory stays bounded. Results come back in the order of items as
+    (item, result, error) tuples, error being None unless function raised.
+    Stopping early (break, or closing the generator) waits for the items in flight and shuts the pool down.
+    :param items:
+    :param function:
+    :param lookahead:
+    :param workers:
+    :return:
+    '''
+    pending = prefetch_async(items, function, lookahead, workers)
+    try:
+        for item, async_result in pending:
+            result, error = async_result.get()
+            yield item, result, error
+    finally:
+        pending.close()
+
+
+def prefetch_async(items, function, lookahead=4, workers=2):
+    '''
+    prefetch without the waiting: yields (item, async_result) pairs in the order of items as soon as each is handed to
+    the pool, so a caller that mustn't block (see async_utils) can check async_result.ready() and come back later.
+    async_result.get() returns (result, error).
+    :param items:
+    :param function:
+    :param lookahead:
+    :param workers:
+    :return:
+    '''
+    items = list(items)
+    if len(items) == 0:
+        return
+    pool = ThreadPool(max(1, min(workers, len(items))))
+    pending = deque()
+    position = 0
+    try:
+        while position < len(items) or pending:
+            while position < len(items) and len(pending) < max(1, lookahead):
+                pending.append((items[position], pool.apply_async(_call, (function, items[position]))))
+                position += 1
+            yield pending.popleft()
+    finally:
+        pool.close()
+        pool.join()
+
+
+def warm_file(path):
+    '''
+    Reads a file through once so the next reader (deformerWeights) is served from the OS cache rather than the
+    network.
+    :param path:
+    :return: number of bytes read.
+    '''
+    size = 0
+    with open(path, 'rb') as input_file:
+        while True:
+            block = input_file.read(BLOCK_SIZE)
+            if not block:
+                break
+            size += len(block)
+    return size
+
+
+def chunk_ranges(count, size=CHUNK_SIZE):
+    '''
+    Splits count vertices into consecutive (start, stop) ranges of at most size vertices.
+    :param count:
+    :param size:
+    :return:
+    '''
+    size = max(1, size)
+    return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def _call(function, item):
+    try:
+        return function(item), None
+    except Exception as e:
+        return None, e
+
+
+def temp_path(temp_dir, path):
+    '''
+    Returns a file path in temp_dir for a rewritten copy of path that no other file in the batch will use.
+    :param temp_dir:
+    :param path:
+    :return:
+    '''
+    handle, new_path = tempfile.mkstemp(prefix=os.path.splitext(os.path.basename(path))[0] + '_', suffix='.xml',
+                                        dir=temp_dir)
+    os.close(handle)
+    return new_path.replace('\\', '/')
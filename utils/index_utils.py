@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from utils import compress_utils
+
+'''
+A persistent index of the weight files under a weights root, so import and bind don't have to walk the whole
+library every time they run. The index lives in the root (or the temp folder if the root isn't writable) and is
+refreshed incrementally: every directory is stat'ed, but only directories whose modification time changed are listed
+again.
+'''
+
+INDEX_NAME = '.weight_index.json'
+VERSION = 1
+# Directories modified this close to a scan are listed again next time, in case the file system's mtime resolution
+# hides a change made in the same instant.
+MTIME_SLACK = 2.0
+
+
+class WeightIndex(object):
+    '''
+    Weight files under root, keyed like the old os.walk lookup ('parent/folder/file.xml') and by file name.
+    '''
+
+    def __init__(self, root, save=True):
+        self.root = root.replace('\\', '/').rstrip('/')
+        self._dirs = {}
+        self._paths = None
+        self._names = None
+        self._files = None
+        self.listed = 0
+        if not os.path.isdir(self.root):
+            self._paths = {}
+            self._names = {}
+            self._files = set()
+            return
+        self._load()
+        self.refresh()
+        if save:
+            self.save()
+
+    def paths(self):
+        '''
+        Returns {'parent/folder/file.xml': full path} for every weight file under root.
+        :return:
+        '''
+        return self._paths
+
+    def lookup(self, selection):
+        '''
+        Returns the file that mirrors the hierarchy of a long DAG path, or None. The file weight_export writes for it
+        under root wins, then any file under a folder named after its parent and grandparent. Either may be compressed
+        (foo.xml.gz), the plain XML wins if both are there.
+        :param selection:
+        :return:
+        '''
+        exported = '%s/%s.xml' % (self.root, selection[1:].replace('|', '/').replace(':', '_'))
+        for path in (exported, compress_utils.compressed_path(exported)):
+            if path in self._files:
+                return path
+        parts = selection.split('|')
+        if len(parts) < 3:
+            return None
+        key = '%s/%s/%s.xml' % (parts[-3], parts[-2], parts[-1])
+        return self._paths.get(key, self._paths.get(compress_utils.compressed_path(key)))
+
+    def candidates(self, short_name):
+        '''
+        Returns the keys of files that could belong to an object called short_name: files named after it, or failing
+        that any key containing the name.
+        :param short_name:
+        :return:
+        '''
+        keys = self._names.get(short_name.lower())
+        if keys:
+            return list(keys)
+        return [x for x in self._paths if short_name in x]
+
+    def refresh(self):
+        '''
+        Brings the index up to date with the disk.
+        :return:
+        '''
+        now = time.time()
+        dirs = {}
+        stack = ['']
+        while stack:
+            relative = stack.pop()
+            full = self.root + ('/' + relative if relative else '')
+            try:
+                mtime = os.stat(full).st_mtime
+            except OSError:
+                continue
+            cached = self._dirs.get(relative)
+            if cached is not None and cached['mtime'] is not None and cached['mtime'] == mtime:
+                entry = cached
+            else:
+                entry = self._list(full, mtime, now)
+                if entry is None:
+                    continue
+            dirs[relative] = entry
+            for name in entry['subdirs']:
+                stack.append(relative + '/' + name if relative else name)
+        self._dirs = dirs
+        self._build()
+
+    def save(self):
+        '''
+        Writes the index to disk, next to the files if possible.
+        :return:
+        '''
+        data = json.dumps({'version': VERSION, 'root': self.root, 'dirs': self._dirs})
+        for path in (self._index_path(), self._fallback_path()):
+            try:
+                temp = '%s.%s.tmp' % (path, os.getpid())
+                with open(temp, 'w') as output:
+                    output.write(data)
+                if os.path.exists(path):
+                    os.remove(path)
+                os.rename(temp, path)
+                return path
+            except (IOError, OSError):
+                continue
+        return None
+
+    def _list(self, full, mtime, now):
+        try:
+            names = os.listdir(full)
+        except OSError:
+            return None
+        self.listed += 1
+        files = []
+        subdirs = []
+        for name in names:
+            if os.path.isdir(full + '/' + name):
+                subdirs.append(name)
+            elif '.xml' in name:
+                files.append(name)
+        return {'mtime': mtime if now - mtime > MTIME_SLACK else None, 'files': sorted(files),
+                'subdirs': sorted(subdirs)}
+
+    def _build(self):
+        self._paths = {}
+        self._names = {}
+        self._files = set()
+        for relative, entry in self._dirs.items():
+            dirpath = self.root + ('/' + relative if relative else '')
+            parts = dirpath.split('/')
+            for name in entry['files']:
+                key = '%s/%s/%s' % (parts[-2] if len(parts) > 1 else '', parts[-1], name)
+                self._paths[key] = '%s/%s' % (dirpath, name)
+                self._files.add(self._paths[key])
+                self._names.setdefault(name.split('.xml', 1)[0].lower(), []).append(key)
+        for keys in self._names.values():
+            keys.sort()
+
+    def _load(self):
+        for path in (self._index_path(), self._fallback_path()):
+            try:
+                with open(path) as input_file:
+                    data = json.load(input_file)
+            except (IOError, OSError, ValueError):
+                continue
+            if data.get('version') == VERSION and data.get('root') == self.root:
+                self._dirs = data['dirs']
+                return
+
+    def _index_path(self):
+        return '%s/%s' % (self.root, INDEX_NAME)
+
+    def _fallback_path(self):
+        digest = hashlib.md5(self.root.encode('utf-8')).hexdigest()
+        return os.path.join(tempfile.gettempdir(), 'weight_index_%s.json' % digest).replace('\\', '/')
+
+
+def clear_index(root):
+    '''
+    Deletes the saved index for root so the next lookup walks everything again.
+    :param root:
+    :return:
+    '''
+    index = WeightIndex.__new__(WeightIndex)
+    index.root = root.replace('\\', '/').rstrip('/')
+    for path in (index._index_path(), index._fallback_path()):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,78 @@
+import json
+import os
+import time
+
+'''
+A manifest of what an export root holds: for every weights file the content hash of the skin data it was written
+from (see export_utils.content_hash), its size and modification time, and how long it took to write. Incremental
+exports use it to skip meshes whose skin hasn't changed since the file was written. The hashes are kept here only, the
+weights files don't carry them, so a root without its manifest is exported in full.
+'''
+
+MANIFEST_NAME = '.weight_manifest.json'
+VERSION = 1
+
+
+class ExportManifest(object):
+    '''
+    The manifest of one export root, keyed by file path relative to the root.
+    '''
+
+    def __init__(self, root):
+        self.root = root.replace('\\', '/').rstrip('/')
+        self.entries = {}
+        self.path = '%s/%s' % (self.root, MANIFEST_NAME)
+        try:
+            with open(self.path) as input_file:
+                data = json.load(input_file)
+        except (IOError, OSError, ValueError):
+            return
+        if data.get('version') == VERSION:
+            self.entries = data.get('files', {})
+
+    def unchanged(self, path, content_hash):
+        '''
+        Returns True if path was written from skin data with content_hash and hasn't been touched since.
+        :param path:
+        :param content_hash:
+        :return:
+        '''
+        entry = self.entries.get(self._key(path))
+        if entry is None or entry['hash'] != content_hash:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']
+
+    def record(self, path, content_hash, seconds):
+        '''
+        Records that path was just written from skin data with content_hash.
+        :param path:
+        :param content_hash:
+        :param seconds: how long the export took.
+        :return:
+        '''
+        stat = os.stat(path)
+        self.entries[self._key(path)] = {'hash': content_hash, 'size': stat.st_size, 'mtime': stat.st_mtime,
+                                         'seconds': seconds, 'exported': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    def save(self):
+        '''
+        Writes the manifest to the root.
+        :return:
+        '''
+        temp = '%s.%s.tmp' % (self.path, os.getpid())
+        with open(temp, 'w') as output:
+            json.dump({'version': VERSION, 'files': self.entries}, output, indent=1, sort_keys=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temp, self.path)
+        return self.path
+
+    def _key(self, path):
+        path = path.replace('\\', '/')
+        if path.startswith(self.root + '/'):
+            return path[len(self.root) + 1:]
+        return path
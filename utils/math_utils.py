@@ -0,0 +1,377 @@
+from array import array
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+'''
+Array math on skin weights. Nothing in here touches Maya, so it can be used (and checked) from a plain interpreter.
+
+A weight matrix has one row per vertex and one column per influence. With NumPy available it is a float64 ndarray,
+without it a list of row lists, and every function here accepts either.
+'''
+
+
+def to_buffer(weights):
+    '''
+    Copies a flat, vertex major sequence of weights (an MDoubleArray for example) into one contiguous float64 buffer:
+    an ndarray with NumPy, without it an array('d'). An ndarray that already is one is returned as it is.
+    :param weights:
+    :return:
+    '''
+    if np is not None:
+        if isinstance(weights, np.ndarray):
+            return np.ascontiguousarray(weights, dtype=np.float64).reshape(-1)
+        return np.fromiter(weights, dtype=np.float64, count=len(weights))
+    return array('d', weights)
+
+
+def to_matrix(weights, influence_count):
+    '''
+    Turns a flat, vertex major list of weights (as MFnSkinCluster.getWeights returns them) into a weight matrix. A
+    float64 ndarray is reshaped in place, so the matrix is a view of it rather than a copy.
+    :param weights:
+    :param influence_count:
+    :return:
+    '''
+    if influence_count == 0:
+        return np.zeros((0, 0)) if np is not None else []
+    if np is not None:
+        if isinstance(weights, np.ndarray):
+            return np.asarray(weights, dtype=np.float64).reshape(-1, influence_count)
+        return np.array(weights, dtype=np.float64).reshape(-1, influence_count)
+    weights = list(weights)
+    return [weights[i:i + influence_count] for i in range(0, len(weights), influence_count)]
+
+
+def is_array(matrix):
+    return np is not None and isinstance(matrix, np.ndarray)
+
+
+def influence_counts(matrix, tolerance=0.0):
+    '''
+    Counts the influences on each vertex with a weight above tolerance.
+    :param matrix:
+    :param tolerance:
+    :return:
+    '''
+    if is_array(matrix):
+        return (np.abs(matrix) > tolerance).sum(axis=1)
+    return [len([x for x in row if abs(x) > tolerance]) for row in matrix]
+
+
+def audit_influences(matrix, limit, tolerance=0.0):
+    '''
+    Returns the highest influence count in matrix and the ids of the vertices with more than limit influences.
+    :param matrix:
+    :param limit:
+    :param tolerance:
+    :return:
+    '''
+    counts = influence_counts(matrix, tolerance)
+    if len(counts) == 0:
+        return 0, []
+    if is_array(matrix):
+        return int(counts.max()), np.flatnonzero(counts > limit).tolist()
+    return max(counts), [i for i, count in enumerate(counts) if count > limit]
+
+
+def prune_matrix(matrix, limit):
+    '''
+    Keeps the limit highest weights on each vertex and renormalizes the rows that lost weights. Ties drop the
+    influence with the lower index first, the same order the per vertex skinPercent pruning used.
+    :param matrix:
+    :param limit:
+    :return: (pruned matrix, ids of the vertices that changed)
+    '''
+    if is_array(matrix):
+        pruned = matrix.copy()
+        if pruned.shape[1] <= limit:
+            return pruned, []
+        # Only positive weights are candidates, everything else sorts to the front and is left alone.
+        keys = np.where(pruned > 0, pruned, -np.inf)
+        order = np.argsort(keys, axis=1, kind='mergesort')[:, :pruned.shape[1] - limit]
+        rows = np.arange(pruned.shape[0])[:, None]
+        drop = np.zeros(pruned.shape, dtype=bool)
+        drop[rows, order] = True
+        drop &= pruned > 0
+        changed = np.flatnonzero(drop.any(axis=1))
+        pruned[drop] = 0.0
+        totals = pruned[changed].sum(axis=1)
+        totals[totals == 0] = 1.0
+        pruned[changed] /= totals[:, None]
+        return pruned, changed.tolist()
+    pruned = []
+    changed = []
+    for index, row in enumerate(matrix):
+        positive = sorted([i for i in range(len(row)) if row[i] > 0], key=lambda x: row[x])
+        row = list(row)
+        if len(positive) > limit:
+            for i in positive[:len(positive) - limit]:
+                row[i] = 0.0
+            total = sum(row)
+            if total != 0:
+                row = [x / total for x in row]
+            changed.append(index)
+        pruned.append(row)
+    return pruned, changed
+
+
+def sparsify_matrix(matrix, threshold=0.0, limit=None):
+    '''
+    Zeroes the positive weights below threshold and, given a limit, all but the limit highest weights on each vertex
+    (see prune_matrix), then renormalizes the vertices that lost weights. A vertex always keeps its highest weight, so
+    none is left without weights.
+    :param matrix:
+    :param threshold:
+    :param limit:
+    :return: (sparse matrix, ids of the vertices that changed)
+    '''
+    if is_array(matrix):
+        sparse = matrix.copy()
+        if sparse.size == 0:
+            return sparse, []
+        drop = (sparse > 0) & (sparse < threshold)
+        drop[np.arange(sparse.shape[0]), sparse.argmax(axis=1)] = False
+        sparse[drop] = 0.0
+        changed = set(np.flatnonzero(drop.any(axis=1)).tolist())
+        if limit is not None:
+            sparse, pruned = prune_matrix(sparse, limit)
+            changed.update(pruned)
+        changed = sorted(changed)
+        totals = sparse[changed].sum(axis=1)
+        totals[totals == 0] = 1.0
+        sparse[changed] /= totals[:, None]
+        return sparse, changed
+    sparse = []
+    changed = set()
+    for index, row in enumerate(matrix):
+        row = list(row)
+        if len(row) > 0:
+            highest = row.index(max(row))
+            drop = [i for i in range(len(row)) if 0 < row[i] < threshold and i != highest]
+            for i in drop:
+                row[i] = 0.0
+            if drop:
+                changed.add(index)
+        sparse.append(row)
+    if limit is not None:
+        sparse, pruned = prune_matrix(sparse, limit)
+        changed.update(pruned)
+    for index in changed:
+        total = sum(sparse[index])
+        if total != 0:
+            sparse[index] = [x / total for x in sparse[index]]
+    return sparse, sorted(changed)
+
+
+def unnormalized(matrix, tolerance=0.0):
+    '''
+    Returns the ids of the vertices whose weights don't sum to one within tolerance. Vertices without any weight are
+    left out, there is nothing to scale them by.
+    :param matrix:
+    :param tolerance:
+    :return:
+    '''
+    if is_array(matrix):
+        if matrix.size == 0:
+            return []
+        totals = matrix.sum(axis=1)
+        return np.flatnonzero((np.abs(totals - 1.0) > tolerance) & (totals != 0)).tolist()
+    vertices = []
+    for index, row in enumerate(matrix):
+        total = sum(row)
+        if total != 0 and abs(total - 1.0) > tolerance:
+            vertices.append(index)
+    return vertices
+
+
+def normalize_rows(matrix, tolerance=0.0):
+    '''
+    Scales the weights of the vertices that don't sum to one within tolerance (see unnormalized) so they do, the
+    in memory equivalent of skinPercent -normalize.
+    :param matrix:
+    :param tolerance:
+    :return: (normalized matrix, ids of the vertices that were scaled)
+    '''
+    vertices = unnormalized(matrix, tolerance)
+    if is_array(matrix):
+        matrix = matrix.copy()
+        if vertices:
+            matrix[vertices] /= matrix[vertices].sum(axis=1)[:, None]
+        return matrix, vertices
+    matrix = list(matrix)
+    for index in vertices:
+        total = sum(matrix[index])
+        matrix[index] = [x / total for x in matrix[index]]
+    return matrix, vertices
+
+
+def flatten(matrix, vertices=None):
+    '''
+    Turns a weight matrix (or the given rows of it) back into a flat, vertex major list of weights.
+    :param matrix:
+    :param vertices:
+    :return:
+    '''
+    if is_array(matrix):
+        if vertices is not None:
+            matrix = matrix[vertices]
+        return matrix.ravel().tolist()
+    if vertices is not None:
+        matrix = [matrix[i] for i in vertices]
+    return [x for row in matrix for x in row]
+
+
+def column(matrix, influence, precision=None):
+    '''
+    Returns (vertex ids, values) of the non zero weights of one influence. With a precision, weights that would be
+    written as zero at that many decimals are left out.
+    :param matrix:
+    :param influence:
+    :param precision:
+    :return:
+    '''
+    tolerance = 0.5 * 10 ** -precision if precision is not None else 0.0
+    if is_array(matrix):
+        values = matrix[:, influence]
+        indices = np.flatnonzero(np.abs(values) >= tolerance if tolerance else values != 0)
+        return indices.tolist(), values[indices].tolist()
+    indices = []
+    values = []
+    for index, row in enumerate(matrix):
+        value = row[influence]
+        if (abs(value) >= tolerance) if tolerance else value != 0:
+            indices.append(index)
+            values.append(value)
+    return indices, values
+
+
+def remap_columns(joints, columns, source, target):
+    '''
+    The in memory counterpart of xml_utils.remap_xml: sums the weights of each source joint into its target, clamped
+    at one, and drops source joints that aren't also targets. A joint mapped to itself just gets an (empty) column.
+    :param joints: joint of each column.
+    :param columns: (indices, values) per joint.
+    :param source:
+    :param target:
+    :return: {joint: {vertex id: weight}}
+    '''
+    points = {}
+    for joint, (indices, values) in zip(joints, columns):
+        points.setdefault(joint, {}).update(zip(indices, values))
+    for joint in source:
+        goal = target[source.index(joint)]
+        if goal == joint:
+            points.setdefault(joint, {})
+            continue
+        merged = dict(points.get(joint, {}))
+        for index, value in points.get(goal, {}).items():
+            merged[index] = min(merged[index] + value, 1.0) if index in merged else value
+        points[goal] = merged
+    # Joints that are remapped away are only dropped if something was actually remapped.
+    if any(target[source.index(joint)] != joint for joint in source):
+        for joint in source:
+            if joint not in target:
+                points.pop(joint, None)
+    return points
+
+
+def influence_layers(influences):
+    '''
+    Maps influence names to their columns. Files name joints by their short names while influences may come as
+    partial paths, so both are mapped.
+    :param influences:
+    :return: {name: column}
+    '''
+    layers = dict([(name, layer) for layer, name in enumerate(influences)])
+    for layer, name in enumerate(influences):
+        layers.setdefault(name.rsplit('|', 1)[-1], layer)
+    return layers
+
+
+def from_columns(points, influences, vertex_count):
+    '''
+    Builds a weight matrix with a column per influence from per joint point maps (see remap_columns). Influences
+    missing from points get zero weights.
+    :param points:
+    :param influences:
+    :param vertex_count:
+    :return: the matrix, or None if points has weights on a joint that isn't an influence or on a vertex past
+     vertex_count.
+    '''
+    layers = influence_layers(influences)
+    for joint in points:
+        if points[joint] and (joint not in layers or max(points[joint]) >= vertex_count):
+            return None
+    if np is not None:
+        matrix = np.zeros((vertex_count, len(influences)))
+        for joint, joint_points in points.items():
+            if joint_points:
+                matrix[list(joint_points.keys()), layers[joint]] = list(joint_points.values())
+        return matrix
+    matrix = [[0.0] * len(influences) for _ in range(vertex_count)]
+    for joint, joint_points in points.items():
+        for index, value in joint_points.items():
+            matrix[index][layers[joint]] = value
+    return matrix
+
+
+def diff_column(old, new, tolerance=0.0):
+    '''
+    Compares two versions of one influence's weights, as (vertex ids, values) pairs sorted by vertex id the way files
+    hold them. A vertex missing from one side has a weight of zero there.
+    :param old:
+    :param new:
+    :param tolerance: how far apart two weights may be and still count as the same.
+    :return: (ids of the vertices whose weight changed, their new weights)
+    '''
+    if np is not None:
+        old_ids = np.asarray(old[0], dtype=np.int64)
+        new_ids = np.asarray(new[0], dtype=np.int64)
+        ids = np.union1d(old_ids, new_ids)
+        old_values = np.zeros(len(ids))
+        old_values[np.searchsorted(ids, old_ids)] = np.asarray(old[1], dtype=np.float64)
+        new_values = np.zeros(len(ids))
+        new_values[np.searchsorted(ids, new_ids)] = np.asarray(new[1], dtype=np.float64)
+        changed = np.abs(new_values - old_values) > tolerance
+        return ids[changed].tolist(), new_values[changed].tolist()
+    old_points = dict(zip(old[0], old[1]))
+    new_points = dict(zip(new[0], new[1]))
+    ids = []
+    values = []
+    for index in sorted(set(old_points) | set(new_points)):
+        value = new_points.get(index, 0.0)
+        if abs(value - old_points.get(index, 0.0)) > tolerance:
+            ids.append(index)
+            values.append(value)
+    return ids, values
+
+
+def set_points(matrix, points, influences):
+    '''
+    Writes per joint weights into a copy of a weight matrix, leaving every other weight as it is.
+    :param matrix:
+    :param points: {joint: (vertex ids, weights)}
+    :param influences: influence name of each column of matrix.
+    :return: (the new matrix, ids of the vertices written to), or None if points has weights on a joint that isn't an
+     influence or on a vertex past the end of matrix.
+    '''
+    layers = influence_layers(influences)
+    for joint, (ids, values) in points.items():
+        if len(ids) and (joint not in layers or max(ids) >= len(matrix)):
+            return None
+    vertices = sorted(set([index for ids, values in points.values() for index in ids]))
+    if is_array(matrix):
+        matrix = matrix.copy()
+        for joint, (ids, values) in points.items():
+            if len(ids):
+                matrix[list(ids), layers[joint]] = list(values)
+        return matrix, vertices
+    matrix = list(matrix)
+    for index in vertices:
+        matrix[index] = list(matrix[index])
+    for joint, (ids, values) in points.items():
+        for index, value in zip(ids, values):
+            matrix[index][layers[joint]] = value
+    return matrix, vertices
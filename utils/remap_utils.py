@@ -0,0 +1,203 @@
+import json
+import os
+import re
+
+'''
+Joint remap plans: named, reusable answers to "which joint should inherit the weights of this one?", so a batch only
+has to be told once and a farm job doesn't have to be told at all. Nothing in here needs Maya.
+
+A plan is an ordered list of rules. A joint missing from the skinCluster goes to the first rule whose result is a
+joint on the skinCluster:
+
+    {'match': 'L_arm_old', 'target': 'L_arm'}       exact name
+    {'match': '*_old', 'target': '*_jnt'}           wildcards, * and ? in target take what they matched, in order
+    {'namespace': 'rigA', 'target': 'rigB'}         swaps a namespace, '*' is any namespace and '' none
+
+Plans are saved as JSON, by name under WEIGHT_TOOLS_REMAP_PLANS (or ~/weight_tools/remap_plans) or at any path.
+'''
+
+VERSION = 1
+EXTENSION = '.json'
+PLANS_VARIABLE = 'WEIGHT_TOOLS_REMAP_PLANS'
+
+
+class RemapPlan(object):
+    '''
+    An ordered list of remap rules, compiled once. What each joint name resolves to is remembered, so a batch pays
+    for the rules once per distinct joint rather than once per file.
+    '''
+
+    def __init__(self, name=None, rules=None, path=None):
+        self.name = name
+        # Where the plan was loaded from or will be saved to, None for the named location.
+        self.path = path
+        self.rules = []
+        self.changed = False
+        self._compiled = []
+        self._cache = {}
+        for rule in rules or []:
+            self._append(dict(rule))
+
+    def resolve(self, joint, available):
+        '''
+        Returns the joint that should inherit the weights of joint: the first rule result found in available, or None.
+        :param joint:
+        :param available: joints on the skinCluster, ideally a set.
+        :return:
+        '''
+        candidates = self._cache.get(joint)
+        if candidates is None:
+            candidates = self._cache[joint] = self._candidates(joint)
+        for candidate in candidates:
+            if candidate in available:
+                return candidate
+        return None
+
+    def add_rule(self, match, target):
+        '''
+        Adds an exact rule ahead of the others, replacing any exact rule for the same joint.
+        :param match:
+        :param target:
+        :return:
+        '''
+        for index, rule in enumerate(self.rules):
+            if rule.get('match') == match and not _is_pattern(match):
+                del self.rules[index]
+                del self._compiled[index]
+                break
+        self.rules.insert(0, {'match': match, 'target': target})
+        self._compiled.insert(0, _compile(self.rules[0]))
+        self._cache.clear()
+        self.changed = True
+
+    def to_dict(self):
+        return {'version': VERSION, 'name': self.name, 'rules': [dict(x) for x in self.rules]}
+
+    def _append(self, rule):
+        self._compiled.append(_compile(rule))
+        self.rules.append(rule)
+
+    def _candidates(self, joint):
+        candidates = []
+        for kind, pattern, target in self._compiled:
+            if kind == 'namespace':
+                namespace, _, short_name = joint.rpartition(':')
+                if pattern == namespace or (pattern == '*' and namespace):
+                    candidates.append('%s:%s' % (target, short_name) if target else short_name)
+                continue
+            found = pattern.match(joint)
+            if found is None:
+                continue
+            if kind == 'exact':
+                candidates.append(target)
+            else:
+                groups = iter(found.groups())
+                candidates.append(re.sub(r'[*?]', lambda x: next(groups, ''), target))
+        return candidates
+
+
+def _is_pattern(text):
+    return '*' in text or '?' in text
+
+
+def _compile(rule):
+    '''
+    Turns a rule into (kind, pattern, target).
+    :param rule:
+    :return:
+    '''
+    if 'namespace' in rule:
+        return 'namespace', rule['namespace'].strip(':'), rule.get('target', '').strip(':')
+    if 'match' not in rule or 'target' not in rule:
+        raise ValueError('Remap rules need match and target, or namespace: %s' % rule)
+    match = rule['match']
+    if not _is_pattern(match):
+        return 'exact', re.compile(re.escape(match) + r'\Z'), rule['target']
+    expression = ''.join(['(.*)' if x == '*' else '(.)' if x == '?' else re.escape(x) for x in match])
+    return 'wildcard', re.compile(expression + r'\Z'), rule['target']
+
+
+def plans_directory():
+    '''
+    Returns the folder named plans are kept in.
+    :return:
+    '''
+    directory = os.environ.get(PLANS_VARIABLE)
+    if not directory:
+        directory = os.path.join(os.path.expanduser('~'), 'weight_tools', 'remap_plans')
+    return directory.replace('\\', '/')
+
+
+def plan_path(name):
+    '''
+    Returns the file of a named plan, or name itself if it is already a path to a plan file.
+    :param name:
+    :return:
+    '''
+    if name.endswith(EXTENSION) or '/' in name or '\\' in name:
+        return name.replace('\\', '/')
+    return '%s/%s%s' % (plans_directory(), name, EXTENSION)
+
+
+def list_plans():
+    '''
+    Returns the names of the saved plans.
+    :return:
+    '''
+    directory = plans_directory()
+    if not os.path.isdir(directory):
+        return []
+    return sorted([x[:-len(EXTENSION)] for x in os.listdir(directory) if x.endswith(EXTENSION)])
+
+
+def load_plan(name):
+    '''
+    Loads a plan by name or path.
+    :param name:
+    :return:
+    '''
+    path = plan_path(name)
+    with open(path) as input_file:
+        data = json.load(input_file)
+    if data.get('version') != VERSION:
+        raise ValueError('%s is not a version %s remap plan' % (path, VERSION))
+    return RemapPlan(data.get('name') or os.path.splitext(os.path.basename(path))[0], data.get('rules'), path)
+
+
+def save_plan(plan, path=None):
+    '''
+    Saves plan to path, where it was loaded from, or under its name.
+    :param plan:
+    :param path:
+    :return: the file written.
+    '''
+    if path is None:
+        path = plan.path
+    if path is None:
+        if not plan.name:
+            raise ValueError('Unnamed remap plans need a path to be saved to.')
+        path = plan_path(plan.name)
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as output:
+        json.dump(plan.to_dict(), output, indent=2, sort_keys=True)
+    plan.changed = False
+    return path
+
+
+def get_plan(plan=None):
+    '''
+    Returns a RemapPlan for whatever weight_import was given: a plan, the name or path of a saved one, or None for an
+    empty plan that only lasts the session. A name that hasn't been saved yet gives an empty plan of that name.
+    :param plan:
+    :return:
+    '''
+    if isinstance(plan, RemapPlan):
+        return plan
+    if plan is None:
+        return RemapPlan()
+    path = plan_path(plan)
+    if os.path.exists(path):
+        return load_plan(plan)
+    return RemapPlan(os.path.splitext(os.path.basename(path))[0], path=path)
@@ -0,0 +1,311 @@
+try:
+    import maya.cmds as cmds
+    import maya.api.OpenMaya as om
+    import maya.api.OpenMayaAnim as oma
+except ImportError:
+    # Only FakeBackend works without Maya.
+    cmds = om = oma = None
+from timeit import default_timer as timer
+from utils import export_utils
+from utils import math_utils
+
+'''
+Bulk skinCluster access. Everything in here reads or writes a whole deformer per call instead of going through
+maya.cmds one vertex at a time.
+
+The weights come and go through a backend. MayaBackend reads a skinCluster with one MFnSkinCluster.getWeights call
+into a SkinData, a single contiguous float64 buffer (an ndarray with NumPy) plus its influence list, and writes rows
+back with one setWeights call. FakeBackend keeps skinClusters in memory, so the layer and everything built on it can
+run without Maya: set_backend(FakeBackend()) and add_skin what the code under test should find.
+'''
+
+
+class SkinResolver(object):
+    '''
+    Maps shapes (and their transforms) to the skinClusters deforming them. The whole scene is mapped in one pass the
+    first time it is asked, one skinCluster query per skinCluster instead of a history walk per shape, and the
+    answers are remembered until the resolver is thrown away. seconds is the time spent resolving so far. The mapping
+    pass is a span of tracer, if one is given (see trace_utils).
+    '''
+
+    def __init__(self, tracer=None):
+        self.seconds = 0.0
+        self.tracer = tracer
+        self._skins = None
+
+    def find(self, item):
+        '''
+        Returns the first skinCluster deforming item (a transform or a shape), or None.
+        :param item:
+        :return:
+        '''
+        skins = self.find_all(item)
+        return skins[0] if skins else None
+
+    def find_all(self, item):
+        '''
+        Returns every skinCluster deforming item or the shapes under it.
+        :param item:
+        :return:
+        '''
+        start_time = timer()
+        if self._skins is None:
+            token = self.tracer.begin('map_skin_clusters') if self.tracer is not None else None
+            self._build()
+            if token is not None:
+                self.tracer.end(token, skin_clusters=len(set([x for skins in self._skins.values() for x in skins])))
+        if not item.startswith('|'):
+            long_names = cmds.ls(item, l=True)
+            item = long_names[0] if long_names else item
+        skins = list(self._skins.get(item, []))
+        self.seconds += timer() - start_time
+        return skins
+
+    def _build(self):
+        self._skins = {}
+        for skin in cmds.ls(type='skinCluster') or []:
+            shapes = cmds.skinCluster(skin, q=True, g=True) or []
+            for shape in cmds.ls(shapes, l=True) or []:
+                # A transform is deformed by whatever deforms its shapes.
+                for node in (shape, shape.rsplit('|', 1)[0]):
+                    if skin not in self._skins.setdefault(node, []):
+                        self._skins[node].append(skin)
+
+
+class SkinData(object):
+    '''
+    Every weight of one skinCluster as a flat, vertex major buffer (see math_utils.to_buffer) and the influences its
+    columns belong to. matrix() is a view of the buffer, so changing it changes weights.
+    '''
+
+    def __init__(self, deformer, shape, influences, weights):
+        self.deformer = deformer
+        self.shape = shape
+        self.influences = list(influences)
+        self.weights = math_utils.to_buffer(weights)
+
+    @property
+    def vertex_count(self):
+        return len(self.weights) // len(self.influences) if self.influences else 0
+
+    def matrix(self):
+        return math_utils.to_matrix(self.weights, len(self.influences))
+
+
+class MayaBackend(object):
+    '''
+    Reads and writes skinClusters through the OpenMaya API, a whole deformer per call.
+    '''
+
+    def read(self, deformer):
+        skin, path, components = _skin_components(deformer)
+        weights, influence_count = skin.getWeights(path, components)
+        return SkinData(deformer, path.partialPathName(), [x.partialPathName() for x in skin.influenceObjects()],
+                        weights)
+
+    def skin_info(self, deformer):
+        skin, path, components = _skin_components(deformer)
+        return [x.partialPathName() for x in skin.influenceObjects()], om.MFnMesh(path).numVertices
+
+    def points(self, deformer):
+        skin, path, components = _skin_components(deformer)
+        return [x for point in om.MFnMesh(path).getPoints(om.MSpace.kObject) for x in (point.x, point.y, point.z)]
+
+    def world_matrix(self, deformer):
+        skin, path, components = _skin_components(deformer)
+        matrix = path.inclusiveMatrix()
+        return [matrix.getElement(row, column) for row in range(4) for column in range(4)]
+
+    def write(self, deformer, weights, vertices=None, return_old=False):
+        skin, path, components = _skin_components(deformer, vertices)
+        influences = om.MIntArray(range(len(skin.influenceObjects())))
+        old = skin.setWeights(path, components, influences, om.MDoubleArray(weights), False, return_old)
+        return list(old) if return_old else None
+
+
+class FakeBackend(object):
+    '''
+    Keeps skinClusters in memory instead of a scene, for running the weights code without Maya. Reads return copies,
+    writes change the stored buffer.
+    '''
+
+    def __init__(self):
+        self.skins = {}
+        self.positions = {}
+
+    def add_skin(self, deformer, shape, influences, weights, points=None):
+        '''
+        Adds (or replaces) a skinCluster.
+        :param deformer:
+        :param shape:
+        :param influences:
+        :param weights: flat, vertex major weights, or a weight matrix.
+        :param points: flat x, y, z positions of the shape's vertices, zeros if None.
+        :return: the stored SkinData
+        '''
+        if len(weights) and not isinstance(weights[0], float) and hasattr(weights[0], '__len__'):
+            weights = math_utils.flatten(weights)
+        self.skins[deformer] = SkinData(deformer, shape, influences, weights)
+        count = self.skins[deformer].vertex_count
+        self.positions[deformer] = list(points) if points is not None else [0.0] * count * 3
+        return self.skins[deformer]
+
+    def _find(self, deformer):
+        if deformer not in self.skins:
+            raise RuntimeError('(kInvalidParameter): Object does not exist: %s' % deformer)
+        return self.skins[deformer]
+
+    def read(self, deformer):
+        data = self._find(deformer)
+        weights = data.weights.copy() if math_utils.is_array(data.weights) else data.weights[:]
+        return SkinData(deformer, data.shape, data.influences, weights)
+
+    def skin_info(self, deformer):
+        data = self._find(deformer)
+        return list(data.influences), data.vertex_count
+
+    def points(self, deformer):
+        self._find(deformer)
+        return list(self.positions[deformer])
+
+    def world_matrix(self, deformer):
+        self._find(deformer)
+        return [float(i % 5 == 0) for i in range(16)]
+
+    def write(self, deformer, weights, vertices=None, return_old=False):
+        data = self._find(deformer)
+        count = len(data.influences)
+        if vertices is None:
+            vertices = range(data.vertex_count)
+        old = []
+        for n, vertex in enumerate(vertices):
+            start = vertex * count
+            if return_old:
+                old.extend(data.weights[start:start + count])
+            data.weights[start:start + count] = math_utils.to_buffer(weights[n * count:(n + 1) * count])
+        return [float(x) for x in old] if return_old else None
+
+
+backend = MayaBackend()
+
+
+def set_backend(new_backend):
+    '''
+    Routes everything in here through new_backend, a MayaBackend or FakeBackend.
+    :param new_backend:
+    :return: the backend it replaces, to put back afterwards.
+    '''
+    global backend
+    old_backend = backend
+    backend = new_backend
+    return old_backend
+
+
+def read_skin(deformer):
+    '''
+    Reads every weight of deformer in one call.
+    :param deformer:
+    :return: a SkinData
+    '''
+    return backend.read(deformer)
+
+
+def get_weights(deformer):
+    '''
+    Reads every weight of deformer with a single MFnSkinCluster.getWeights call.
+    :param deformer:
+    :return: (matrix, influences) where matrix has a row per vertex and a column per influence.
+    '''
+    data = backend.read(deformer)
+    return data.matrix(), data.influences
+
+
+def get_skin_info(deformer):
+    '''
+    Returns the influence names of deformer, in the order weight matrices use, and the vertex count of its shape.
+    :param deformer:
+    :return: (influences, vertex count)
+    '''
+    return backend.skin_info(deformer)
+
+
+def get_points(deformer):
+    '''
+    Returns the object space vertex positions of the shape deformer drives, as flat x, y, z values.
+    :param deformer:
+    :return:
+    '''
+    return backend.points(deformer)
+
+
+def get_export_data(deformer):
+    '''
+    Pulls everything needed to write a weights file for deformer out of the scene in a few bulk calls. The result is
+    plain data (the weights a SkinData buffer), so it can be pickled and handed to another process.
+    :param deformer:
+    :return:
+    '''
+    data = backend.read(deformer)
+    return {'deformer': deformer,
+            'shape': data.shape,
+            'influences': data.influences,
+            'weights': data.weights,
+            'positions': backend.points(deformer),
+            'world_matrix': backend.world_matrix(deformer)}
+
+
+def content_hash(deformer, sparse=None):
+    '''
+    Returns the hash of what exporting deformer would write (see export_utils.content_hash).
+    :param deformer:
+    :param sparse:
+    :return:
+    '''
+    return export_utils.content_hash(get_export_data(deformer), sparse)
+
+
+def set_weights(deformer, matrix, vertices=None):
+    '''
+    Writes a weight matrix back to deformer with a single MFnSkinCluster.setWeights call. If vertices is given only
+    those rows are written. Weights are written as they are, without normalization.
+    Note that API calls don't go on Maya's undo queue.
+    :param deformer:
+    :param matrix:
+    :param vertices:
+    :return:
+    '''
+    set_rows(deformer, math_utils.flatten(matrix, vertices), vertices)
+
+
+def set_rows(deformer, weights, vertices=None, return_old=False):
+    '''
+    Writes a flat, vertex major list of weights holding just the rows of vertices (or of every vertex), in the order of
+    vertices.
+    :param deformer:
+    :param weights:
+    :param vertices:
+    :param return_old: return the weights that were replaced, in the same layout, so they can be put back.
+    :return: the replaced weights if return_old, else None.
+    '''
+    return backend.write(deformer, weights, vertices, return_old)
+
+
+def _skin_components(deformer, vertices=None):
+    '''
+    Returns the function set of deformer, the dag path of its output shape and a component holding the given
+    vertices, or every vertex.
+    :param deformer:
+    :param vertices:
+    :return:
+    '''
+    selection = om.MSelectionList()
+    selection.add(deformer)
+    skin = oma.MFnSkinCluster(selection.getDependNode(0))
+    path = skin.getPathAtIndex(0)
+    component_fn = om.MFnSingleIndexedComponent()
+    components = component_fn.create(om.MFn.kMeshVertComponent)
+    if vertices is None:
+        component_fn.setCompleteData(om.MFnMesh(path).numVertices)
+    else:
+        component_fn.addElements(vertices)
+    return skin, path, components
@@ -0,0 +1,242 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from timeit import default_timer as timer
+
+'''
+Named timing spans for the stages of an operation (finding skinClusters, indexing the weights root, parsing and
+remapping files, deformerWeights, normalizing) and for each mesh it touches, with optional cProfile capture. A trace
+can be saved as JSON, or in the Chrome trace event format to be opened in chrome://tracing or https://ui.perfetto.dev.
+
+Tracing is off until a Tracer is started, and a span on a stopped tracer costs one attribute check, so the spans can
+stay in the code for good. Nothing in here touches Maya.
+'''
+
+VERSION = 1
+
+
+class Tracer(object):
+    '''
+    Collects spans from any thread. Spans are (name, start, seconds, thread, args) and nest by time, so a span begun
+    inside another one shows up under it in a trace viewer.
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.started = None
+        self.seconds = 0.0
+        self._start_time = None
+        self._lock = threading.Lock()
+        self._profile = None
+        self._threads = {}
+
+    def start(self, profile=False):
+        '''
+        Throws away any previous trace and starts recording.
+        :param profile: also run cProfile over the calling thread until stop.
+        :return:
+        '''
+        self.spans = []
+        self._threads = {}
+        self.started = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.seconds = 0.0
+        self._start_time = timer()
+        self._profile = None
+        if profile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self.enabled = True
+        return self
+
+    def stop(self):
+        '''
+        Stops recording, keeping what was recorded.
+        :return:
+        '''
+        if self._profile is not None:
+            self._profile.disable()
+        if self.enabled:
+            self.seconds = timer() - self._start_time
+        self.enabled = False
+        return self
+
+    def begin(self, name, **args):
+        '''
+        Opens a span, for stages that don't fit in a with block. Pass the result to end.
+        :param name:
+        :param args: anything worth knowing about the span, the mesh or file it is for for example.
+        :return: a token for end, None if the tracer isn't recording.
+        '''
+        if not self.enabled:
+            return None
+        return name, timer(), args
+
+    def end(self, token, **args):
+        '''
+        Closes a span opened with begin.
+        :param token:
+        :param args: added to the span's args.
+        :return:
+        '''
+        if token is None or not self.enabled:
+            return
+        name, start, span_args = token
+        if args:
+            span_args = dict(span_args, **args)
+        self._record(name, start, timer() - start, span_args)
+
+    def span(self, name, **args):
+        '''
+        with tracer.span('stage', mesh=item): ...
+        :param name:
+        :param args:
+        :return:
+        '''
+        return _Span(self, name, args)
+
+    def add(self, name, seconds, thread='workers', **args):
+        '''
+        Records a span that has just finished somewhere the tracer couldn't see, a worker process for example.
+        :param name:
+        :param seconds: how long it took, it is taken to have ended now.
+        :param thread: what to file it under instead of the calling thread.
+        :param args:
+        :return:
+        '''
+        if not self.enabled:
+            return
+        self._record(name, timer() - seconds, seconds, args, thread)
+
+    def summary(self):
+        '''
+        Totals by span name.
+        :return: {name: {'count', 'seconds', 'max'}}
+        '''
+        totals = {}
+        for span in self.spans:
+            total = totals.setdefault(span['name'], {'count': 0, 'seconds': 0.0, 'max': 0.0})
+            total['count'] += 1
+            total['seconds'] += span['seconds']
+            total['max'] = max(total['max'], span['seconds'])
+        return totals
+
+    def report(self, limit=20):
+        '''
+        Returns the span names taking the most time, as text.
+        :param limit:
+        :return:
+        '''
+        totals = sorted(self.summary().items(), key=lambda x: -x[1]['seconds'])[:limit]
+        lines = ['%-32s %8s %10s %10s' % ('span', 'count', 'seconds', 'max')]
+        for name, total in totals:
+            lines.append('%-32s %8d %10.3f %10.3f' % (name, total['count'], total['seconds'], total['max']))
+        return '\n'.join(lines)
+
+    def profile_report(self, limit=30, sort='cumulative'):
+        '''
+        Returns the cProfile statistics as text, or None if the trace wasn't started with profile.
+        :param limit:
+        :param sort:
+        :return:
+        '''
+        if self._profile is None:
+            return None
+        stream = io.BytesIO() if str is bytes else io.StringIO()
+        pstats.Stats(self._profile, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def save(self, path):
+        '''
+        Writes the spans and their summary as JSON.
+        :param path:
+        :return:
+        '''
+        data = {'version': VERSION, 'started': self.started, 'seconds': self.seconds, 'spans': self.spans,
+                'summary': self.summary()}
+        with open(path, 'w') as output:
+            json.dump(data, output, indent=1, sort_keys=True)
+        return path
+
+    def save_chrome(self, path):
+        '''
+        Writes the spans in the Chrome trace event format.
+        :param path:
+        :return:
+        '''
+        pid = os.getpid()
+        events = []
+        for thread, tid in sorted(self._threads.items(), key=lambda x: x[1]):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread}})
+        for span in self.spans:
+            events.append({'name': span['name'], 'cat': span['name'].split(':', 1)[0], 'ph': 'X', 'pid': pid,
+                           'tid': self._threads[span['thread']], 'ts': int(span['start'] * 1e6),
+                           'dur': int(span['seconds'] * 1e6), 'args': span['args']})
+        with open(path, 'w') as output:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, output)
+        return path
+
+    def save_profile(self, path):
+        '''
+        Writes the cProfile statistics for pstats or snakeviz, if the trace was started with profile.
+        :param path:
+        :return: path, or None if there is no profile.
+        '''
+        if self._profile is None:
+            return None
+        self._profile.dump_stats(path)
+        return path
+
+    def _record(self, name, start, seconds, args, thread=None):
+        if thread is None:
+            thread = threading.current_thread().name
+        span = {'name': name, 'start': start - self._start_time, 'seconds': seconds, 'thread': thread,
+                'args': args}
+        with self._lock:
+            self._threads.setdefault(thread, len(self._threads))
+            self.spans.append(span)
+
+
+class _Span(object):
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._token = None
+
+    def __enter__(self):
+        self._token = self._tracer.begin(self._name, **self._args)
+        return self
+
+    def __exit__(self, *args):
+        self._tracer.end(self._token)
+
+
+def traced(name=None):
+    '''
+    Decorator that puts a method in a span of the tracer on its object (self.tracer), named after the method unless
+    name is given.
+    :param name:
+    :return:
+    '''
+    def decorate(function):
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            tracer = getattr(self, 'tracer', None)
+            if tracer is None or not tracer.enabled:
+                return function(self, *args, **kwargs)
+            token = tracer.begin(label)
+            try:
+                return function(self, *args, **kwargs)
+            finally:
+                tracer.end(token)
+        return wrapper
+    return decorate
@@ -0,0 +1,314 @@
+from collections import OrderedDict
+import math
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+from utils import bundle_utils
+
+'''
+Position based weight transfer: finds the vertices of an exported shape nearest to each vertex of the mesh being
+imported onto and blends their weights by inverse distance. Nothing in here touches Maya.
+
+The positions come from the shape element deformerWeights writes (object space, like its own nearest method). The
+spatial index over them is a scipy KD-tree when scipy is available, otherwise a uniform grid, and is built once per
+file and kept (see get_index). With NumPy, grid lookups and blending are done a block of vertices at a time.
+'''
+
+# Rows blended at a time, which bounds the memory of the gathered neighbour weights.
+BLOCK_SIZE = 16384
+# Spatial indices kept, keyed by (path, mtime, size).
+INDEX_CACHE_SIZE = 8
+# Distances below this are treated as the same position.
+EPSILON = 1e-9
+# Points the grid aims to have per occupied cell, and how often it may double its cells to get there.
+CELL_POINTS = 2
+GRID_PASSES = 4
+# Grid queries answered at a time with NumPy, and the most candidate points a block may gather before it is split.
+QUERY_BLOCK = 4096
+CANDIDATE_BUDGET = 524288
+_index_cache = OrderedDict()
+
+
+class SpatialIndex(object):
+    '''
+    Nearest neighbour lookups over a fixed set of vertex positions.
+    '''
+
+    def __init__(self, ids, positions):
+        '''
+        :param ids: vertex id of each position.
+        :param positions: flat x, y, z values, three per id.
+        '''
+        self.ids = list(ids)
+        self.count = len(self.ids)
+        self._tree = None
+        self._cells = {}
+        self._cell_size = 1.0
+        self._bounds = None
+        if self.count == 0:
+            return
+        if np is not None:
+            self._ids = np.asarray(self.ids)
+        if cKDTree is not None and np is not None:
+            self._tree = cKDTree(np.asarray(positions, dtype=np.float64).reshape(-1, 3))
+            return
+        self._points = [tuple(positions[i:i + 3]) for i in range(0, self.count * 3, 3)]
+        lower = [min(x[axis] for x in self._points) for axis in range(3)]
+        upper = [max(x[axis] for x in self._points) for axis in range(3)]
+        diagonal = math.sqrt(sum([(b - a) ** 2 for a, b in zip(lower, upper)]))
+        # Mesh vertices mostly lie on a surface, so their spacing goes with the square root of the count. Anything
+        # sparser than that (scattered points, a few far apart pieces) gets bigger cells until they hold a few each.
+        self._cell_size = max(diagonal / math.sqrt(self.count), EPSILON)
+        for _ in range(GRID_PASSES):
+            self._cells = {}
+            for index, point in enumerate(self._points):
+                self._cells.setdefault(self._cell(point), []).append(index)
+            if self.count < CELL_POINTS * len(self._cells):
+                self._cell_size *= 2.0
+            else:
+                break
+        self._bounds = (self._cell(lower), self._cell(upper))
+        if np is not None:
+            self._sort_cells()
+
+    def query(self, points, neighbours=1):
+        '''
+        Finds the neighbours nearest positions to each of points.
+        :param points: flat x, y, z values.
+        :param neighbours:
+        :return: (distances, ids), a row of neighbours values per point, nearest first. Arrays with NumPy, lists of
+         lists otherwise.
+        '''
+        neighbours = max(1, min(neighbours, self.count))
+        if self._tree is not None:
+            distances, indices = self._tree.query(np.asarray(points, dtype=np.float64).reshape(-1, 3), k=neighbours)
+            if neighbours == 1:
+                distances, indices = distances[:, None], indices[:, None]
+            return distances, self._ids[indices]
+        if np is not None:
+            points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+            distances = np.zeros((len(points), neighbours))
+            indices = np.zeros((len(points), neighbours), dtype=np.int64)
+            for start in range(0, len(points), QUERY_BLOCK):
+                stop = min(start + QUERY_BLOCK, len(points))
+                distances[start:stop], indices[start:stop] = self._query_block(points[start:stop], neighbours)
+            return distances, self._ids[indices]
+        distances = []
+        ids = []
+        for i in range(0, len(points), 3):
+            found = self._query_grid(tuple(points[i:i + 3]), neighbours)
+            distances.append([x[0] for x in found])
+            ids.append([self.ids[x[1]] for x in found])
+        return distances, ids
+
+    def _cell(self, point):
+        return tuple([int(math.floor(x / self._cell_size)) for x in point])
+
+    def _sort_cells(self):
+        '''
+        Lays the points out sorted by cell for _query_block, with the key, first point and point count of every
+        occupied cell.
+        :return:
+        '''
+        lower, upper = np.array(self._bounds[0]), np.array(self._bounds[1])
+        size = upper - lower + 1
+        self._strides = np.array([size[1] * size[2], size[2], 1], dtype=np.int64)
+        points = np.array(self._points)
+        keys = ((np.floor(points / self._cell_size).astype(np.int64) - lower) * self._strides).sum(axis=1)
+        self._order = np.argsort(keys, kind='mergesort')
+        self._sorted_points = points[self._order]
+        self._keys, self._starts, self._counts = np.unique(keys[self._order], return_index=True, return_counts=True)
+
+    def _query_block(self, points, neighbours):
+        '''
+        Answers a block of queries at once from the cells next to each point (see _ring), falling back to
+        _query_grid for the points that can't be answered from those cells alone. Blocks with more candidates than
+        CANDIDATE_BUDGET are split.
+        :param points: (n, 3) array
+        :param neighbours:
+        :return: (distances, point indices) arrays, a row per point.
+        '''
+        lower, upper = np.array(self._bounds[0]), np.array(self._bounds[1])
+        cells = np.floor(points / self._cell_size).astype(np.int64)
+        owners = []
+        starts = []
+        counts = []
+        for offset in _OFFSETS:
+            cell = cells + offset
+            inside = ((cell >= lower) & (cell <= upper)).all(axis=1)
+            keys = ((np.clip(cell, lower, upper) - lower) * self._strides).sum(axis=1)
+            found = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+            hit = np.flatnonzero(inside & (self._keys[found] == keys))
+            owners.append(hit)
+            starts.append(self._starts[found[hit]])
+            counts.append(self._counts[found[hit]])
+        owners, starts, counts = np.concatenate(owners), np.concatenate(starts), np.concatenate(counts)
+        total = int(counts.sum())
+        if total > CANDIDATE_BUDGET and len(points) > 1:
+            half = len(points) // 2
+            first = self._query_block(points[:half], neighbours)
+            second = self._query_block(points[half:], neighbours)
+            return np.concatenate([first[0], second[0]]), np.concatenate([first[1], second[1]])
+        # Every point of every cell next to each query, as flat (query, sorted point) pairs.
+        candidates = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+        owners = np.repeat(owners, counts)
+        distances = np.sqrt(((self._sorted_points[candidates] - points[owners]) ** 2).sum(axis=1))
+        order = np.lexsort((distances, owners))
+        owners, distances, candidates = owners[order], distances[order], candidates[order]
+        first = np.searchsorted(owners, np.arange(len(points)))
+        found = np.bincount(owners, minlength=len(points))
+        result = np.full((len(points), neighbours), np.inf)
+        indices = np.zeros((len(points), neighbours), dtype=np.int64)
+        for column in range(neighbours):
+            rows = np.flatnonzero(found > column)
+            result[rows, column] = distances[first[rows] + column]
+            indices[rows, column] = self._order[candidates[first[rows] + column]]
+        # Anything outside the cells searched is at least a cell away.
+        for row in np.flatnonzero(~(result[:, -1] <= self._cell_size)):
+            found = self._query_grid(tuple(points[row]), neighbours)
+            result[row] = [x[0] for x in found]
+            indices[row] = [x[1] for x in found]
+        return result, indices
+
+    def _query_grid(self, point, neighbours):
+        '''
+        Searches rings of cells around point until the neighbours nearest found are closer than anything in a cell
+        not searched yet.
+        :param point:
+        :param neighbours:
+        :return: [(distance, index), ...] nearest first.
+        '''
+        centre = self._cell(point)
+        lower, upper = self._bounds
+        # Rings closer than the occupied cells are empty, and past the farthest occupied cell there is nothing left.
+        ring = max([max(low - x, x - high, 0) for x, low, high in zip(centre, lower, upper)])
+        last = max([max(x - low, high - x) for x, low, high in zip(centre, lower, upper)])
+        x, y, z = point
+        cells = self._cells
+        points = self._points
+        # Squared distances until the end.
+        found = []
+        while True:
+            for cell in _ring(centre, ring, lower, upper):
+                members = cells.get(cell)
+                if members:
+                    found.extend([((points[i][0] - x) ** 2 + (points[i][1] - y) ** 2 + (points[i][2] - z) ** 2, i)
+                                  for i in members])
+            found.sort()
+            del found[neighbours:]
+            # Everything outside the searched cells is at least ring cells away.
+            reach = ring * self._cell_size
+            if (len(found) == neighbours and found[-1][0] <= reach * reach) or ring >= last:
+                return [(math.sqrt(distance), i) for distance, i in found]
+            ring += 1
+
+
+_OFFSETS = [(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)]
+
+
+def _ring(centre, ring, lower, upper):
+    '''
+    Yields the cells on the surface of the cube ring cells out from centre that lie between the lower and upper cells.
+    :param centre:
+    :param ring:
+    :param lower:
+    :param upper:
+    :return:
+    '''
+    spans = [range(max(c - ring, low), min(c + ring, high) + 1) for c, low, high in zip(centre, lower, upper)]
+    for x in spans[0]:
+        x_edge = abs(x - centre[0]) == ring
+        for y in spans[1]:
+            if x_edge or abs(y - centre[1]) == ring:
+                for z in spans[2]:
+                    yield x, y, z
+            else:
+                for z in (centre[2] - ring, centre[2] + ring):
+                    if lower[2] <= z <= upper[2]:
+                        yield x, y, z
+
+
+def get_index(path, loader):
+    '''
+    Returns the spatial index of the positions in the file at path, building it with loader if it hasn't been built
+    since the file last changed.
+    :param path:
+    :param loader: called with path, returns (ids, flat positions).
+    :return:
+    '''
+    stat = bundle_utils.stat(path)
+    key = (path, stat.st_mtime, stat.st_size)
+    index = _index_cache.pop(key, None)
+    if index is None:
+        index = SpatialIndex(*loader(path))
+    _index_cache[key] = index
+    while len(_index_cache) > INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+    return index
+
+
+def clear_index_cache():
+    _index_cache.clear()
+
+
+def inverse_distance(distances, power=2.0):
+    '''
+    Turns rows of neighbour distances into blend weights that sum to one. A neighbour at the same position takes all
+    the weight.
+    :param distances:
+    :param power:
+    :return:
+    '''
+    if np is not None:
+        distances = np.asarray(distances, dtype=np.float64)
+        exact = distances < EPSILON
+        blend = 1.0 / np.maximum(distances, EPSILON) ** power
+        hits = exact.any(axis=1)
+        blend[hits] = exact[hits]
+        return blend / blend.sum(axis=1)[:, None]
+    rows = []
+    for row in distances:
+        if min(row) < EPSILON:
+            blend = [1.0 if x < EPSILON else 0.0 for x in row]
+        else:
+            blend = [1.0 / x ** power for x in row]
+        total = sum(blend)
+        rows.append([x / total for x in blend])
+    return rows
+
+
+def transfer(index, matrix, points, neighbours=1, power=2.0):
+    '''
+    Transfers a weight matrix from the positions in index onto points, blending the neighbours nearest to each point
+    by inverse distance. With one neighbour this is a plain nearest vertex copy.
+    :param index: a SpatialIndex
+    :param matrix: weight matrix with a row per vertex id of the indexed positions.
+    :param points: flat x, y, z values of the vertices to transfer onto.
+    :param neighbours:
+    :param power:
+    :return: weight matrix with a row per point.
+    '''
+    point_count = len(points) // 3
+    if np is not None and isinstance(matrix, np.ndarray):
+        result = np.zeros((point_count, matrix.shape[1]))
+        for start in range(0, point_count, BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, point_count)
+            distances, ids = index.query(points[start * 3:stop * 3], neighbours)
+            blend = inverse_distance(distances, power)
+            result[start:stop] = (matrix[np.asarray(ids)] * blend[:, :, None]).sum(axis=1)
+        return result
+    distances, ids = index.query(points, neighbours)
+    result = []
+    for row_ids, blend in zip(ids, inverse_distance(distances, power)):
+        row = [0.0] * len(matrix[0]) if len(matrix) else []
+        for vertex, amount in zip(row_ids, blend):
+            if amount:
+                for layer, value in enumerate(matrix[vertex]):
+                    row[layer] += value * amount
+        result.append(row)
+    return result
@@ -3,8 +3,25 @@ import maya.mel as mel
 import xml.etree.ElementTree as et
 import os
 import getpass
+import multiprocessing
+import shutil
 import sys
+import tempfile
 from timeit import default_timer as timer
+from utils import xml_utils
+from utils import binary_utils
+from utils import bundle_utils
+from utils import compress_utils
+from utils import delta_utils
+from utils import export_utils
+from utils import import_utils
+from utils import index_utils
+from utils import manifest_utils
+from utils import math_utils
+from utils import remap_utils
+from utils import skin_utils
+from utils import trace_utils
+from utils import transfer_utils
 
 '''
 A weight export/import tool inspired by some of the work I did while at Telltale Games. I found the tool useful enough
@@ -30,6 +47,128 @@ class WeightTools:
             self.platform = 'darwin'
         else:
             cmds.error('Platform not supported.')
+        # mayapy and maya.standalone have no UI, so there are no progress bars or wait cursors to drive.
+        self.headless = bool(cmds.about(batch=True))
+        # Set while an operation runs a step at a time in the background (see async_utils). Artists carry on working
+        # meanwhile, so the main progress bar and wait cursor are left alone.
+        self.background = False
+        # Timing spans for each stage and mesh, off until self.tracer.start() (see trace_utils).
+        self.tracer = trace_utils.Tracer()
+        self.resolver = skin_utils.SkinResolver(self.tracer)
+        # Seconds each operation spent finding skinClusters, keyed by method name.
+        self.resolve_times = {}
+        # The remap plan the last import used, with whatever it learned along the way (see remap_utils).
+        self.remap_plan = None
+
+    def main_progress_bar(self):
+        '''
+        Returns Maya's main progress bar, or None when running headless or in the background.
+        :return:
+        '''
+        if self.headless or self.background:
+            return None
+        return mel.eval('$tmp = $gMainProgressBar')
+
+    def progress_bar(self, progress_bar, **kwargs):
+        '''
+        cmds.progressBar that does nothing (and is never cancelled) without a progress bar.
+        :param progress_bar:
+        :param kwargs:
+        :return:
+        '''
+        if progress_bar is None:
+            return False
+        return cmds.progressBar(progress_bar, **kwargs)
+
+    def wait_cursor(self, **kwargs):
+        '''
+        cmds.waitCursor, skipped when running headless or in the background.
+        :param kwargs:
+        :return:
+        '''
+        if not self.headless and not self.background:
+            cmds.waitCursor(**kwargs)
+
+    def run_steps(self, steps):
+        '''
+        Runs a generator of steps (see async_utils) to the end on the calling thread.
+        :param steps:
+        :return: the result of its 'finished' event, None if it stopped without one.
+        '''
+        result = None
+        for event in steps:
+            if event.get('state') == 'finished':
+                result = event['result']
+        return result
+
+    def reset_resolver(self):
+        '''
+        Starts a fresh skinCluster lookup for an operation, so anything changed in the scene since the last one is
+        picked up. Lookups made through it are mapped in one pass and remembered (see skin_utils.SkinResolver).
+        :return:
+        '''
+        self.resolver = skin_utils.SkinResolver(self.tracer)
+        return self.resolver
+
+    def weight_index(self, path):
+        '''
+        Returns what import and bind look weights files up in: the table of contents of a bundle (see bundle_utils),
+        or the saved index of a weights root (see index_utils).
+        :param path:
+        :return:
+        '''
+        try:
+            return self.read_index(path)
+        except (IOError, OSError, ValueError) as e:
+            if not bundle_utils.is_bundle(path):
+                raise
+            cmds.error('Could not read %s: %s' % (path, e))
+
+    def read_index(self, path):
+        '''
+        weight_index without the error dialog. Doesn't call Maya, so it is safe to run on a worker thread.
+        :param path:
+        :return:
+        '''
+        with self.tracer.span('index_weights', root=path):
+            if bundle_utils.is_bundle(path):
+                return bundle_utils.read_toc(path)
+            return index_utils.WeightIndex(path)
+
+    def index_steps(self, path):
+        '''
+        weight_index as a generator of steps, see export_steps. In the background listing the weights root, which
+        takes a while for a big one on a network drive, is done on a worker thread and waited on as a step of its
+        own. Ends with {'state': 'finished', 'result': the index}.
+        :param path:
+        :return:
+        '''
+        if not self.background:
+            yield {'state': 'finished', 'result': self.weight_index(path)}
+            return
+        index = error = None
+        pending = import_utils.prefetch_async([path], self.read_index, lookahead=1, workers=1)
+        try:
+            for _, async_result in pending:
+                yield {'state': 'reading', 'path': path, 'wait': async_result}
+                index, error = async_result.get()
+        finally:
+            pending.close()
+        if error is not None:
+            if bundle_utils.is_bundle(path) and isinstance(error, (IOError, OSError, ValueError)):
+                cmds.error('Could not read %s: %s' % (path, error))
+            raise error
+        yield {'state': 'finished', 'result': index}
+
+    @trace_utils.traced('deformerWeights')
+    def deformer_weights(self, *args, **kwargs):
+        '''
+        cmds.deformerWeights, in a span of its own when tracing.
+        :param args:
+        :param kwargs:
+        :return:
+        '''
+        return cmds.deformerWeights(*args, **kwargs)
 
     def prune_weights(self, select_only=False):
         '''
@@ -54,14 +193,14 @@ class WeightTools:
             limit = cmds.promptDialog(query=True, text=True)
         else:
             cmds.warning('User Aborted')
-            cmds.waitCursor(st=False)
+            self.wait_cursor(st=False)
             return
-        cmds.waitCursor(st=True)
+        self.wait_cursor(st=True)
         unclean_meshes = self.check_for_vert_influences(int(limit), *sel)[1]
         if not select_only:
             if len(unclean_meshes) == 0:
                 cmds.warning('All Meshes Clean.')
-                cmds.waitCursor(st=False)
+                self.wait_cursor(st=False)
                 return
             self.prune_over_influenced_verts(int(limit), *unclean_meshes)
         else:
@@ -69,53 +208,69 @@ class WeightTools:
                 cmds.warning('All Meshes Clean')
             else:
                 cmds.select(unclean_meshes, r=True)
-        cmds.waitCursor(st=False)
+        self.wait_cursor(st=False)
 
     def check_for_vert_influences(self, limit, *items):
         '''
         Check for vertices with more than int:limit influences.
         :param limit:
         :param items:
-        :return:
+        :return: [clean meshes, unclean meshes]
+        '''
+        report = self.audit_vert_influences(limit, *items)
+        if report is None:
+            return
+        clean_meshes = [x for x in report if len(report[x]['vertices']) == 0]
+        unclean_meshes = [x for x in report if len(report[x]['vertices']) > 0]
+        return [clean_meshes, unclean_meshes]
+
+    @trace_utils.traced()
+    def audit_vert_influences(self, limit, *items):
+        '''
+        Counts the influences on every vertex of items. Each skinCluster is read with one bulk call and counted as an
+        array instead of querying vertices one by one.
+        :param limit:
+        :param items:
+        :return: {item: {'max': highest influence count, 'vertices': [ids of vertices over limit]}}
         '''
-        unclean_meshes = []
-        clean_meshes = []
         if type(limit) is not int:
             cmds.error('Please give type:int for argument: limit.')
         # Initialize Progress bar.
         if len(items) != 0:
-            g_main_progress_bar = mel.eval('$tmp = $g_main_progress_bar')
-            cmds.progressBar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
-                             status='Starting up ...', minValue=0, maxValue=len(items))
+            report = {}
+            resolver = self.reset_resolver()
+            g_main_progress_bar = self.main_progress_bar()
+            self.progress_bar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
+                              status='Starting up ...', minValue=0, maxValue=len(items))
             for item in items:
-                if cmds.progressBar(g_main_progress_bar, query=True, isCancelled=True):
+                if self.progress_bar(g_main_progress_bar, query=True, isCancelled=True):
                     break
-                cmds.progressBar(g_main_progress_bar, edit=True, status='Checking %s' % item)
+                self.progress_bar(g_main_progress_bar, edit=True, status='Checking %s' % item)
                 shapes = cmds.listRelatives(item, c=True, f=True, type='shape')
                 if shapes is None:
                     continue
-                shapes = list(set(shapes))
-                for shape in shapes:
-                    deformer = cmds.listConnections(shape, type='skinCluster')
-                    if deformer is not None:
-                        vtx_array = cmds.polyEvaluate(item, v=True)
-                        if type(vtx_array) is int:
-                            for vtx in range(vtx_array):
-                                weights = cmds.getAttr('%s.wl[%s].weights' % (deformer[0], str(vtx)))[0]
-                                weights = filter(lambda x: x != 0.0, weights)
-                                if len(weights) > limit:
-                                    unclean_meshes.append(item)
-                                else:
-                                    clean_meshes.append(item)
-                        else:
-                            cmds.warning('%s is not a poly object' % item)
-                cmds.progressBar(g_main_progress_bar, edit=True, step=1)
-            cmds.progressBar(g_main_progress_bar, edit=True, endProgress=True)
-            return [list(set(clean_meshes)), list(set(unclean_meshes))]
+                if type(cmds.polyEvaluate(item, v=True)) is not int:
+                    cmds.warning('%s is not a poly object' % item)
+                    self.progress_bar(g_main_progress_bar, edit=True, step=1)
+                    continue
+                for deformer in resolver.find_all(item):
+                    matrix = skin_utils.get_weights(deformer)[0]
+                    max_influences, vertices = math_utils.audit_influences(matrix, limit)
+                    if item in report:
+                        max_influences = max(max_influences, report[item]['max'])
+                        vertices = sorted(set(vertices + report[item]['vertices']))
+                    report[item] = {'max': max_influences, 'vertices': vertices}
+                self.progress_bar(g_main_progress_bar, edit=True, step=1)
+            self.progress_bar(g_main_progress_bar, edit=True, endProgress=True)
+            self.resolve_times['audit_vert_influences'] = resolver.seconds
+            return report
 
+    @trace_utils.traced()
     def prune_over_influenced_verts(self, limit=4, *items):
         '''
         Prunes lowest weighted influence from vertex.
+        Each skinCluster is read once, pruned to the top int:limit influences per vertex as an array and written back
+        with one bulk set.
         :param limit:
         :param items:
         :return:
@@ -125,39 +280,30 @@ class WeightTools:
         # Initialize Progress bar.
         items = [x for x in items if cmds.listRelatives(x, c=True, type='shape') is not None]
         if len(items) != 0:
-            g_main_progress_bar = mel.eval('$tmp = $g_main_progress_bar')
-            cmds.progressBar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
-                             status='Starting up ...', minValue=0, maxValue=len(items))
+            resolver = self.reset_resolver()
+            g_main_progress_bar = self.main_progress_bar()
+            self.progress_bar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
+                              status='Starting up ...', minValue=0, maxValue=len(items))
             for item in items:
-                if cmds.progressBar(g_main_progress_bar, query=True, isCancelled=True):
+                if self.progress_bar(g_main_progress_bar, query=True, isCancelled=True):
                     break
-                cmds.progressBar(g_main_progress_bar, edit=True, status='Cleaning %s' % item)
-                shapes = list(set(cmds.listRelatives(item, c=True, f=True, type='shape')))
-                for shape in shapes:
-                    deformer = cmds.listConnections(shape, type='skinCluster')
-                    if deformer is not None:
-                        cmds.skinPercent(deformer[0], shape, prw=0.0)
-                        vtx_array = cmds.polyEvaluate(item, v=True)
-                        for vtx in range(vtx_array):
-                            influence_values = cmds.skinPercent(deformer[0], '%s.vtx[%s]' % (shape, str(vtx)), q=True,
-                                                                value=True)
-                            influences = cmds.skinCluster(deformer[0], q=True, inf=True)
-                            influence_matrix = []
-                            for i in range(len(influences)):
-                                if influence_values[i] > 0:
-                                    influence_matrix.append([influences[i], influence_values[i]])
-                            influence_matrix = sorted(influence_matrix, key=lambda x: float(x[1]))
-                            if (len(influence_matrix) - limit) > 0:
-                                for i in range((len(influence_matrix) - limit)):
-                                    cmds.skinPercent(deformer[0], '%s.vtx[%s]' % (shape, str(vtx)),
-                                                     tv=[(influence_matrix[i][0], 0.0)])
-                cmds.progressBar(g_main_progress_bar, edit=True, step=1)
-            cmds.progressBar(g_main_progress_bar, edit=True, endProgress=True)
+                self.progress_bar(g_main_progress_bar, edit=True, status='Cleaning %s' % item)
+                for deformer in resolver.find_all(item):
+                    matrix = skin_utils.get_weights(deformer)[0]
+                    matrix, vertices = math_utils.prune_matrix(matrix, limit)
+                    if len(vertices) > 0:
+                        with self.tracer.span('set_weights', mesh=item):
+                            skin_utils.set_weights(deformer, matrix, vertices)
+                self.progress_bar(g_main_progress_bar, edit=True, step=1)
+            self.progress_bar(g_main_progress_bar, edit=True, endProgress=True)
+            self.resolve_times['prune_over_influenced_verts'] = resolver.seconds
 
+    @trace_utils.traced()
     def remap_weights(self, source=None, target=None, path=None, write_path=None):
         '''
         Remaps weights from one XML to another based on two lists of equal size.
         If a source and target element are equal (source = ['foo'], target = ['foo']) an empty subelement is created.
+        The file is streamed through utils.xml_utils rather than loaded as a whole tree.
         :param source:
         :param target:
         :param path:
@@ -167,73 +313,94 @@ class WeightTools:
         # Gets the local user temp directory if no path is given.
         if write_path is None:
             write_path = 'C:/Users/%s/AppData/Local/Temp/%s' % (getpass.getuser(), path.rsplit('/', 1)[1])
-        input_xml = et.parse(path)
-        root = input_xml.getroot()
-        layer = 0
-        deformer_location = root.find('.//*[@deformer]')
-        deformer = deformer_location.get('deformer')
-        shape_location = root.find('.//*[@shape]')
-        shape = shape_location.get('shape')
-        # The deformerWeights command looks for the highest index value as an attribute.
-        # We keep an eye out for that as we loop through.
-        highest_index = 0
-        for joint in source:
-            source_index = {}
-            target_index = {}
-            if target[source.index(joint)] is not joint:
-                for weight in root.findall('weights'):
-                    # Here we get the info from the source joint.
-                    if joint == weight.get('source'):
-                        for child in weight:
-                            source_index[int(child.get('index'))] = child.get('value')
-                            if int(child.get('index')) > int(highest_index):
-                                highest_index = child.get('index')
-                    # Here we get info from the target joint.
-                    if target[source.index(joint)] == weight.get('source') and weight.get('size') != '0':
-                        for child in weight:
-                            target_index[int(child.get('index'))] = child.get('value')
-                            if int(child.get('index')) > int(highest_index):
-                                highest_index = child.get('index')
-                    # If the joint doesn't exist in the target list (probably not in the deformer), remove it.
-                    if weight.get('source') not in target and weight.get('source') in source:
-                        root.remove(weight)
-                # Now we loop through the keys that we generated and assign weight values.
-                for element in target_index:
-                    if element not in source_index:
-                        # Append the value if the index doesn't already exist
-                        source_index[element] = target_index[element]
-                    else:
-                        # Get the sum of the values if the is already in the dictionary.
-                        source_index[element] = str(float(source_index[element]) + float(target_index[element]))
-                        # If the sum > than 1, clamp it at one (shouldn't happen but may be needed for Post Normalization)
-                        if source_index[element] > 1:
-                            source_index[element] = 1
-            else:
-                et.SubElement(root, "weights", attrib={"source": joint, "max": "0", "size": "0", "layer": "0",
-                                                       "defaultValue": "0.00", "shape": shape, "deformer": deformer})
-            # loops through target joints
-            for weight in root.findall('.//*[@source="%s"]' % target[source.index(joint)]):
-                # Here we clean out the subelements so they can be added in the correct index order.
-                attrib = {}
-                keys = weight.keys()
-                for attr in keys:
-                    attrib[attr] = weight.get(attr)
-                weight.clear()
-                # Here we set the correct attributes
-                for attr in keys:
-                    weight.set(attr, attrib[attr])
-                # Here we recreate the subelements
-                for element in sorted(source_index.keys()):
-                    et.SubElement(weight, "point", attrib={"index": str(element), "value": str(source_index[element])})
-                weight.set("size", str(len(weight)))
-                weight.set("max", str(highest_index))
-        for weight in root.findall('weights'):
-            weight.set("layer", str(layer))
-            layer += 1
-        output = et.ElementTree(root)
-        output.write(write_path, xml_declaration=True)
-        return write_path
+        # If there is an up to date binary sidecar index the weights from that instead of the XML.
+        index = None
+        binary_path = binary_utils.fresh_sidecar(path)
+        if binary_path is not None:
+            with binary_utils.read_binary(binary_path) as weights:
+                index = weights.remap_index(set(source) | set(target))
+        return xml_utils.remap_xml(source, target, path, write_path, index=index)
+
+    @trace_utils.traced()
+    def remap_in_memory(self, path, source, target, influences, vertex_count):
+        '''
+        Remaps the weights in path the same way remap_weights does, but into a weight matrix for a skinCluster with the
+        given influences and vertex count instead of a new file, ready for skin_utils.set_weights. Vertices are matched
+        by id, like the Index import method. Doesn't call Maya, so it is safe to run on a worker thread.
+        :param path:
+        :param source:
+        :param target:
+        :param influences:
+        :param vertex_count:
+        :return: the matrix, or None if the file doesn't fit the skinCluster vertex for vertex and has to go through
+         remap_weights instead.
+        '''
+        try:
+            joints, columns, file_vertex_count = self.read_columns(path)
+        except (IOError, OSError, ValueError, et.ParseError):
+            return None
+        if file_vertex_count != vertex_count:
+            return None
+        points = math_utils.remap_columns(joints, columns, source, target)
+        return math_utils.from_columns(points, influences, vertex_count)
+
+    @trace_utils.traced()
+    def transfer_weights(self, path, source, target, influences, points, neighbours=1):
+        '''
+        Remaps the weights in path like remap_in_memory, then transfers them onto points by position instead of by
+        vertex id: each point takes the weights of the neighbours nearest exported vertices, blended by inverse
+        distance (see transfer_utils). The spatial index over the file's positions is built once per file.
+        Doesn't call Maya, so it is safe to run on a worker thread.
+        :param path:
+        :param source:
+        :param target:
+        :param influences:
+        :param points: flat object space x, y, z values of the vertices to transfer onto.
+        :param neighbours:
+        :return: weight matrix with a row per point, or None if the file has no shape positions or weights on joints
+         that aren't influences.
+        '''
+        try:
+            index = transfer_utils.get_index(path, self.read_positions)
+            if index.count == 0:
+                return None
+            joints, columns, vertex_count = self.read_columns(path)
+        except (IOError, OSError, ValueError, et.ParseError):
+            return None
+        columns = math_utils.remap_columns(joints, columns, source, target)
+        matrix = math_utils.from_columns(columns, influences, max(vertex_count or 0, max(index.ids) + 1))
+        if matrix is None:
+            return None
+        return transfer_utils.transfer(index, matrix, points, neighbours)
 
+    @trace_utils.traced()
+    def read_positions(self, path):
+        '''
+        Reads the shape positions of a weights file, from its binary sidecar if there is an up to date one.
+        :param path:
+        :return: see xml_utils.read_positions
+        '''
+        binary_path = binary_utils.fresh_sidecar(path)
+        if binary_path is not None:
+            with binary_utils.read_binary(binary_path) as weights:
+                return weights.positions()
+        return xml_utils.read_positions(path)
+
+    @trace_utils.traced()
+    def read_columns(self, path):
+        '''
+        Reads every influence of a weights file, from its binary sidecar if there is an up to date one.
+        :param path:
+        :return: see xml_utils.read_columns
+        '''
+        binary_path = binary_utils.fresh_sidecar(path)
+        if binary_path is not None:
+            with binary_utils.read_binary(binary_path) as weights:
+                return (list(weights.joints), [weights.column(x) for x in range(len(weights.joints))],
+                        weights.vertex_count())
+        return xml_utils.read_columns(path)
+
+    @trace_utils.traced()
     def check_weights(self, deformer=None, path=None):
         '''
         Checks deformers against XML files to find incompatibilities
@@ -241,12 +408,18 @@ class WeightTools:
         :param path:
         :return:
         '''
-        input_xml = et.parse(path)
-        root = input_xml.getroot()
-        joints = []
-        # Here we get the names of the joints in the file.
-        for weight in root.findall('weights'):
-            joints.append(weight.get('source'))
+        binary_path = binary_utils.fresh_sidecar(path)
+        member = bundle_utils.split_member(path)
+        if binary_path is not None:
+            # The binary sidecar keeps the joint list in its header.
+            with binary_utils.read_binary(binary_path) as weights:
+                joints = list(weights.joints)
+        elif member is not None:
+            # So does the table of contents of a bundle.
+            joints = bundle_utils.read_toc(member[0]).joints(member[1])
+        else:
+            # Here we get the names of the joints in the file from the weights start tags only.
+            joints = xml_utils.read_joints(path)
         # If a deformer wasn't given just return the joints in the file.
         if deformer is None:
             return joints
@@ -254,19 +427,138 @@ class WeightTools:
         else:
             # Here we get the joints on the current deformer.
             skin_joints = cmds.listConnections(deformer, type='joint')
-            # Here we check to see if there are joints in the file that aren't in the deformer and visa versa.
-            missing_from_skin = [x for x in joints if x not in skin_joints]
-            missing_from_file = [x for x in skin_joints if x not in joints]
-            return [list(set(missing_from_skin)), list(set(missing_from_file))]
+            return self.compare_joints(joints, skin_joints)
 
-    def weight_export(self, path=None, items=None, batch=False):
+    def compare_joints(self, joints, skin_joints):
         '''
-        Export weights to a path. Outputs an XML.
-        :param path :
+        Compares the joints in a file against the joints on a deformer.
+        :param joints:
+        :param skin_joints:
+        :return: [joints missing from the deformer, joints missing from the file]
+        '''
+        # Here we check to see if there are joints in the file that aren't in the deformer and visa versa.
+        missing_from_skin = [x for x in joints if x not in skin_joints]
+        missing_from_file = [x for x in skin_joints if x not in joints]
+        return [list(set(missing_from_skin)), list(set(missing_from_file))]
+
+    @trace_utils.traced()
+    def cache_weights(self, path):
+        '''
+        Writes the binary sidecar for an exported XML so check_weights and remap_weights can skip parsing it.
+        :param path:
+        :return:
+        '''
+        try:
+            return binary_utils.xml_to_binary(path)
+        except (IOError, OSError, et.ParseError):
+            cmds.warning('Could not write binary weights for %s' % path)
+
+    @trace_utils.traced()
+    def finish_export(self, path, compress=False):
+        '''
+        Follows up a deformerWeights export, either compressing the XML it wrote or writing its binary sidecar, and
+        removes any file an earlier export of the mesh left in the other format.
+        :param path: the XML deformerWeights wrote.
+        :param compress:
+        :return: path of the weights file.
+        '''
+        if compress:
+            try:
+                path = compress_utils.compress_file(path)
+            except (IOError, OSError):
+                cmds.warning('Could not compress %s' % path)
+        else:
+            self.cache_weights(path)
+        export_utils.discard_stale(path)
+        return path
+
+    @trace_utils.traced()
+    def export_file(self, deformer, path, compress=False, sparse=None, results=None):
+        '''
+        Exports one deformer to the XML path with deformerWeights, or through export_utils when its weights are
+        sparsified (deformerWeights can only write what is on the skinCluster).
+        :param deformer:
+        :param path:
+        :param compress: see weight_export
+        :param sparse: (threshold, max influences) or None, see export_utils.sparsify
+        :param results: list the export_utils result is appended to, for report_sparse.
+        :return: path of the weights file, or None if it couldn't be written.
+        '''
+        if sparse is None:
+            self.deformer_weights(path.rsplit('/', 1)[1], p=path.rsplit('/', 1)[0], ex=True, vc=True,
+                                  deformer=deformer)
+            return self.finish_export(path, compress)
+        if compress:
+            path = compress_utils.compressed_path(path)
+        result = export_utils.write_job(export_utils.make_job(0, path, skin_utils.get_export_data(deformer),
+                                                              sparse=sparse))
+        if results is not None:
+            results.append(result)
+        if result['error'] is not None:
+            cmds.warning('Failed to export %s: %s' % (path, result['error']))
+            return None
+        return path
+
+    def report_sparse(self, results):
+        '''
+        Sums up and prints what sparsifying took out of the files in results (see export_utils.write_job).
+        :param results:
+        :return: {'files', 'points', 'dropped', 'vertices', 'saved': bytes of XML saved, 'size': bytes written}
+        '''
+        report = {'files': 0, 'points': 0, 'dropped': 0, 'vertices': 0, 'saved': 0, 'size': 0}
+        for result in results:
+            if result['error'] is not None or result.get('sparse') is None:
+                continue
+            report['files'] += 1
+            report['size'] += result['size']
+            for key in ('points', 'dropped', 'vertices', 'saved'):
+                report[key] += result['sparse'][key]
+        print ('Sparse export dropped %s of %s weight points (%.1f%%) and renormalized %s vertices in %s files, '
+               'saving %.1f KB of XML.' % (report['dropped'], report['points'],
+                                          100.0 * report['dropped'] / max(1, report['points']), report['vertices'],
+                                          report['files'], report['saved'] / 1024.0))
+        return report
+
+    @trace_utils.traced()
+    def weight_export(self, path=None, items=None, batch=False, parallel=False, workers=None, overwrite=None,
+                      incremental=False, compress=False, threshold=None, max_influences=None):
+        '''
+        Export weights to a path. Outputs an XML plus a binary sidecar (see cache_weights), or a compressed XML.
+        :param path : a path ending in .wbundle exports every item into that one bundle file (see export_bundle).
         :param items:
         :param batch:
-        :return:
+        :param parallel: when exporting more than one object, write the files on a process pool (see export_pipeline).
+        :param workers: number of writer processes for parallel exports, None for one per core.
+        :param overwrite: what to do with files that already exist in a batch. None asks, True overwrites them and
+         False keeps them.
+        :param incremental: skip meshes whose skin data hasn't changed since their file was written, going by the
+         manifest in the export root (see manifest_utils). Changed files are overwritten unless overwrite is False.
+         Not used for bundles.
+        :param compress: write gzip compressed files (foo.xml.gz, see compress_utils) without sidecars. Every reader
+         in the tool takes them as they are. A single file path ending in .gz compresses too.
+        :param threshold: leave weights below this out of the files, renormalizing the vertices that lose weights.
+        :param max_influences: keep at most this many of the highest weights on each vertex, renormalizing too.
+         Sparsified files are written from the skinCluster's weights rather than by deformerWeights, on the main
+         process unless parallel is set. The skinClusters themselves are left alone.
+        :return: {'items': number of items, 'written': paths written, 'unchanged': paths skipped as unchanged,
+         'seconds': total time, 'resolve_seconds': time spent finding skinClusters, 'sparse': see report_sparse,
+         None unless sparsifying}
         '''
+        return self.run_steps(self.export_steps(path, items, batch, parallel, workers, overwrite, incremental, compress,
+                                                threshold, max_influences))
+
+    def export_steps(self, path=None, items=None, batch=False, parallel=False, workers=None, overwrite=None,
+                     incremental=False, compress=False, threshold=None, max_influences=None):
+        '''
+        weight_export as a generator of steps, for running it a step at a time (see async_utils). Takes the same
+        arguments, reports each mesh as it is written and ends with {'state': 'finished', 'result': what
+        weight_export returns}.
+        '''
+        sparse = None
+        if threshold is not None or max_influences is not None:
+            if max_influences is not None and (type(max_influences) is not int or max_influences < 1):
+                cmds.error('Please give a positive type:int for argument: max_influences.')
+            sparse = (float(threshold or 0.0), max_influences)
         # If no items are given look for selected objects.
         if items is None:
             if not batch:
@@ -278,6 +570,11 @@ class WeightTools:
             if type(items) is not []:
                 set(items)
             sel = items
+        if path is not None and bundle_utils.is_bundle(path):
+            for event in self.bundle_steps(path, sel, parallel=parallel, workers=workers, overwrite=overwrite,
+                                           compress=compress, threshold=threshold, max_influences=max_influences):
+                yield event
+            return
         # If no path is given open a GUI
         if path is None:
             if len(sel) == 1:
@@ -303,144 +600,711 @@ class WeightTools:
                 if sel[0].split('|', 2)[1] in path:
                     path = ''
         else:
-            absolute_path = path
+            # Split a given path the same way the dialogs above do.
+            path = path.replace('\\', '/')
+            if len(sel) == 1:
+                absolute_path = path.rsplit('/', 1)[0]
+                path = path.rsplit('/', 1)[1]
+            else:
+                absolute_path = path.rstrip('/') + '/'
+                path = ''
+        if self.background and overwrite is None and not incremental and len(sel) > 1:
+            # Asked once here rather than file by file, nothing is asked once a background job is under way (see
+            # async_utils.Job.start).
+            folder = absolute_path + path
+            if os.path.isdir(folder) and len(os.listdir(folder)) > 0:
+                dialog = cmds.confirmDialog(title='Confirm', message='%s already holds weights, overwrite them?' % (
+                                            folder), button=['Yes', 'No'], defaultButton='Yes', cancelButton='No',
+                                            dismissString='No')
+                overwrite = dialog == 'Yes'
         start_time = timer()
         if len(sel) != 0:
+            resolver = self.reset_resolver()
             # Initialize Progress bar.
-            g_main_progress_bar = mel.eval('$tmp = $gMainProgressBar')
-            cmds.progressBar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
-                             status='Starting up ...', maxValue=len(sel))
-            skip_dialog = False
-            # If there is only one object go this way.
-            if len(sel) == 1:
-                # Get shapes
-                shapes = cmds.listRelatives(sel[0], type='shape', f=True)
-                if shapes is not None:
-                    # Find deformers attached to the shapes
-                    deformer = None
-                    for shape in shapes:
-                        connections = cmds.listHistory(shape)
-                        for item in connections:
-                            if cmds.objectType(item) == 'skinCluster':
-                                deformer = item
-                                break
-                    if deformer is not None:
-                        # If the file already exists confirm overwrite.
-                        if os.path.exists('%s%s.xml' % (absolute_path, path)):
-                            # Check if path is writable.
-                            if os.access('%s%s.xml' % (absolute_path, path), os.W_OK):
-                                # Export weights to XML.
-                                cmds.deformerWeights(path, p=absolute_path, ex=True, vc=True, deformer=deformer)
-                                print 'Writing %s/%s' % (absolute_path, path)
+            g_main_progress_bar = self.main_progress_bar()
+            self.progress_bar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
+                              status='Starting up ...', maxValue=len(sel))
+            manifest = None
+            # Runs even when the generator is closed early, as a cancelled background job is, so the files written
+            # so far are still in the manifest.
+            try:
+                if incremental and overwrite is None:
+                    overwrite = True
+                skip_dialog = overwrite is True
+                written = []
+                unchanged = []
+                results = []
+                if incremental:
+                    manifest = manifest_utils.ExportManifest(absolute_path if len(sel) == 1 else absolute_path + path)
+                # If there is only one object go this way.
+                if len(sel) == 1:
+                    # Get shapes
+                    shapes = cmds.listRelatives(sel[0], type='shape', f=True)
+                    if shapes is not None:
+                        # Find deformers attached to the shapes
+                        deformer = resolver.find(sel[0])
+                        if compress_utils.is_compressed(path):
+                            compress = True
+                            path = compress_utils.plain_path(path)
+                        file_path = '%s/%s' % (absolute_path, path)
+                        if compress:
+                            file_path = compress_utils.compressed_path(file_path)
+                        content_hash = None
+                        if deformer is not None and manifest is not None:
+                            content_hash = skin_utils.content_hash(deformer, sparse)
+                        if content_hash is not None and manifest.unchanged(file_path, content_hash):
+                            unchanged.append(file_path)
+                            print ('Unchanged %s' % file_path)
+                        elif deformer is not None:
+                            # If the file already exists confirm overwrite.
+                            if os.path.exists('%s%s.xml' % (absolute_path, path)):
+                                # Check if path is writable.
+                                if os.access('%s%s.xml' % (absolute_path, path), os.W_OK):
+                                    # Export weights to XML.
+                                    written.append(self.export_file(deformer, '%s/%s' % (absolute_path, path), compress,
+                                                                    sparse, results))
+                                    print ('Writing %s/%s' % (absolute_path, path))
+                                else:
+                                    cmds.warning('%s/%s not writeable. Check Permissions' % (
+                                        absolute_path, path))
+                                    return
                             else:
-                                cmds.warning('%s/%s not writeable. Check Permissions' % (
-                                    absolute_path, path))
-                                return
+                                written.append(self.export_file(deformer, '%s/%s' % (absolute_path, path), compress,
+                                                                sparse, results))
+                                print ('Writing %s%s' % (absolute_path, path))
                         else:
-                            cmds.deformerWeights(path, p=absolute_path, ex=True, vc=True, deformer=deformer)
-                            print 'Writing %s%s' % (absolute_path, path)
+                            cmds.warning('Could not find deformer on %s' % sel[0])
+                        if content_hash is not None and file_path in written:
+                            manifest.record(file_path, content_hash, timer() - start_time)
                     else:
-                        cmds.warning('Could not find deformer on %s' % sel[0])
+                        cmds.warning('Could not find shape under %s' % sel[0])
+                    yield {'state': 'done' if written and written[0] else 'skipped', 'mesh': sel[0],
+                           'path': written[0] if written else None}
+                # Hand the file writing to a process pool. Sparsified files are always written this way, in process
+                # unless parallel.
+                elif parallel or sparse is not None:
+                    for event in self.pipeline_steps(sel, absolute_path + path, g_main_progress_bar,
+                                                     workers=workers if parallel else 1, overwrite=overwrite,
+                                                     manifest=manifest, compress=compress, sparse=sparse):
+                        if event.get('state') == 'finished':
+                            results = event['result']
+                        else:
+                            yield event
+                    written.extend([x['path'] for x in results if x['error'] is None])
+                    unchanged.extend([x['path'] for x in results if x['error'] is None and x.get('unchanged')])
+                    written = [x for x in written if x not in unchanged]
+                # Otherwise go this way.
                 else:
-                    cmds.warning('Could not find shape under %s' % sel[0])
-            # Otherwise go this way.
-            else:
-                for selection in sel:
-                    selection_path = selection[1:].replace('|', '/')
-                    selection_path = selection_path.replace(':', '_')
-                    deformer = None
-                    cmds.waitCursor(st=True)
-                    shapes = cmds.listRelatives(selection, type='shape', f=True)
-                    if cmds.progressBar(g_main_progress_bar, query=True, isCancelled=True):
-                        break
-                    if shapes is not None:
+                    for selection in sel:
+                        selection_path = selection[1:].replace('|', '/')
+                        selection_path = selection_path.replace(':', '_')
+                        deformer = None
+                        count = len(written)
+                        yield {'state': 'writing', 'mesh': selection}
+                        self.wait_cursor(st=True)
                         shapes = cmds.listRelatives(selection, type='shape', f=True)
+                        if self.progress_bar(g_main_progress_bar, query=True, isCancelled=True):
+                            self.wait_cursor(st=False)
+                            break
                         if shapes is not None:
-                            for shape in shapes:
-                                connections = cmds.listHistory(shape)
-                                for item in connections:
-                                    if cmds.objectType(item) == 'skinCluster':
-                                        deformer = item
-                                        break
-                        if deformer is not None:
-                            try:
-                                # If the file already exists confirm overwrite.
-                                if os.path.exists('%s%s%s' % (absolute_path, path, selection_path.rsplit('/', 1)[0])):
-                                    if os.path.exists(
-                                            '%s%s%s.xml' % (absolute_path, path, selection_path)):
-                                        # Check if path is writable.
-                                        if os.access('%s%s%s.xml' % (absolute_path, path, selection_path),
-                                                     os.W_OK):
-                                            pass
+                            mesh_span = self.tracer.begin('export_mesh', mesh=selection)
+                            deformer = resolver.find(selection)
+                            file_path = '%s%s%s.xml' % (absolute_path, path, selection_path)
+                            if compress:
+                                file_path = compress_utils.compressed_path(file_path)
+                            content_hash = None
+                            item_start = timer()
+                            if deformer is not None and manifest is not None:
+                                content_hash = skin_utils.content_hash(deformer)
+                                if manifest.unchanged(file_path, content_hash):
+                                    unchanged.append(file_path)
+                                    print ('Unchanged %s' % file_path)
+                                    deformer = None
+                            if deformer is not None:
+                                try:
+                                    # If the file already exists confirm overwrite.
+                                    if os.path.exists('%s%s%s' % (absolute_path, path,
+                                                                  selection_path.rsplit('/', 1)[0])):
+                                        existing_path = compress_utils.existing(
+                                            '%s%s%s.xml' % (absolute_path, path, selection_path))
+                                        if existing_path is not None:
+                                            # Check if path is writable.
+                                            if os.access(existing_path, os.W_OK):
+                                                pass
+                                            else:
+                                                cmds.warning('%s%s%s not writeable. Check Permissions' % (
+                                                    absolute_path, path, selection[1:].replace('|', '/')))
+                                                yield {'state': 'failed', 'mesh': selection}
+                                                continue
+                                            if overwrite is False:
+                                                print ('Keeping %s%s%s.xml' % (absolute_path, path, selection_path))
+                                            # If we're not skipping the dialog
+                                            elif not skip_dialog:
+                                                dialog = cmds.confirmDialog(
+                                                    title='Confirm',
+                                                    message='../%s%s.xml already exists, overwrite?' %
+                                                            (path, selection_path),
+                                                    button=['Yes(All)', 'Yes', 'No'],
+                                                    defaultButton='Yes',
+                                                    cancelButton='No',
+                                                    dismissString='No')
+                                                if dialog == 'Yes(All)':
+                                                    skip_dialog = True
+                                                if 'Yes' in dialog:
+                                                    self.progress_bar(g_main_progress_bar,
+                                                                      edit=True,
+                                                                      status='Writing %s%s%s' %
+                                                                             (absolute_path, path,
+                                                                              selection_path))
+                                                    self.deformer_weights((selection_path + '.xml'),
+                                                                          p=absolute_path + path,
+                                                                          ex=True, vc=True,
+                                                                          deformer=deformer)
+                                                    written.append(self.finish_export(
+                                                        '%s%s%s.xml' % (absolute_path, path, selection_path), compress))
+                                            # If we are.
+                                            else:
+                                                self.progress_bar(g_main_progress_bar, edit=True, status=(
+                                                        'Writing %s%s%s' % (absolute_path, path, selection_path)))
+                                                self.deformer_weights((selection_path + '.xml'),
+                                                                      p=absolute_path + path, ex=True, vc=True,
+                                                                      deformer=deformer)
+                                                written.append(self.finish_export(
+                                                    '%s%s%s.xml' % (absolute_path, path, selection_path), compress))
                                         else:
-                                            cmds.warning('%s%s%s not writeable. Check Permissions' % (
-                                                absolute_path, path, selection[1:].replace('|', '/')))
-                                            continue
-                                        # If we're not skipping the dialog
-                                        if not skip_dialog:
-                                            dialog = cmds.confirmDialog(title='Confirm',
-                                                                        message='../%s%s.xml already exists, overwrite?' %
-                                                                                (path, selection_path),
-                                                                        button=['Yes(All)', 'Yes', 'No'],
-                                                                        defaultButton='Yes',
-                                                                        cancelButton='No',
-                                                                        dismissString='No')
-                                            if dialog == 'Yes(All)':
-                                                skip_dialog = True
-                                            if 'Yes' in dialog:
-                                                cmds.progressBar(g_main_progress_bar,
-                                                                 edit=True,
-                                                                 status='Writing %s%s%s' %
-                                                                        (absolute_path, path,
-                                                                         selection_path))
-                                                cmds.deformerWeights((selection_path + '.xml'),
-                                                                     p=absolute_path + path,
-                                                                     ex=True, vc=True,
-                                                                     deformer=deformer)
-                                        # If we are.
-                                        else:
-                                            cmds.progressBar(g_main_progress_bar, edit=True, status=(
-                                                    'Writing %s%s%s' % (absolute_path, path, selection_path)))
-                                            cmds.deformerWeights((selection_path + '.xml'),
-                                                                 p=absolute_path + path, ex=True, vc=True,
-                                                                 deformer=deformer)
+                                            self.progress_bar(g_main_progress_bar, edit=True,
+                                                              status=('Writing %s%s%s' % (
+                                                                  absolute_path, path, selection_path)))
+                                            self.deformer_weights(selection_path + '.xml', p=absolute_path + path,
+                                                                  vc=True, ex=True,
+                                                                  deformer=deformer)
+                                            written.append(self.finish_export(
+                                                '%s%s%s.xml' % (absolute_path, path, selection_path), compress))
                                     else:
-                                        cmds.progressBar(g_main_progress_bar, edit=True,
-                                                         status=('Writing %s%s%s' % (
-                                                             absolute_path, path, selection_path)))
-                                        cmds.deformerWeights(selection_path + '.xml', p=absolute_path + path, vc=True,
-                                                             ex=True,
-                                                             deformer=deformer)
-                                else:
-                                    # If the object doesn't have deformers but has children try and make a place for it
-                                    # in the hierarchy.
-                                    try:
-                                        os.makedirs('%s%s%s' % (absolute_path, path, selection_path.rsplit('/', 1)[0]))
-                                    except WindowsError:
-                                        pass
-                                    cmds.progressBar(g_main_progress_bar, edit=True, status=(
-                                            'Writing %s%s%s' % (absolute_path, path, selection_path)))
-                                    cmds.deformerWeights(selection_path + '.xml',
-                                                         p=absolute_path + path,
-                                                         ex=True, vc=True, deformer=deformer)
-                            except (TypeError, ValueError, RuntimeError):
-                                cmds.warning('Failed to export %s' % (selection_path))
-                    # Clean up
-                    cmds.waitCursor(st=False)
-                    cmds.progressBar(g_main_progress_bar, edit=True, step=1)
+                                        # If the object doesn't have deformers but has children try and make a
+                                        # place for it in the hierarchy.
+                                        try:
+                                            os.makedirs('%s%s%s' % (absolute_path, path,
+                                                                    selection_path.rsplit('/', 1)[0]))
+                                        except OSError:
+                                            pass
+                                        self.progress_bar(g_main_progress_bar, edit=True, status=(
+                                                'Writing %s%s%s' % (absolute_path, path, selection_path)))
+                                        self.deformer_weights(selection_path + '.xml',
+                                                              p=absolute_path + path,
+                                                              ex=True, vc=True, deformer=deformer)
+                                        written.append(self.finish_export(
+                                            '%s%s%s.xml' % (absolute_path, path, selection_path), compress))
+                                except (TypeError, ValueError, RuntimeError):
+                                    cmds.warning('Failed to export %s' % (selection_path))
+                                if content_hash is not None and file_path in written:
+                                    manifest.record(file_path, content_hash, timer() - item_start)
+                            self.tracer.end(mesh_span, path=file_path)
+                        # Clean up
+                        self.wait_cursor(st=False)
+                        self.progress_bar(g_main_progress_bar, edit=True, step=1)
+                        yield {'state': 'done' if len(written) > count else 'skipped', 'mesh': selection,
+                               'path': written[-1] if len(written) > count else None}
+            finally:
+                self.wait_cursor(st=False)
+                if manifest is not None:
+                    try:
+                        manifest.save()
+                    except (IOError, OSError):
+                        cmds.warning('Could not write the export manifest %s' % manifest.path)
+                self.progress_bar(g_main_progress_bar, edit=True, endProgress=True)
             end_time = timer()
-            cmds.progressBar(g_main_progress_bar, edit=True, endProgress=True)
-            print ('Exported %s weights in %s seconds.' % (len(sel), end_time - start_time))
+            self.resolve_times['weight_export'] = resolver.seconds
+            print ('Exported %s weights in %s seconds (%.3f finding skinClusters).' % (len(sel), end_time - start_time,
+                                                                                     resolver.seconds))
+            report = self.report_sparse(results) if sparse is not None else None
+            written = [x for x in written if x is not None]
+            yield {'state': 'finished', 'result': {'items': len(sel), 'written': written, 'unchanged': unchanged,
+                                                   'seconds': end_time - start_time,
+                                                   'resolve_seconds': resolver.seconds, 'sparse': report}}
+
+    @trace_utils.traced()
+    def export_bundle(self, path, items, parallel=False, workers=None, overwrite=None, compress=False, threshold=None,
+                      max_influences=None):
+        '''
+        Exports items into one bundle file (see bundle_utils) instead of a folder tree. The files are written to a
+        local scratch folder the usual way, then packed into the bundle in one go, so the folder holding the bundle
+        sees a single file. Items already in an existing bundle are replaced and the rest of it is kept.
+        :param path: the .wbundle file.
+        :param items:
+        :param parallel: see weight_export
+        :param workers:
+        :param overwrite: what to do with items already in the bundle. None asks, True replaces them and False keeps
+         them.
+        :param compress: store the files compressed inside the bundle.
+        :param threshold:
+        :param max_influences:
+        :return: see weight_export, 'written' holding member paths, plus 'bundle': path
+        '''
+        return self.run_steps(self.bundle_steps(path, items, parallel, workers, overwrite, compress, threshold,
+                                                max_influences))
+
+    def bundle_steps(self, path, items, parallel=False, workers=None, overwrite=None, compress=False, threshold=None,
+                     max_influences=None):
+        '''
+        export_bundle as a generator of steps, see export_steps. Packing the bundle is one step of its own.
+        '''
+        path = path.replace('\\', '/')
+        entries = {}
+        if os.path.exists(path):
+            try:
+                entries = bundle_utils.read_toc(path).entries
+            except (IOError, OSError, ValueError) as e:
+                cmds.error('Could not read %s: %s' % (path, e))
+            if not os.access(path, os.W_OK):
+                cmds.error('%s not writeable. Check Permissions' % path)
+        if overwrite is None and any([x in entries for x in items]):
+            dialog = cmds.confirmDialog(title='Confirm', message='Some meshes are already in %s, replace them?' % path,
+                                        button=['Yes', 'No'], defaultButton='Yes', cancelButton='No',
+                                        dismissString='No')
+            overwrite = dialog == 'Yes'
+        if overwrite is False:
+            for item in [x for x in items if x in entries]:
+                print ('Keeping %s in %s' % (item, path))
+                yield {'state': 'skipped', 'mesh': item, 'path': path}
+            items = [x for x in items if x not in entries]
+        temp_dir = tempfile.mkdtemp(prefix='weight_bundle_')
+        result = {'items': len(items), 'written': [], 'unchanged': [], 'seconds': 0.0, 'resolve_seconds': 0.0,
+                  'sparse': None}
+        steps = None
+        try:
+            names = dict([(x, x[1:].replace('|', '/').replace(':', '_') + '.xml') for x in items])
+            if len(items) == 1:
+                # weight_export takes a single item's path as the file to write, in a folder that has to exist.
+                file_path = '%s/%s' % (temp_dir, names[items[0]])
+                if not os.path.isdir(os.path.dirname(file_path)):
+                    os.makedirs(os.path.dirname(file_path))
+                steps = self.export_steps(path=file_path, items=items, overwrite=True, compress=compress,
+                                          threshold=threshold, max_influences=max_influences)
+            else:
+                steps = self.export_steps(path=temp_dir, items=items, parallel=parallel, workers=workers,
+                                          overwrite=True, compress=compress, threshold=threshold,
+                                          max_influences=max_influences)
+            for event in steps if len(items) > 0 else []:
+                if event.get('state') == 'finished':
+                    result = event['result']
+                    continue
+                if event.get('path') and event['path'].startswith(temp_dir):
+                    # Report the member the scratch file becomes.
+                    event = dict(event, path=bundle_utils.member_path(path, event['path'][len(temp_dir) + 1:]))
+                yield event
+            members = {}
+            for dag_path, entry in entries.items():
+                members[dag_path] = (entry['name'], bundle_utils.member_path(path, entry['name']), entry['joints'])
+            written = []
+            for item in items:
+                file_path = compress_utils.existing('%s/%s' % (temp_dir, names[item]))
+                if file_path is None:
+                    continue
+                name = file_path[len(temp_dir) + 1:]
+                members[item] = (name, file_path, self.check_weights(path=file_path))
+                written.append(bundle_utils.member_path(path, name))
+            if len(written) > 0:
+                yield {'state': 'writing', 'path': path}
+                with self.tracer.span('write_bundle', path=path, members=len(members)):
+                    bundle_utils.write_bundle(path, members)
+        finally:
+            # Closed early, the export has to finish up before its scratch folder goes.
+            if steps is not None:
+                steps.close()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        result['written'] = written
+        result['bundle'] = path
+        print ('Wrote %s meshes to %s (%s in the bundle).' % (len(written), path, len(members)))
+        yield {'state': 'finished', 'result': result}
+
+    @trace_utils.traced()
+    def export_pipeline(self, sel, root, progress_bar, workers=None, overwrite=None, manifest=None, compress=False,
+                        sparse=None):
+        '''
+        Batch export that pulls every mesh's weights out of the scene on the main thread, then writes the XML files
+        and their sidecars on a pool of worker processes. The progress bar steps as each file finishes.
+        :param sel:
+        :param root: directory the scene hierarchy is mirrored under.
+        :param progress_bar:
+        :param workers:
+        :param overwrite: see weight_export
+        :param manifest: ExportManifest of root for incremental exports. Unchanged meshes aren't written and come
+         back as results with 'unchanged' set, the others are recorded in it as they finish.
+        :param compress: write compressed files, see weight_export.
+        :param sparse: (threshold, max influences) to sparsify the weights with, see export_utils.sparsify
+        :return: list of results (see export_utils.write_job) in the order they finished.
+        '''
+        return self.run_steps(self.pipeline_steps(sel, root, progress_bar, workers, overwrite, manifest, compress,
+                                                  sparse))
+
+    def pipeline_steps(self, sel, root, progress_bar, workers=None, overwrite=None, manifest=None, compress=False,
+                       sparse=None):
+        '''
+        export_pipeline as a generator of steps, see export_steps. In the background the files are written on a pool
+        of threads that is waited on between steps instead of on the process pool.
+        '''
+        jobs = []
+        hashes = {}
+        meshes = {}
+        unchanged = []
+        skip_dialog = overwrite is True
+        self.progress_bar(progress_bar, edit=True, status='Gathering weights ...')
+        for selection in sel:
+            if self.progress_bar(progress_bar, query=True, isCancelled=True):
+                break
+            yield {'state': 'resolving', 'mesh': selection}
+            selection_path = selection[1:].replace('|', '/').replace(':', '_')
+            shapes = cmds.listRelatives(selection, type='shape', f=True)
+            if shapes is None:
+                self.progress_bar(progress_bar, edit=True, step=1)
+                yield {'state': 'skipped', 'mesh': selection}
+                continue
+            deformer = self.resolver.find(selection)
+            if deformer is None:
+                self.progress_bar(progress_bar, edit=True, step=1)
+                yield {'state': 'skipped', 'mesh': selection}
+                continue
+            file_path = '%s%s.xml' % (root, selection_path)
+            if compress:
+                file_path = compress_utils.compressed_path(file_path)
+            try:
+                with self.tracer.span('get_export_data', mesh=selection):
+                    data = skin_utils.get_export_data(deformer)
+            except RuntimeError:
+                cmds.warning('Failed to export %s' % selection_path)
+                self.progress_bar(progress_bar, edit=True, step=1)
+                yield {'state': 'failed', 'mesh': selection, 'path': file_path}
+                continue
+            if manifest is not None:
+                hashes[file_path] = export_utils.content_hash(data, sparse)
+                if manifest.unchanged(file_path, hashes[file_path]):
+                    print ('Unchanged %s' % file_path)
+                    unchanged.append({'index': None, 'path': file_path, 'error': None, 'size': 0, 'seconds': 0.0,
+                                      'unchanged': True})
+                    self.progress_bar(progress_bar, edit=True, step=1)
+                    yield {'state': 'skipped', 'mesh': selection, 'path': file_path}
+                    continue
+            # If the file already exists, in either format, confirm overwrite.
+            existing_path = compress_utils.existing(file_path)
+            if existing_path is not None:
+                if not os.access(existing_path, os.W_OK):
+                    cmds.warning('%s not writeable. Check Permissions' % file_path)
+                    self.progress_bar(progress_bar, edit=True, step=1)
+                    yield {'state': 'failed', 'mesh': selection, 'path': file_path}
+                    continue
+                if overwrite is False:
+                    print ('Keeping %s' % file_path)
+                    self.progress_bar(progress_bar, edit=True, step=1)
+                    yield {'state': 'skipped', 'mesh': selection, 'path': file_path}
+                    continue
+                if not skip_dialog:
+                    dialog = cmds.confirmDialog(title='Confirm',
+                                                message='../%s.xml already exists, overwrite?' % selection_path,
+                                                button=['Yes(All)', 'Yes', 'No'], defaultButton='Yes',
+                                                cancelButton='No', dismissString='No')
+                    if dialog == 'Yes(All)':
+                        skip_dialog = True
+                    if 'Yes' not in dialog:
+                        self.progress_bar(progress_bar, edit=True, step=1)
+                        yield {'state': 'skipped', 'mesh': selection, 'path': file_path}
+                        continue
+            meshes[file_path] = selection
+            jobs.append(export_utils.make_job(len(jobs), file_path, data, sparse=sparse))
+            yield {'state': 'writing', 'mesh': selection, 'path': file_path}
+        results = []
+        for result in self.write_steps(jobs, workers):
+            if 'wait' in result:
+                yield result
+                continue
+            results.append(result)
+            self.tracer.add('write_job', result['seconds'], path=result['path'], error=result['error'])
+            if result['error'] is not None:
+                cmds.warning('Failed to export %s: %s' % (result['path'], result['error']))
+            else:
+                if manifest is not None:
+                    manifest.record(result['path'], hashes[result['path']], result['seconds'])
+                print ('Wrote %s (%s/%s, job %s) in %.3f seconds.' % (result['path'], len(results), len(jobs),
+                                                                     result['index'], result['seconds']))
+            self.progress_bar(progress_bar, edit=True, step=1,
+                              status='Wrote %s (%s/%s)' % (result['path'], len(results), len(jobs)))
+            yield {'state': 'done' if result['error'] is None else 'failed', 'mesh': meshes[result['path']],
+                   'path': result['path']}
+        yield {'state': 'finished', 'result': unchanged + results}
+
+    def write_steps(self, jobs, workers=None):
+        '''
+        Writes export jobs, yielding each result as it finishes. In the background the jobs go to a pool of threads
+        and a {'wait': async result} comes before each result, so the main thread is never blocked on a write.
+        :param jobs:
+        :param workers:
+        :return:
+        '''
+        if not self.background:
+            for result in export_utils.run_jobs(jobs, workers=workers):
+                yield result
+            return
+        workers = workers or multiprocessing.cpu_count()
+        pending = import_utils.prefetch_async(jobs, export_utils.write_job, lookahead=workers * 2, workers=workers)
+        try:
+            for job, async_result in pending:
+                yield {'wait': async_result}
+                result, error = async_result.get()
+                if error is not None:
+                    result = {'index': job['index'], 'path': job['path'], 'error': str(error), 'size': 0,
+                              'seconds': 0.0}
+                yield result
+        finally:
+            pending.close()
+
+    @trace_utils.traced()
+    def prepare_import(self, task):
+        '''
+        The file side of importing one mesh: reads the joints in the file, compares them with the joints on the
+        deformer (captured on the main thread) and, when the remap plan can answer for every joint that differs,
+        remaps the weights straight away (see remap_for_import). Otherwise the file is just read through so the import
+        doesn't wait on the disk.
+        Doesn't call Maya, so it is safe to run on a worker thread.
+        :param task:
+        :return: {'results': [missing from skin, missing from file], 'mapping': (sources, targets) if the weights were
+         remapped, 'matrix': remapped weight matrix or None, 'remapped': path of the remapped file or None,
+         'inflated': path of a compressed file decompressed for deformerWeights or None}
+        '''
+        results = self.compare_joints(self.check_weights(path=task['path']), task['skin_joints'])
+        prepared = {'results': results, 'mapping': None, 'matrix': None, 'remapped': None, 'inflated': None}
+        mapping = self.plan_mapping(results, task['skin_joints'], task['plan'])
+        if task['points'] is not None:
+            # Nearest goes through the transfer engine, as soon as the plan has an answer for every joint.
+            if mapping is not None:
+                prepared['mapping'] = mapping
+                prepared['matrix'], prepared['remapped'] = self.transfer_for_import(task, mapping[0], mapping[1])
+            return prepared
+        if mapping is not None and (len(results[0]) > 0 or len(results[1]) > 0):
+            prepared['mapping'] = mapping
+            prepared['matrix'], prepared['remapped'] = self.remap_for_import(task['path'], mapping[0], mapping[1],
+                                                                             task['skin_info'], task['temp_dir'])
+        elif task['skin_info'] is not None and len(results[0]) == 0 and (
+                len(task['chunks']) > 1 or compress_utils.is_packed(task['path'])):
+            # Meshes applied in chunks need their weights as a matrix, remapped or not. So do compressed files and
+            # bundle members, which are read straight from the compressed stream or the bundle.
+            prepared['matrix'] = self.remap_in_memory(task['path'], [], [], *task['skin_info'])
+        if prepared['matrix'] is not None or prepared['remapped'] is not None:
+            return prepared
+        if compress_utils.is_packed(task['path']):
+            # Files that go to deformerWeights as they are have to be decompressed or unpacked for it first.
+            if len(results[0]) == 0:
+                prepared['inflated'] = self.inflate_weights(task['path'], task['temp_dir'])
+        else:
+            import_utils.warm_file(task['path'])
+        return prepared
+
+    @trace_utils.traced()
+    def inflate_weights(self, path, temp_dir):
+        '''
+        Decompresses a compressed weights file to a new XML in temp_dir for deformerWeights, which only reads plain
+        XML. Doesn't call Maya.
+        :param path:
+        :param temp_dir:
+        :return: path of the XML.
+        '''
+        return compress_utils.decompress_file(path, import_utils.temp_path(temp_dir, compress_utils.plain_path(path)))
+
+    @trace_utils.traced()
+    def apply_chunked(self, deformer, selection, matrix, chunks, progress_bar=None, status='', normalize=False):
+        '''
+        Writes matrix to deformer one vertex range at a time, running skinPercent -normalize on each range if asked to
+        (weight_import normally normalizes the matrix first). The progress bar steps and cancelling is checked after
+        every range, so a large mesh neither freezes Maya nor has to be waited out.
+        The weights each range replaces are kept, and a cancelled import writes them back, leaving the mesh as it was.
+        This doesn't save memory: the whole matrix is already held, and the replaced weights grow to a second copy by
+        the last range. Only the flat array handed to each API call is one range long.
+        :param deformer:
+        :param selection:
+        :param matrix:
+        :param chunks: (start, stop) vertex ranges, see import_utils.chunk_ranges
+        :param progress_bar:
+        :param status:
+        :param normalize:
+        :return: True if every range was applied, False if it was cancelled and rolled back.
+        '''
+        replaced = []
+        for number, (start, stop) in enumerate(chunks):
+            if self.progress_bar(progress_bar, query=True, isCancelled=True):
+                self.progress_bar(progress_bar, edit=True, status='Restoring %s ...' % selection)
+                for vertices, weights in reversed(replaced):
+                    skin_utils.set_rows(deformer, weights, vertices)
+                return False
+            self.progress_bar(progress_bar, edit=True,
+                              status='%s (vertices %s-%s, %s/%s)' % (status, start, stop - 1, number + 1, len(chunks)))
+            vertices = list(range(start, stop))
+            with self.tracer.span('set_weights', mesh=selection, start=start, stop=stop):
+                replaced.append((vertices, skin_utils.set_rows(deformer, math_utils.flatten(matrix, vertices),
+                                                               vertices, return_old=True)))
+            if normalize:
+                with self.tracer.span('normalize', mesh=selection, start=start, stop=stop):
+                    cmds.skinPercent(deformer, '%s.vtx[%s:%s]' % (selection, start, stop - 1), normalize=True)
+            self.progress_bar(progress_bar, edit=True, step=1)
+        return True
+
+    @trace_utils.traced()
+    def normalize_deformers(self, deformers, tolerance=import_utils.NORMALIZE_TOLERANCE, fix=True):
+        '''
+        Bulk normalization pass: reads all the weights of each deformer in one call and finds the vertices that don't
+        sum to one within tolerance. Only those are normalized and written back, in one call per deformer, so a
+        deformer whose weights are already normalized costs a read and nothing else.
+        :param deformers: (mesh, deformer) pairs, each deformer is looked at once.
+        :param tolerance:
+        :param fix: False to only count the vertices.
+        :return: {mesh: number of vertices that didn't sum to one}
+        '''
+        found = {}
+        done = set()
+        for selection, deformer in deformers:
+            if deformer in done:
+                continue
+            done.add(deformer)
+            matrix = skin_utils.get_weights(deformer)[0]
+            if fix:
+                matrix, vertices = math_utils.normalize_rows(matrix, tolerance)
+                if len(vertices) > 0:
+                    with self.tracer.span('set_weights', mesh=selection):
+                        skin_utils.set_weights(deformer, matrix, vertices)
+            else:
+                vertices = math_utils.unnormalized(matrix, tolerance)
+            if len(vertices) > 0:
+                found[selection] = len(vertices)
+        return found
+
+    @trace_utils.traced()
+    def remap_for_import(self, path, source, target, skin_info, temp_dir):
+        '''
+        Remaps path for an import: in memory if skin_info (see skin_utils.get_skin_info) is given and the file fits it
+        (see remap_in_memory), otherwise to a new file in temp_dir. Doesn't call Maya.
+        :param path:
+        :param source:
+        :param target:
+        :param skin_info:
+        :param temp_dir:
+        :return: (weight matrix or None, path of the remapped file or None)
+        '''
+        if skin_info is not None:
+            matrix = self.remap_in_memory(path, source, target, *skin_info)
+            if matrix is not None:
+                return matrix, None
+        return None, self.remap_weights(source, target, path=path, write_path=import_utils.temp_path(temp_dir, path))
+
+    @trace_utils.traced()
+    def transfer_for_import(self, task, source, target):
+        '''
+        The Nearest counterpart of remap_for_import: transfers the task's file onto the positions of its mesh (see
+        transfer_weights). A file without shape positions is left to deformerWeights, remapped to a new file in the
+        task's temp_dir if it needs remapping. Doesn't call Maya.
+        :param task:
+        :param source:
+        :param target:
+        :return: (weight matrix or None, path of the remapped file or None)
+        '''
+        matrix = self.transfer_weights(task['path'], source, target, task['skin_info'][0], task['points'],
+                                       task['neighbours'])
+        if matrix is not None or len(source) == 0:
+            return matrix, None
+        return self.remap_for_import(task['path'], source, target, None, task['temp_dir'])
 
-    def weight_import(self, path=None, items=None, batch=False, clean_up=True):
+    def plan_mapping(self, results, skin_joints, plan):
+        '''
+        Builds the source and target lists remap_weights takes from the result of compare_joints. Joints missing from
+        the file map to themselves so that deformerWeights is happy, joints missing from the deformer go wherever plan
+        sends them. Doesn't call Maya.
+        :param results:
+        :param skin_joints:
+        :param plan: a remap_utils.RemapPlan
+        :return: (sources, targets), or None if plan has no answer for a joint missing from the deformer.
+        '''
+        sources = list(results[1])
+        targets = list(results[1])
+        available = set(skin_joints)
+        for joint in results[0]:
+            goal = plan.resolve(joint, available)
+            if goal is None:
+                return None
+            sources.append(joint)
+            targets.append(goal)
+        return sources, targets
+
+    def ask_mapping(self, results, skin_joints, plan, interactive=True):
+        '''
+        Like plan_mapping, but asks the user about the joints plan has no answer for. Answers are added to plan so the
+        rest of the batch (and, if the plan is saved, later imports) won't ask again.
+        :param results:
+        :param skin_joints:
+        :param plan:
+        :param interactive: if False nobody is asked and files plan can't answer for are skipped.
+        :return: (sources, targets), or None if the file should be skipped.
+        '''
+        available = set(skin_joints)
+        for item in results[0]:
+            while plan.resolve(item, available) is None:
+                if not interactive:
+                    return None
+                # Gui elements
+                button = cmds.promptDialog(title='%s not found...' % item,
+                                           message='Which joint should inherit the weights?',
+                                           text='Please input a joint', button=['OK', 'Cancel'],
+                                           defaultButton='OK', dismissString='Cancel')
+                if button != 'OK':
+                    return None
+                result = cmds.promptDialog(q=True, text=True)
+                if result in available:
+                    plan.add_rule(item, result)
+                elif result != 'Please input a joint':
+                    cmds.warning('%s is not an influence of the deformer.' % result)
+        return self.plan_mapping(results, skin_joints, plan)
+
+    @trace_utils.traced()
+    def weight_import(self, path=None, items=None, batch=False, clean_up=True, lookahead=4, method=None,
+                      remap_plan=None, interactive=True, chunk_size=import_utils.CHUNK_SIZE, neighbours=1,
+                      normalize='auto', tolerance=import_utils.NORMALIZE_TOLERANCE):
         '''
         Import weights from path, or finding none open a GUI
         :param path:
         :param items:
         :param batch:
         :param clean_up:
-        :return:
+        :param lookahead: how many files are read and prepared ahead of the one being applied (see prepare_import).
+        :param method: Index, Nearest, Over, Barycentric or Bilinear. Asked for if None, Index if not interactive.
+         Nearest is done by transfer_weights when the file has shape positions, the others by deformerWeights.
+        :param remap_plan: a remap_utils.RemapPlan, or the name or path of a saved one, used for joints missing from
+         the deformers. Answers given along the way are added to it, and a named plan is saved at the end.
+        :param interactive: if False no dialogs are shown: files that need an answer the plan doesn't have, or that
+         don't mirror the scene hierarchy, are skipped.
+        :param chunk_size: with the Index and Nearest methods, meshes with more vertices than this are applied a range
+         of vertices at a time (see apply_chunked), so progress shows within the mesh and cancelling restores its
+         weights. Only the mesh being applied is restored: meshes already imported when the import is cancelled keep
+         their new weights.
+        :param neighbours: how many of the nearest exported vertices the Nearest method blends, by inverse distance.
+         One copies the nearest vertex, like deformerWeights does.
+        :param normalize: 'auto' normalizes weights applied from memory before they go in, and checks what
+         deformerWeights imported in one bulk pass per skinCluster after the last mesh, rewriting only the vertices
+         that don't sum to one (see normalize_deformers). 'validate' changes nothing and reports those vertices,
+         'none' skips normalizing and 'skinPercent' runs skinPercent -normalize on every imported mesh.
+        :param tolerance: how far from one a vertex may sum before it counts as not normalized.
+        :return: {'items': number of items, 'imported': items that got weights, 'skipped': number skipped, 'missing':
+         files that couldn't be found or read, 'cancelled': True if the import was cancelled, 'seconds': total time,
+         'resolve_seconds': time spent finding skinClusters, 'normalized': {mesh: vertices normalized by the bulk
+         pass}, 'unnormalized': {mesh: vertices that don't sum to one} with 'validate'}
+        '''
+        return self.run_steps(self.import_steps(path, items, batch, clean_up, lookahead, method, remap_plan,
+                                                interactive, chunk_size, neighbours, normalize, tolerance))
+
+    def import_steps(self, path=None, items=None, batch=False, clean_up=True, lookahead=4, method=None,
+                     remap_plan=None, interactive=True, chunk_size=import_utils.CHUNK_SIZE, neighbours=1,
+                     normalize='auto', tolerance=import_utils.NORMALIZE_TOLERANCE):
         '''
+        weight_import as a generator of steps, see export_steps. Files are read and prepared on worker threads and
+        each one is waited on between steps, so the main thread only resolves and applies.
+        '''
+        if normalize not in import_utils.NORMALIZE_MODES:
+            cmds.error('normalize must be one of %s.' % ', '.join(import_utils.NORMALIZE_MODES))
         # If no items are given look for selected objects.
         if items is None:
             if batch:
@@ -459,7 +1323,7 @@ class WeightTools:
         # If no path is given open a GUI
         if path is None:
             if len(sel) == 1:
-                input_xml = cmds.fileDialog2(ds=2, ff='*.xml', fm=1, okc='Open')
+                input_xml = cmds.fileDialog2(ds=2, ff='Weights (*.xml *.xml.gz *.wbundle)', fm=1, okc='Open')
                 if input_xml is None:
                     cmds.warning('User Canceled')
                     return
@@ -476,192 +1340,315 @@ class WeightTools:
 
         else:
             absolute_path = path
-        if not os.path.exists(absolute_path):
+        if not bundle_utils.exists(absolute_path):
             cmds.error('Specified path not found.')
-        repath_auto = False
+        # Without a user, files that don't mirror the scene hierarchy are skipped rather than guessed.
+        repath_auto = not interactive
+        autopath_result = 'No to All'
         report = []
         skip = 0
+        imported = []
         temp_paths = []
+        cancelled = False
+        # Meshes imported by deformerWeights, normalized or checked together at the end.
+        bulk_check = []
+        unnormalized = {}
         start_time = timer()
         if len(sel) != 0:
             # Select application method.
-            method = cmds.confirmDialog(title='Select Method',
-                                        message='Which method should be used to apply the weights?',
-                                        button=['Index', 'Nearest', 'Over', 'Barycentric', 'Bilinear', 'Cancel'],
-                                        defaultButton='Index',
-                                        cancelButton='Cancel', dismissString='Cancel')
+            if method is not None:
+                method = method.capitalize()
+            elif interactive:
+                method = cmds.confirmDialog(title='Select Method',
+                                            message='Which method should be used to apply the weights?',
+                                            button=['Index', 'Nearest', 'Over', 'Barycentric', 'Bilinear', 'Cancel'],
+                                            defaultButton='Index',
+                                            cancelButton='Cancel', dismissString='Cancel')
+            else:
+                method = 'Index'
             if method == 'Cancel':
                 cmds.error('Aborting Weight Import.')
+            if self.background:
+                # Nothing is asked once a background job is under way (see async_utils.Job.start), so files that would
+                # need an answer are skipped, the way they are without a user.
+                interactive = False
+                repath_auto = True
+            plan = remap_utils.get_plan(remap_plan)
+            self.remap_plan = plan
+            # Remapped files go in a folder of their own so files prepared ahead of time never collide.
+            temp_dir = tempfile.mkdtemp(prefix='weight_import_')
+            resolver = self.reset_resolver()
             # Initialize Progress Bar
             if len(sel) > 1:
                 max_value = len(sel)
             else:
                 max_value = len(sel) + 1
-            g_main_progress_bar = mel.eval('$tmp = $gMainProgressBar')
-            cmds.progressBar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
-                             status='Starting up ...', maxValue=max_value)
-            paths = {}
-            for (dirpath, dirnames, filenames) in os.walk(absolute_path):
-                for file in filenames:
-                    dirpath = dirpath.replace('\\', '/')
-                    if '.xml' in file:
-                        key = '%s/%s/%s' % (dirpath.split('/')[-2], dirpath.split('/')[-1], file)
-                        full_path = '%s/%s' % (dirpath, file)
-                        paths[key] = full_path
-            for selection in sel:
-                cmds.waitCursor(st=True)
-                path_in = None
-                # Find shapes
-                shapes = cmds.listRelatives(selection, type='shape', f=True)
-                if cmds.progressBar(g_main_progress_bar, query=True, isCancelled=True):
-                    break
-                if shapes is not None:
-                    # Find out whether we need to specify and object or not.
-                    if '.xml' in absolute_path:
-                        path_in = '/%s' % absolute_path.rsplit('/', 1)[1]
-                        absolute_path = absolute_path.rsplit('/', 1)[0]
+            g_main_progress_bar = self.main_progress_bar()
+            self.progress_bar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
+                              status='Starting up ...', maxValue=max_value)
+            pending = None
+            # Runs even when the generator is closed early, as a cancelled background job is, so the temp files
+            # still go and the plan still keeps what was learned.
+            try:
+                # The saved index of the weights root only re-lists folders that changed since the last run.
+                for event in self.index_steps(absolute_path):
+                    if event.get('state') == 'finished':
+                        index = event['result']
                     else:
-                        try:
-                            key = '%s/%s/%s.xml' % (
-                                selection.split('|')[-3], selection.split('|')[-2], selection.split('|')[-1])
-                            path = paths[key]
-                            absolute_path = path.rsplit('/', 1)[0]
-                            path_in = '/%s' % path.rsplit('/', 1)[1]
-                        except KeyError:
-                            short_name = selection.split('|')[-1]
-                            for key in paths.keys():
-                                if short_name in key:
-                                    if not repath_auto:
-                                        autopath_result = cmds.confirmDialog(t='Path Not Found',
-                                                                             m='I could not find a file corresponding to:\n\n %s\n\n Would you like to use:\n\n %s?' % (
-                                                                                 selection[1:].replace('|', '/'), key),
-                                                                             button=['Yes', 'Yes to All', 'No',
-                                                                                     'No to All'],
-                                                                             cancelButton='No')
-
-                                    if 'Yes' in autopath_result:
-                                        path = paths[key]
-                                        absolute_path = path.rsplit('/', 1)[0]
-                                        path_in = '/%s' % path.rsplit('/', 1)[1]
-                                        if autopath_result == 'Yes to All':
+                        yield event
+                paths = index.paths()
+                # First work out which file and deformer goes with each selection. This is the part that needs Maya and
+                # may need the user, so it stays on the main thread.
+                tasks = []
+                for selection in sel:
+                    yield {'state': 'resolving', 'mesh': selection}
+                    self.wait_cursor(st=True)
+                    path_in = None
+                    # Find shapes
+                    shapes = cmds.listRelatives(selection, type='shape', f=True)
+                    if self.progress_bar(g_main_progress_bar, query=True, isCancelled=True):
+                        self.wait_cursor(st=False)
+                        break
+                    if shapes is not None:
+                        # Find out whether we need to specify and object or not.
+                        if '.xml' in absolute_path:
+                            path_in = '/%s' % absolute_path.rsplit('/', 1)[1]
+                            absolute_path = absolute_path.rsplit('/', 1)[0]
+                        else:
+                            path = index.lookup(selection)
+                            if path is not None:
+                                absolute_path = path.rsplit('/', 1)[0]
+                                path_in = '/%s' % path.rsplit('/', 1)[1]
+                            else:
+                                short_name = selection.split('|')[-1]
+                                for key in index.candidates(short_name):
+                                    if short_name in key:
+                                        if not repath_auto:
+                                            autopath_result = cmds.confirmDialog(
+                                                t='Path Not Found',
+                                                m='I could not find a file corresponding to:\n\n %s\n\n Would you like to use:\n\n %s?' % (
+                                                    selection[1:].replace('|', '/'), key),
+                                                button=['Yes', 'Yes to All', 'No', 'No to All'],
+                                                cancelButton='No')
+
+                                        if 'Yes' in autopath_result:
+                                            path = paths[key]
+                                            absolute_path = path.rsplit('/', 1)[0]
+                                            path_in = '/%s' % path.rsplit('/', 1)[1]
+                                            if autopath_result == 'Yes to All':
+                                                repath_auto = True
+                                        elif autopath_result == 'No to All':
                                             repath_auto = True
-                                    elif autopath_result == 'No to All':
-                                        repath_auto = True
-                                        break
-                                    else:
-                                        continue
-                    if path_in is None:
-                        skip += 1
-                        continue
-                    if os.path.exists(absolute_path + path_in):
-                        # Check if file is readable
-                        if os.access(absolute_path + path_in, os.R_OK):
-                            pass
+                                            break
+                                        else:
+                                            continue
+                        if path_in is None:
+                            skip += 1
+                            self.progress_bar(g_main_progress_bar, edit=True, step=1)
+                            yield {'state': 'skipped', 'mesh': selection}
+                            continue
+                        if bundle_utils.exists(absolute_path + path_in):
+                            # Check if file is readable
+                            if os.access(bundle_utils.real_path(absolute_path + path_in), os.R_OK):
+                                pass
+                            else:
+                                cmds.warning('%s%s not readable. Check Permissions' % (absolute_path, path_in))
+                                self.wait_cursor(st=False)
+                                self.progress_bar(g_main_progress_bar, edit=True, step=1)
+                                yield {'state': 'failed', 'mesh': selection, 'path': absolute_path + path_in}
+                                continue
                         else:
-                            cmds.warning('%s%s not readable. Check Permissions' % (absolute_path, path_in))
-                            cmds.waitCursor(st=False)
+                            report.append((absolute_path + path_in))
+                            self.wait_cursor(st=False)
+                            self.progress_bar(g_main_progress_bar, edit=True, step=1)
+                            yield {'state': 'failed', 'mesh': selection, 'path': absolute_path + path_in}
+                            continue
+                        # find deformers
+                        deformer = resolver.find(selection)
+                        if deformer is not None:
+                            # Remapped weights can only skip the temp file when they are applied by vertex id, or by
+                            # position through the transfer engine, which also needs the positions to transfer onto.
+                            skin_info = None
+                            points = None
+                            if method in ('Index', 'Nearest'):
+                                skin_info = skin_utils.get_skin_info(deformer)
+                            if method == 'Nearest':
+                                points = skin_utils.get_points(deformer)
+                            # So are large meshes applied in chunks.
+                            chunks = [(0, 0)]
+                            if skin_info is not None and skin_info[1] > chunk_size:
+                                chunks = import_utils.chunk_ranges(skin_info[1], chunk_size)
+                            tasks.append({'selection': selection, 'path': absolute_path + path_in, 'deformer': deformer,
+                                          'skin_joints': cmds.listConnections(deformer, type='joint') or [],
+                                          'skin_info': skin_info, 'points': points, 'neighbours': neighbours,
+                                          'plan': plan, 'temp_dir': temp_dir, 'chunks': chunks})
                             continue
+                        else:
+                            skip += 1
                     else:
-                        report.append((absolute_path + path_in))
-                        cmds.waitCursor(st=False)
+                        skip += 1
+                    self.progress_bar(g_main_progress_bar, edit=True, step=1)
+                    self.wait_cursor(st=False)
+                    yield {'state': 'skipped', 'mesh': selection}
+                # From here the bar counts chunks, one per mesh unless it is applied in chunks.
+                max_value = max(1, sum([len(x['chunks']) for x in tasks]))
+                self.progress_bar(g_main_progress_bar, edit=True, progress=0, maxValue=max_value)
+                # Then read, check and (where no input is needed) remap the upcoming files on worker threads while the
+                # current one is applied. Waiting on them is a step of its own, so in the background Maya gets on with
+                # other things while a file is read.
+                pending = import_utils.prefetch_async(tasks, self.prepare_import, lookahead=lookahead)
+                for task, async_result in pending:
+                    yield {'state': 'reading', 'mesh': task['selection'], 'path': task['path'], 'wait': async_result}
+                    prepared, error = async_result.get()
+                    self.wait_cursor(st=True)
+                    if self.progress_bar(g_main_progress_bar, query=True, isCancelled=True):
+                        cancelled = True
+                        self.wait_cursor(st=False)
+                        break
+                    selection = task['selection']
+                    deformer = task['deformer']
+                    file_path = task['path']
+                    steps = len(task['chunks'])
+                    matrix = None
+                    remapped = None
+                    if error is not None:
+                        cmds.warning('Could not read %s: %s' % (file_path, error))
+                        report.append(file_path)
+                        skip += 1
+                        self.progress_bar(g_main_progress_bar, edit=True, step=steps)
+                        yield {'state': 'failed', 'mesh': selection, 'path': file_path}
                         continue
-                    # find deformers
-                    deformer = None
-                    for shape in shapes:
-                        connections = cmds.listHistory(shape)
-                        for item in connections:
-                            if cmds.objectType(item) == 'skinCluster':
-                                deformer = item
+                    yield {'state': 'applying', 'mesh': selection, 'path': file_path}
+                    mesh_span = self.tracer.begin('import_mesh', mesh=selection, path=file_path)
+                    try:
+                        self.progress_bar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
+                                          status='Checking map ...', maxValue=max_value)
+                        # Check deformer against xml membership.
+                        results = prepared['results']
+                        # Set if the weights were already remapped, or read for a chunked import, on a worker thread.
+                        matrix = prepared['matrix']
+                        if prepared['mapping'] is not None:
+                            # The plan had every answer, so this was already remapped on a worker thread.
+                            remapped = prepared['remapped']
+                        # If there are joints missing from the deformer the plan doesn't know, ask for retargeting.
+                        elif len(results[0]) > 0:
+                            self.progress_bar(g_main_progress_bar, edit=True, beginProgress=True,
+                                              isInterruptable=True,
+                                              status='Remapping weights ...', maxValue=max_value)
+                            mapping = self.ask_mapping(results, task['skin_joints'], plan, interactive)
+                            if mapping is None:
+                                cmds.warning('Skipping %s' % file_path)
+                                skip += 1
+                                self.progress_bar(g_main_progress_bar, edit=True, step=steps)
+                                self.tracer.end(mesh_span)
+                                yield {'state': 'skipped', 'mesh': selection, 'path': file_path}
+                                continue
+                            # Remap the weights in memory, or failing that write a remapped file.
+                            if task['points'] is not None:
+                                matrix, remapped = self.transfer_for_import(task, mapping[0], mapping[1])
+                            else:
+                                matrix, remapped = self.remap_for_import(file_path, mapping[0], mapping[1],
+                                                                         task['skin_info'], temp_dir)
+                        if remapped is not None:
+                            # Update the paths
+                            file_path = remapped
+                            temp_paths.append(file_path)
+                            cmds.warning('New path is %s' % file_path)
+                        if matrix is not None and normalize == 'auto':
+                            # Normalizing the weights before they go in saves a pass over the mesh afterwards.
+                            with self.tracer.span('normalize', mesh=selection):
+                                matrix = math_utils.normalize_rows(matrix)[0]
+                        elif matrix is not None and normalize == 'validate':
+                            count = len(math_utils.unnormalized(matrix, tolerance))
+                            if count > 0:
+                                unnormalized[selection] = count
+                        if matrix is not None and steps > 1:
+                            # Large meshes go in chunks.
+                            if not self.apply_chunked(deformer, selection, matrix, task['chunks'], g_main_progress_bar,
+                                                      status='Applying ' + file_path,
+                                                      normalize=normalize == 'skinPercent'):
+                                cmds.warning('Cancelled importing %s, its weights were restored.' % selection)
+                                cancelled = True
+                                self.wait_cursor(st=False)
                                 break
-                    if deformer is not None:
-                        try:
-                            cmds.progressBar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
-                                             status='Checking map ...', maxValue=max_value)
-                            # Check deformer against xml membership.
-                            results = self.check_weights(deformer, path=absolute_path + path_in)
-                            # Add the joints missing from file to sources and targets so that deformerWeights is happy.
-                            sources = results[1]
-                            targets = [x for x in results[1]]
-                            # If there are joints missing from the deformer launch a gui for retargeting.
-                            if len(results[0]) > 0:
-                                cmds.progressBar(g_main_progress_bar, edit=True, beginProgress=True,
-                                                 isInterruptable=True,
-                                                 status='Remapping weights ...', maxValue=len(sel))
-                                for item in results[0]:
-                                    # Gui elements
-                                    button = cmds.promptDialog(title='%s not found...' % item,
-                                                               message='Which joint should inherit the weights?',
-                                                               text='Please input a joint', button=['OK', 'Cancel'],
-                                                               defaultButton='OK', dismissString='Cancel')
-                                    if button == 'OK':
-                                        result = cmds.promptDialog(q=True, text=True)
-                                        if result == 'Please input a joint':
-                                            results[0].append(item)
-                                            continue
-                                        else:
-                                            sources.append(item)
-                                            targets.append(result)
-                                    else:
-                                        cmds.warning('Skipping %s' % path_in)
-                                        skip += 1
-                                        continue
-                                # Remap the weights and update the paths
-                                path_in = self.remap_weights(sources, targets, path=absolute_path + '/' + path_in)
-                                absolute_path = path_in.rsplit('/', 1)[0]
-                                path_in = '/' + path_in.rsplit('/', 1)[1]
-                                temp_paths.append(absolute_path + path_in)
-                                cmds.warning('New path is %s' % (absolute_path + path_in))
-                            elif len(results[1]) > 0:
-                                cmds.progressBar(g_main_progress_bar, edit=True, beginProgress=True,
-                                                 isInterruptable=True,
-                                                 status='Remapping weights ...', maxValue=max_value)
-                                path_in = self.remap_weights(sources, targets, path=absolute_path + '/' + path_in)
-                                absolute_path = path_in.rsplit('/', 1)[0]
-                                path_in = '/' + path_in.rsplit('/', 1)[1]
-                                temp_paths.append(absolute_path + path_in)
-                                cmds.warning('New path is %s' % (absolute_path + path_in))
-
-                            cmds.progressBar(g_main_progress_bar, edit=True,
-                                             status='Loading ' + (absolute_path + path_in))
+                            steps = 0
+                        elif matrix is not None:
+                            # Apply the remapped weights straight to the skinCluster.
+                            self.progress_bar(g_main_progress_bar, edit=True, status='Applying remapped ' + file_path)
+                            with self.tracer.span('set_weights', mesh=selection):
+                                skin_utils.set_weights(deformer, matrix)
+                        else:
+                            if compress_utils.is_packed(file_path):
+                                file_path = prepared['inflated'] or self.inflate_weights(file_path, temp_dir)
+                                temp_paths.append(file_path)
+                            self.progress_bar(g_main_progress_bar, edit=True, status='Loading ' + file_path)
                             # Import the weights.
-                            if len(sel) == 1:
-                                cmds.deformerWeights(path_in, p=absolute_path, im=True, method=method.lower(),
-                                                     deformer=deformer)
-                            else:
-                                cmds.deformerWeights(path_in, p=absolute_path, im=True, method=method.lower(),
-                                                     deformer=deformer)
-                            # Normalize weights
-                            cmds.skinPercent(deformer, selection, normalize=True)
-                            print 'Imported %s to %s' % (absolute_path + path_in, selection)
-                        except WindowsError:
-                            report.append((absolute_path + path_in))
-                            skip += 1
-                    else:
+                            self.deformer_weights('/' + file_path.rsplit('/', 1)[1], p=file_path.rsplit('/', 1)[0],
+                                                  im=True, method=method.lower(), deformer=deformer)
+                            if normalize in ('auto', 'validate'):
+                                bulk_check.append((selection, deformer))
+                        # Normalize weights
+                        if steps > 0 and normalize == 'skinPercent':
+                            with self.tracer.span('normalize', mesh=selection):
+                                cmds.skinPercent(deformer, selection, normalize=True)
+                        print ('Imported %s to %s' % (file_path, selection))
+                        imported.append(selection)
+                    except (IOError, OSError):
+                        report.append(file_path)
                         skip += 1
-                else:
-                    skip += 1
-                cmds.progressBar(g_main_progress_bar, edit=True, step=1)
-                cmds.waitCursor(st=False)
-            # Clean up
-            temp_paths = list(set(temp_paths))
-            if clean_up:
-                if len(temp_paths) > 0:
+                    self.tracer.end(mesh_span)
+                    self.progress_bar(g_main_progress_bar, edit=True, step=steps)
+                    self.wait_cursor(st=False)
+                    yield {'state': 'done' if imported and imported[-1] == selection else 'failed', 'mesh': selection,
+                           'path': file_path}
+                # One bulk pass over everything deformerWeights imported.
+                normalized = {}
+                if len(bulk_check) > 0:
+                    self.progress_bar(g_main_progress_bar, edit=True, status='Normalizing ...')
+                    found = self.normalize_deformers(bulk_check, tolerance, fix=normalize == 'auto')
+                    if normalize == 'auto':
+                        normalized = found
+                    else:
+                        unnormalized.update(found)
+                for mesh in sorted(unnormalized):
+                    print ('%s has %s vertices whose weights do not sum to one.' % (mesh, unnormalized[mesh]))
+                # Print reports of failures.
+                if len(report) > 0:
+                    for r in report:
+                        print ('Could not find file: ' + r)
+                    cmds.warning('Some weight files could not be found. Check output for details.')
+            finally:
+                if pending is not None:
+                    pending.close()
+                self.wait_cursor(st=False)
+                # Keep what was learned for the next import.
+                if plan.changed and (plan.name or plan.path):
+                    try:
+                        print ('Saved remap plan %s' % remap_utils.save_plan(plan))
+                    except (IOError, OSError) as e:
+                        cmds.warning('Could not save remap plan %s: %s' % (plan.name, e))
+                # Clean up
+                temp_paths = list(set(temp_paths))
+                if clean_up:
                     for path in temp_paths:
                         try:
                             os.remove(path)
-                        except WindowsError:
+                        except (IOError, OSError):
                             print ('Failed to clean up %s' % path)
-            # Print reports of failures.
-            if len(report) > 0:
-                for r in report:
-                    print ('Could not find file: ' + r)
-                cmds.progressBar(g_main_progress_bar, edit=True, endProgress=True)
-                cmds.warning('Some weight files could not be found. Check output for details.')
-            else:
-                cmds.progressBar(g_main_progress_bar, edit=True, endProgress=True)
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                self.progress_bar(g_main_progress_bar, edit=True, endProgress=True)
             end_time = timer()
-            print ('Imported %s weights in %s seconds.' % (len(sel) - skip, end_time - start_time))
+            self.resolve_times['weight_import'] = resolver.seconds
+            print ('Imported %s weights in %s seconds (%.3f finding skinClusters).' % (len(sel) - skip,
+                                                                                     end_time - start_time,
+                                                                                     resolver.seconds))
+            yield {'state': 'finished', 'result': {'items': len(sel), 'imported': imported, 'skipped': skip,
+                                                   'missing': report, 'cancelled': cancelled,
+                                                   'seconds': end_time - start_time,
+                                                   'resolve_seconds': resolver.seconds, 'normalized': normalized,
+                                                   'unnormalized': unnormalized}}
 
+    @trace_utils.traced()
     def bind_from_file(self, path=None, items=None, batch=False):
         '''
         Binds the items in [items] to the joints in file if they exist.
@@ -669,6 +1656,12 @@ class WeightTools:
         :param selection:
         :return:
         '''
+        self.run_steps(self.bind_steps(path, items, batch))
+
+    def bind_steps(self, path=None, items=None, batch=False):
+        '''
+        bind_from_file as a generator of steps, see export_steps.
+        '''
         if items is None:
             if batch:
                 sel = cmds.ls(sl=True, l=True)
@@ -686,7 +1679,7 @@ class WeightTools:
         # If no path is given open a GUI
         if path is None:
             if len(sel) == 1:
-                input_xml = cmds.fileDialog2(ds=2, ff='*.xml', fm=1, okc='Open')
+                input_xml = cmds.fileDialog2(ds=2, ff='Weights (*.xml *.xml.gz *.wbundle)', fm=1, okc='Open')
                 if input_xml is None:
                     cmds.warning('User Canceled')
                     return
@@ -703,7 +1696,7 @@ class WeightTools:
 
         else:
             absolute_path = path
-        if not os.path.exists(absolute_path):
+        if not bundle_utils.exists(absolute_path):
             cmds.error('Specified path not found.')
 
         # Initialize Progress Bar
@@ -711,79 +1704,209 @@ class WeightTools:
             max_value = len(sel)
         else:
             max_value = len(sel) + 1
-        g_main_progress_bar = mel.eval('$tmp = $gMainProgressBar')
-        cmds.progressBar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
-                         status='Starting up ...', maxValue=max_value)
-        paths = {}
-        for (dirpath, dirnames, filenames) in os.walk(absolute_path):
-            for file in filenames:
-                dirpath = dirpath.replace('\\', '/')
-                if '.xml' in file:
-                    key = '%s/%s/%s' % (dirpath.split('/')[-2], dirpath.split('/')[-1], file)
-                    full_path = '%s/%s' % (dirpath, file)
-                    paths[key] = full_path
-        for selection in sel:
-            cmds.waitCursor(st=True)
-            path_in = None
-            if cmds.progressBar(g_main_progress_bar, query=True, isCancelled=True):
-                break
-            # Find out whether we need to specify and object or not.
-            if '.xml' in absolute_path:
-                path_in = '/%s' % absolute_path.rsplit('/', 1)[1]
-                absolute_path = absolute_path.rsplit('/', 1)[0]
-            else:
-                try:
-                    key = '%s/%s/%s.xml' % (
-                        selection.split('|')[-3], selection.split('|')[-2], selection.split('|')[-1])
-                    path = paths[key]
-                    absolute_path = path.rsplit('/', 1)[0]
-                    path_in = '/%s' % path.rsplit('/', 1)[1]
-                except KeyError:
-                    short_name = selection.split('|')[-1]
-                    for key in paths.keys():
-                        if short_name in key:
-                            if not repath_auto:
-                                autopath_result = cmds.confirmDialog(t='Path Not Found',
-                                                                     m='I could not find a file corresponding to:\n\n %s\n\n Would you like to use:\n\n %s?' % (
-                                                                         selection[1:].replace('|', '/'), key),
-                                                                     button=['Yes', 'Yes to All', 'No',
-                                                                             'No to All'],
-                                                                     cancelButton='No')
-
-                            if 'Yes' in autopath_result:
-                                path = paths[key]
-                                absolute_path = path.rsplit('/', 1)[0]
-                                path_in = '/%s' % path.rsplit('/', 1)[1]
-                                if autopath_result == 'Yes to All':
+        g_main_progress_bar = self.main_progress_bar()
+        self.progress_bar(g_main_progress_bar, edit=True, beginProgress=True, isInterruptable=True,
+                          status='Starting up ...', maxValue=max_value)
+        # Runs even when the generator is closed early, as a cancelled background job is.
+        try:
+            # The saved index of the weights root only re-lists folders that changed since the last run.
+            for event in self.index_steps(absolute_path):
+                if event.get('state') == 'finished':
+                    index = event['result']
+                else:
+                    yield event
+            paths = index.paths()
+            # In the background files that don't mirror the scene hierarchy are skipped rather than asked about.
+            repath_auto = self.background
+            autopath_result = 'No to All'
+            for selection in sel:
+                yield {'state': 'resolving', 'mesh': selection}
+                self.wait_cursor(st=True)
+                path_in = None
+                if self.progress_bar(g_main_progress_bar, query=True, isCancelled=True):
+                    self.wait_cursor(st=False)
+                    break
+                # Find out whether we need to specify and object or not.
+                if '.xml' in absolute_path:
+                    path_in = '/%s' % absolute_path.rsplit('/', 1)[1]
+                    absolute_path = absolute_path.rsplit('/', 1)[0]
+                else:
+                    path = index.lookup(selection)
+                    if path is not None:
+                        absolute_path = path.rsplit('/', 1)[0]
+                        path_in = '/%s' % path.rsplit('/', 1)[1]
+                    else:
+                        short_name = selection.split('|')[-1]
+                        for key in index.candidates(short_name):
+                            if short_name in key:
+                                if not repath_auto:
+                                    autopath_result = cmds.confirmDialog(
+                                        t='Path Not Found',
+                                        m='I could not find a file corresponding to:\n\n %s\n\n Would you like to use:\n\n %s?' % (
+                                            selection[1:].replace('|', '/'), key),
+                                        button=['Yes', 'Yes to All', 'No', 'No to All'],
+                                        cancelButton='No')
+
+                                if 'Yes' in autopath_result:
+                                    path = paths[key]
+                                    absolute_path = path.rsplit('/', 1)[0]
+                                    path_in = '/%s' % path.rsplit('/', 1)[1]
+                                    if autopath_result == 'Yes to All':
+                                        repath_auto = True
+                                elif autopath_result == 'No to All':
                                     repath_auto = True
-                            elif autopath_result == 'No to All':
-                                repath_auto = True
-                                break
-                            else:
-                                continue
-            if path_in is None:
-                continue
-            if os.path.exists(absolute_path + path_in):
-                # Check if file is readable
-                if os.access(absolute_path + path_in, os.R_OK):
-                    pass
+                                    break
+                                else:
+                                    continue
+                if path_in is None:
+                    yield {'state': 'skipped', 'mesh': selection}
+                    continue
+                state = 'skipped'
+                if bundle_utils.exists(absolute_path + path_in):
+                    # Check if file is readable
+                    if os.access(bundle_utils.real_path(absolute_path + path_in), os.R_OK):
+                        pass
+                    else:
+                        cmds.warning('%s%s not readable. Check Permissions' % (absolute_path, path_in))
+                        self.wait_cursor(st=False)
+                        yield {'state': 'failed', 'mesh': selection, 'path': absolute_path + path_in}
+                        continue
+                    joints = [x for x in self.check_weights(path=absolute_path + path_in) if cmds.objExists(x)]
+                    # If there are joints in the scene attempt to bind to them.
+                    if len(joints) > 0:
+                        try:
+                            cmds.skinCluster(joints, selection, bm=0, omi=False, sm=0, tsb=True, nw=1,
+                                             ihs=True)
+                            state = 'done'
+                        except RuntimeError:
+                            cmds.warning('Could not skin %s' % selection)
+                            state = 'failed'
+
                 else:
-                    cmds.warning('%s%s not readable. Check Permissions' % (absolute_path, path_in))
-                    cmds.waitCursor(st=False)
+                    self.wait_cursor(st=False)
+                    yield {'state': 'failed', 'mesh': selection, 'path': absolute_path + path_in}
                     continue
-                joints = [x for x in self.check_weights(path=absolute_path + path_in) if cmds.objExists(x)]
-                # If there are joints in the scene attempt to bind to them.
-                if len(joints) > 0:
-                    try:
-                        cmds.skinCluster(joints, selection, bm=0, omi=False, sm=0, tsb=True, nw=1,
-                                         ihs=True)
-                    except RuntimeError:
-                        cmds.warning('Could not skin %s' % selection)
+                self.progress_bar(g_main_progress_bar, edit=True, step=1)
+                self.wait_cursor(st=False)
+                yield {'state': state, 'mesh': selection, 'path': absolute_path + path_in}
+        finally:
+            self.wait_cursor(st=False)
+            self.progress_bar(g_main_progress_bar, edit=True, endProgress=True)
+        yield {'state': 'finished', 'result': None}
 
-            else:
-                cmds.waitCursor(st=False)
-                continue
-            cmds.progressBar(g_main_progress_bar, edit=True, step=1)
-            cmds.waitCursor(st=False)
-        else:
-            cmds.progressBar(g_main_progress_bar, edit=True, endProgress=True)
\ No newline at end of file
+    @trace_utils.traced()
+    def diff_weights(self, old_path, new_path, write_path=None, tolerance=0.0):
+        '''
+        Compares two weights files of the same mesh and prints what changed between them. Only the weights that
+        changed are kept, so the delta can be written out and applied with import_delta instead of shipping and
+        importing the whole new file.
+        :param old_path:
+        :param new_path:
+        :param write_path: where to write the delta, ending in .gz to compress it. Nothing is written if None.
+        :param tolerance: how far apart two weights may be and still count as the same.
+        :return: the delta, see utils.delta_utils
+        '''
+        for path in (old_path, new_path):
+            if not bundle_utils.exists(path):
+                cmds.error('%s not found.' % path)
+        try:
+            delta = delta_utils.diff_files(old_path, new_path, tolerance, reader=self.read_columns)
+        except (IOError, OSError, ValueError, et.ParseError) as e:
+            cmds.error('Could not compare %s and %s: %s' % (old_path, new_path, e))
+        self.report_delta(delta, write_path)
+        return delta
+
+    @trace_utils.traced()
+    def export_delta(self, base_path, item=None, write_path=None, tolerance=0.0):
+        '''
+        Compares the current weights of item against a weights file exported from it earlier, without writing a new
+        file, and writes just the weights that changed. The weights are compared at the precision files hold them.
+        :param base_path: the earlier weights file.
+        :param item: mesh or skinCluster, the selection if None.
+        :param write_path: where to write the delta, base_path with a .wdelta extension if None.
+        :param tolerance:
+        :return: the delta
+        '''
+        deformer = self.delta_deformer(item)
+        if write_path is None:
+            write_path = os.path.splitext(compress_utils.plain_path(base_path))[0] + delta_utils.EXTENSION
+        try:
+            data = skin_utils.get_export_data(deformer)
+            delta = delta_utils.diff_columns(self.read_columns(base_path), export_utils.file_columns(data),
+                                             tolerance, deformer, data['shape'])
+        except (IOError, OSError, ValueError, et.ParseError) as e:
+            cmds.error('Could not compare %s against %s: %s' % (deformer, base_path, e))
+        self.report_delta(delta, write_path)
+        return delta
+
+    @trace_utils.traced()
+    def import_delta(self, path, item=None, normalize=True):
+        '''
+        Applies a delta to a skinCluster, writing only the vertices it touches with one setWeights call. The delta
+        should have been made against the weights the skinCluster has now. Note that API calls don't go on Maya's
+        undo queue.
+        :param path: the delta file.
+        :param item: mesh or skinCluster, the selection if None, or failing that the shape the delta was made from.
+        :param normalize: normalize the vertices the delta touches.
+        :return: {'deformer', 'entries': weights changed, 'vertices': vertices written, 'seconds'}
+        '''
+        start_time = timer()
+        try:
+            delta = delta_utils.read_delta(path)
+        except (IOError, OSError, ValueError) as e:
+            cmds.error('Could not read %s: %s' % (path, e))
+        deformer = self.delta_deformer(item, delta['shape'])
+        matrix, influences = skin_utils.get_weights(deformer)
+        try:
+            matrix, vertices = delta_utils.apply_delta(matrix, influences, delta)
+        except ValueError as e:
+            cmds.error('Could not apply %s to %s: %s' % (path, deformer, e))
+        if len(vertices) > 0:
+            rows = math_utils.to_matrix(math_utils.flatten(matrix, vertices), len(influences))
+            if normalize:
+                rows = math_utils.normalize_rows(rows, import_utils.NORMALIZE_TOLERANCE)[0]
+            with self.tracer.span('set_weights', mesh=deformer):
+                skin_utils.set_rows(deformer, math_utils.flatten(rows), vertices)
+        result = {'deformer': deformer, 'entries': delta_utils.stats(delta)['entries'], 'vertices': len(vertices),
+                  'seconds': timer() - start_time}
+        print ('Applied %s weights on %s vertices of %s in %s seconds.' % (result['entries'], result['vertices'],
+                                                                        deformer, result['seconds']))
+        return result
+
+    def delta_deformer(self, item=None, shape=None):
+        '''
+        Finds the skinCluster a delta is made from or applied to.
+        :param item: mesh or skinCluster, the selection if None.
+        :param shape: looked for when nothing is given or selected.
+        :return:
+        '''
+        if item is None:
+            sel = cmds.ls(sl=True, l=True)
+            item = sel[0] if sel else shape
+        if item is None:
+            cmds.error('Nothing selected.')
+        if cmds.objExists(item) and cmds.objectType(item) == 'skinCluster':
+            return item
+        deformer = self.reset_resolver().find(item) if cmds.objExists(item) else None
+        if deformer is None:
+            cmds.error('No skinCluster found on %s.' % item)
+        return deformer
+
+    def report_delta(self, delta, write_path=None):
+        '''
+        Prints what a delta changes and writes it if write_path is given.
+        :param delta:
+        :param write_path:
+        :return:
+        '''
+        counts = delta_utils.stats(delta)
+        print ('%s weights changed on %s vertices over %s joints.' % (counts['entries'], counts['vertices'],
+                                                                   counts['joints']))
+        for key in ('added', 'removed'):
+            if delta[key]:
+                print ('Joints %s: %s' % (key, ', '.join(delta[key])))
+        if write_path is not None:
+            try:
+                print ('Wrote %s' % delta_utils.write_delta(write_path, delta))
+            except (IOError, OSError) as e:
+                cmds.warning('Could not write %s: %s' % (write_path, e))
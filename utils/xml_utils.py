@@ -0,0 +1,530 @@
+import xml.etree.ElementTree as et
+from xml.sax.saxutils import escape, unescape
+from array import array
+import io
+import mmap
+import os
+import re
+from utils import bundle_utils
+from utils import compress_utils
+
+'''
+Streaming helpers for Maya's deformerWeights XML files. Nothing in here needs Maya, so these functions can be used
+from mayapy, a farm job or a plain python interpreter.
+
+A deformerWeights file looks roughly like this:
+
+<deformerWeights>
+  <headerInfo fileName="..." worldMatrix="..."/>
+  <shape name="..." group="..." stride="3" size="..." max="...">
+    <point index="0" value=" 0.000 0.000 0.000"/>
+  </shape>
+  <weights deformer="..." source="joint1" shape="..." layer="0" defaultValue="0.000" size="..." max="...">
+    <point index="0" value="1.000"/>
+  </weights>
+</deformerWeights>
+
+Files are never loaded as a tree. iter_elements reads one top level element at a time and hands out its points as
+an iterator that pulls them from the parser as it goes, so a reader holds one point rather than a whole 500k vertex
+influence, and memory stays flat however big the file is.
+'''
+
+
+def _xml_declaration():
+    '''
+    Returns whatever ElementTree.write(path, xml_declaration=True) puts in front of the root on this interpreter.
+    Python 2 writes nothing here while Python 3 writes a us-ascii declaration, and files we rewrite need to match.
+    :return:
+    '''
+    stream = io.BytesIO()
+    et.ElementTree(et.Element('_')).write(stream, xml_declaration=True)
+    return stream.getvalue().split(b'<_ />')[0]
+
+
+XML_DECLARATION = _xml_declaration()
+# A point of a rebuilt weights element, as ElementTree writes it.
+_POINT_TAG = '<point index="%s" value="%s" />'
+_ATTRIBUTE_ENTITIES = {'"': '&quot;', '\n': '&#10;'}
+_WEIGHTS_TAG = b'<weights'
+_ATTRIBUTE = re.compile(br'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_ENTITIES = {'&quot;': '"', '&apos;': "'"}
+# Header scans keyed by (path, mtime, size).
+_header_cache = {}
+
+
+def read_joints(path):
+    '''
+    Returns the source joint of every weights element in path, in file order.
+    :param path:
+    :return:
+    '''
+    return [x.get('source') for x in read_headers(path)]
+
+
+def read_headers(path):
+    '''
+    Returns the attributes of every weights element in path without parsing the file. The file is memory mapped (or
+    streamed if it is compressed) and only the start tag of each weights element is read, the point children are
+    never looked at. Results are cached against the path, modification time and size of the file (of the bundle for
+    a bundle member).
+    :param path:
+    :return:
+    '''
+    stat = bundle_utils.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    if key not in _header_cache:
+        _header_cache[key] = _scan_headers(path, stat.st_size)
+    return [dict(x) for x in _header_cache[key]]
+
+
+def clear_header_cache():
+    '''
+    Forgets every cached header scan.
+    :return:
+    '''
+    _header_cache.clear()
+
+
+def _scan_headers(path, size):
+    '''
+    Finds each weights start tag with mmap.find and reads its attributes. Compressed files and bundle members can't be
+    mapped and are scanned a block at a time as they are read instead.
+    :param path:
+    :param size:
+    :return:
+    '''
+    headers = []
+    if size == 0:
+        return headers
+    if compress_utils.is_packed(path):
+        with compress_utils.open_read(path) as stream:
+            _scan_stream(stream, headers)
+        return headers
+    with open(path, 'rb') as input_file:
+        data = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _scan_tags(data, headers)
+        finally:
+            data.close()
+    return headers
+
+
+def _scan_stream(stream, headers):
+    '''
+    Scans a stream block by block, carrying a tag cut off at the end of one block over to the next.
+    :param stream:
+    :param headers:
+    :return:
+    '''
+    carry = b''
+    while True:
+        block = stream.read(compress_utils.BLOCK_SIZE)
+        if not block:
+            break
+        data = carry + block
+        unfinished = _scan_tags(data, headers)
+        if unfinished is not None:
+            carry = data[unfinished:]
+        else:
+            # Too short to hold a whole tag name, so nothing in it has been read yet.
+            carry = data[-(len(_WEIGHTS_TAG) - 1):]
+
+
+def _scan_tags(data, headers):
+    '''
+    Appends the attributes of every weights start tag in data to headers.
+    :param data: bytes or mmap
+    :param headers:
+    :return: the position of a start tag with no end in data, or None.
+    '''
+    position = data.find(_WEIGHTS_TAG)
+    while position != -1:
+        end = data.find(b'>', position)
+        if end == -1:
+            return position
+        tag = data[position + len(_WEIGHTS_TAG):end]
+        # Skip lookalike tags such as <weightsFoo>.
+        if not tag or tag[:1].isspace() or tag[:1] in (b'/', b'>'):
+            attrib = {}
+            for match in _ATTRIBUTE.finditer(tag):
+                value = match.group(2) if match.group(2) is not None else match.group(3)
+                attrib[_text(match.group(1))] = unescape(_text(value), _ENTITIES)
+            headers.append(attrib)
+        position = data.find(_WEIGHTS_TAG, end)
+    return None
+
+
+def remap_xml(source, target, path, write_path, index=None):
+    '''
+    Remaps weights from one XML to another based on two lists of equal size, streaming the result to write_path.
+    If a source and target element are equal (source = ['foo'], target = ['foo']) an empty subelement is created.
+    Joints in source but not in target are removed, and the weights of source joints are summed into their targets.
+    The file is read twice with iterparse, once to index the point maps of the joints involved and once to write the
+    output, so only one top level element is held in memory at a time. A prebuilt index (see
+    binary_utils.BinaryWeights.remap_index) skips the first pass.
+    :param source:
+    :param target:
+    :param path:
+    :param write_path:
+    :param index:
+    :return:
+    '''
+    if index is None:
+        index = _index_weights(path, set(source) | set(target))
+    shape, deformer, points, present = index
+    rewrites, appended = _plan_remap(source, target, shape, deformer, points, present)
+    # Joints that are remapped away are only dropped if something was actually remapped.
+    if any(target[source.index(joint)] != joint for joint in source):
+        dropped = set([x for x in source if x not in target])
+    else:
+        dropped = set()
+    with compress_utils.open_write(write_path) as output:
+        _write_remapped(path, output, rewrites, appended, dropped)
+    return write_path
+
+
+def iter_elements(path):
+    '''
+    Lazy reader over the top level elements of path, in file order. Yields (tag, attributes, points), points being an
+    iterator over the (index, value text) of the element's point children that reads them from the file as it is
+    advanced. Points left unread when the next element is asked for are skipped. Each point is thrown away once it
+    has been read and each element once it ends.
+    :param path:
+    :return:
+    '''
+    events = compress_utils.iterparse(path, events=('start', 'end'))
+    root = None
+    for event, elem in events:
+        if root is None:
+            root = elem
+            continue
+        if event == 'end':
+            # Only the root ends out here, the points iterator sees every other end.
+            break
+        points = _points(events, elem)
+        yield elem.tag, elem.attrib, points
+        for _ in points:
+            pass
+        # Its points are gone already, and its attributes may still be in use.
+        root.remove(elem)
+
+
+def iter_weights(path):
+    '''
+    iter_elements for just the weights elements.
+    :param path:
+    :return: (attributes, points) per weights element.
+    '''
+    for tag, attributes, points in iter_elements(path):
+        if tag == 'weights':
+            yield attributes, points
+
+
+def read_column(points):
+    '''
+    Reads a points iterator (see iter_elements) into an (indices, values) pair of arrays.
+    :param points:
+    :return:
+    '''
+    column = (array('i'), array('d'))
+    for index, value in points:
+        column[0].append(index)
+        column[1].append(float(value))
+    return column
+
+
+def _points(events, parent):
+    '''
+    Pulls the children of parent off the iterparse events, up to the end of parent, dropping each as it goes.
+    :param events:
+    :param parent:
+    :return:
+    '''
+    depth = 0
+    for event, elem in events:
+        if event == 'start':
+            depth += 1
+            continue
+        if depth == 0:
+            return
+        depth -= 1
+        if depth == 0:
+            yield int(elem.get('index')), elem.get('value')
+            parent.remove(elem)
+
+
+def read_columns(path):
+    '''
+    Reads every weights element of path in one lazy pass (see iter_elements).
+    :param path:
+    :return: (joints in file order, an (indices, values) pair of arrays per joint, the vertex count from the shape
+     element or None if the file has no shape element)
+    '''
+    joints = []
+    columns = []
+    vertex_count = None
+    for tag, attributes, points in iter_elements(path):
+        if tag == 'shape' and attributes.get('size') is not None:
+            vertex_count = int(attributes['size'])
+        elif tag == 'weights':
+            joints.append(attributes.get('source'))
+            columns.append(read_column(points))
+    return joints, columns, vertex_count
+
+
+def read_positions(path):
+    '''
+    Reads the shape positions of path, stopping as soon as the shape element ends (deformerWeights writes it before
+    the weights).
+    :param path:
+    :return: (vertex ids, flat x, y, z values) arrays, both empty if the file has no shape positions.
+    '''
+    ids = array('i')
+    values = array('d')
+    elements = iter_elements(path)
+    for tag, attributes, points in elements:
+        if tag == 'shape':
+            for index, value in points:
+                ids.append(index)
+                values.extend([float(x) for x in value.split()])
+            break
+        if tag == 'weights':
+            break
+    elements.close()
+    return ids, values
+
+
+def _text(data):
+    # Attribute values stay str on Python 2, like ElementTree returns them for ascii text.
+    if str is bytes:
+        return data
+    return data.decode('utf-8')
+
+
+def _escape_text(text):
+    # Text between elements, written the way ElementTree.tostring writes it.
+    return escape(text).encode('ascii', 'xmlcharrefreplace')
+
+
+def _index_weights(path, joints):
+    '''
+    Single lazy pass over path (see iter_elements). Collects the deformer and shape names, the point maps of the given
+    joints and the names of every weights element in the file. The points of other joints are skipped unread.
+    :param path:
+    :param joints:
+    :return:
+    '''
+    shape = None
+    deformer = None
+    points = {}
+    present = set()
+    for tag, attributes, element_points in iter_elements(path):
+        # The first element carrying these attributes is the first weights element.
+        if deformer is None and attributes.get('deformer') is not None:
+            deformer = attributes['deformer']
+        if shape is None and attributes.get('shape') is not None:
+            shape = attributes['shape']
+        if tag == 'weights':
+            joint = attributes.get('source')
+            present.add(joint)
+            if joint in joints:
+                joint_points = points.setdefault(joint, {})
+                for index, value in element_points:
+                    joint_points[index] = value
+    return shape, deformer, points, present
+
+
+def _plan_remap(source, target, shape, deformer, points, present):
+    '''
+    Works out the final point map of every weights element that gets rewritten, and the attributes of the empty
+    weights elements that need to be appended. Joints are processed in the same order the ElementTree implementation
+    used, so sums and max values come out identical.
+    :param source:
+    :param target:
+    :param shape:
+    :param deformer:
+    :param points:
+    :param present:
+    :return:
+    '''
+    rewrites = {}
+    appended = []
+    # The deformerWeights command looks for the highest index value as an attribute.
+    # We keep an eye out for that as we loop through.
+    highest_index = 0
+    for joint in source:
+        goal = target[source.index(joint)]
+        merged = {}
+        if goal != joint:
+            source_index = points.get(joint, {})
+            target_index = points.get(goal, {})
+            for index in source_index:
+                if index > highest_index:
+                    highest_index = index
+            for index in target_index:
+                if index > highest_index:
+                    highest_index = index
+            merged.update(source_index)
+            for index in target_index:
+                if index not in merged:
+                    merged[index] = target_index[index]
+                else:
+                    # Sum the values and clamp at one (shouldn't happen but may be needed for Post Normalization)
+                    value = float(merged[index]) + float(target_index[index])
+                    if value > 1:
+                        value = 1
+                    merged[index] = str(value)
+        else:
+            appended.append({'source': joint, 'max': '0', 'size': '0', 'layer': '0', 'defaultValue': '0.00',
+                             'shape': shape, 'deformer': deformer})
+            present.add(joint)
+        # Only joints with an element in the file (or just appended) receive the weights.
+        if goal in present:
+            points[goal] = merged
+            rewrites[goal] = ([(index, merged[index]) for index in sorted(merged)], str(highest_index))
+    return rewrites, appended
+
+
+def _write_remapped(path, output, rewrites, appended, dropped):
+    '''
+    Second iterparse pass. Streams path to output a point at a time, swapping in rewritten weights elements, skipping
+    dropped ones and renumbering layers as it goes.
+    :param path:
+    :param output:
+    :param rewrites:
+    :param appended:
+    :param dropped:
+    :return:
+    '''
+    output.write(XML_DECLARATION)
+    layer = [0]
+    root = None
+    head = [None]
+    # The top level element being read, whether it is copied point by point and whether its start tag is out yet.
+    current = None
+    copy = False
+    started = False
+    # A child or top level element whose tail isn't known until the next one starts.
+    point = None
+    pending = None
+    depth = 0
+
+    def open_root():
+        # The root tag is written lazily because its text is only known once the first child starts.
+        if head[0] is None:
+            head[0], _ = _split_root(root)
+            output.write(head[0])
+
+    def write_weights(attrib, points, highest_index):
+        open_root()
+        _write_rebuilt(output, attrib, points, highest_index, layer[0])
+        layer[0] += 1
+
+    def start_copy():
+        # The text of the element is only known once its first child starts, or it ends.
+        open_root()
+        output.write(_split_root(current)[0])
+
+    for event, elem in compress_utils.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if depth == 0:
+                root = elem
+            elif depth == 1:
+                if pending is not None:
+                    # Starting the next sibling sets the tail of the previous one, so it is now safe to write.
+                    if pending[1] and pending[0].tail:
+                        output.write(_escape_text(pending[0].tail))
+                    pending[0].clear()
+                    root.remove(pending[0])
+                    pending = None
+                current = elem
+                started = False
+                copy = elem.tag != 'weights' or (elem.get('source') not in dropped and
+                                                 elem.get('source') not in rewrites)
+                if copy and elem.tag == 'weights':
+                    elem.set('layer', str(layer[0]))
+                    layer[0] += 1
+            elif depth == 2 and copy:
+                if not started:
+                    start_copy()
+                    started = True
+                if point is not None:
+                    output.write(et.tostring(point))
+                    current.remove(point)
+                point = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 2 and not copy:
+            current.remove(elem)
+        elif depth == 1:
+            if copy and started:
+                if point is not None:
+                    output.write(et.tostring(point))
+                    current.remove(point)
+                    point = None
+                output.write(_split_root(current)[1])
+            elif copy:
+                # No children, let ElementTree decide how the empty element looks.
+                shell = et.Element(elem.tag, elem.attrib)
+                shell.text = elem.text
+                open_root()
+                output.write(et.tostring(shell))
+            elif elem.get('source') in rewrites:
+                write_weights(elem.attrib, *rewrites[elem.get('source')])
+            # Rewritten and dropped elements lose their tail, like they did as whole elements.
+            pending = (elem, copy)
+    if pending is not None and pending[1] and pending[0].tail:
+        output.write(_escape_text(pending[0].tail))
+    for attrib in appended:
+        write_weights(attrib, *rewrites[attrib['source']])
+    if head[0] is None:
+        # Nothing was written inside the root, so let ElementTree decide how an empty root looks.
+        shell = et.Element(root.tag, root.attrib)
+        shell.text = root.text
+        output.write(et.tostring(shell))
+    else:
+        output.write(_split_root(root)[1])
+
+
+def _split_root(root):
+    '''
+    Returns the serialized opening tag (plus text) and closing tag of root, exactly as ElementTree would write them.
+    :param root:
+    :return:
+    '''
+    shell = et.Element(root.tag, root.attrib)
+    shell.text = root.text
+    et.SubElement(shell, '_')
+    head, tail = et.tostring(shell).split(b'<_ />')
+    return head, tail
+
+
+def _write_rebuilt(output, attrib, points, highest_index, layer):
+    '''
+    Writes a fresh weights element with the given attributes and points, a point at a time, exactly as ElementTree
+    would write it built as a whole.
+    :param output:
+    :param attrib:
+    :param points:
+    :param highest_index:
+    :param layer:
+    :return:
+    '''
+    weight = et.Element('weights', dict(attrib))
+    weight.set('size', str(len(points)))
+    weight.set('max', highest_index)
+    weight.set('layer', str(layer))
+    if len(points) == 0:
+        output.write(et.tostring(weight))
+        return
+    head, tail = _split_root(weight)
+    output.write(head)
+    block = []
+    for index, value in points:
+        block.append(_POINT_TAG % (index, escape(str(value), _ATTRIBUTE_ENTITIES)))
+        if len(block) == 4096:
+            output.write(''.join(block).encode('ascii', 'xmlcharrefreplace'))
+            block = []
+    output.write(''.join(block).encode('ascii', 'xmlcharrefreplace'))
+    output.write(tail)
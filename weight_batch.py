@@ -0,0 +1,267 @@
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+from timeit import default_timer as timer
+
+'''
+Headless batch export and import, for mayapy on a farm or build machine:
+
+    mayapy -m weight_batch export --root /weights --scenes a.ma b.ma --overwrite all
+    mayapy -m weight_batch import --root /weights --scene-list scenes.txt --method index --remap-plan rename --save
+
+Every scene goes through the one interpreter, so Maya only starts once. Nothing asks questions: existing files are
+dealt with by --overwrite and joints missing from a skinCluster by --remap-plan (see utils.remap_utils), anything
+else that would need an answer is skipped. A JSON summary of every scene is written to --summary, or stdout, and the
+exit code is 1 if a scene failed.
+
+The weight_tools folder has to be on the path (run from it, or add it to PYTHONPATH).
+'''
+
+METHODS = ['index', 'nearest', 'over', 'barycentric', 'bilinear']
+OVERWRITE = {'all': True, 'none': False}
+NORMALIZE = ['auto', 'validate', 'none', 'skinPercent']
+
+
+def initialize():
+    '''
+    Starts Maya in this interpreter, unless it is already running or there is no maya.standalone (the stand-in in
+    stubs/).
+    :return:
+    '''
+    try:
+        import maya.standalone
+    except ImportError:
+        return
+    try:
+        maya.standalone.initialize(name='python')
+    except RuntimeError:
+        # Already running.
+        pass
+
+
+def read_scene_list(path):
+    '''
+    Reads a file of scene paths, one per line. Blank lines and lines starting with # are ignored.
+    :param path:
+    :return:
+    '''
+    with open(path) as input_file:
+        lines = [x.strip() for x in input_file]
+    return [x for x in lines if x and not x.startswith('#')]
+
+
+def skinned_items(tools, patterns=None):
+    '''
+    Returns the long names of the transforms in the open scene that have a skinned mesh, optionally only those whose
+    long or short name matches one of patterns.
+    :param tools:
+    :param patterns: fnmatch patterns, e.g. '*body*'
+    :return:
+    '''
+    import maya.cmds as cmds
+    resolver = tools.reset_resolver()
+    items = []
+    for shape in cmds.ls(type='mesh', l=True) or []:
+        parent = shape.rsplit('|', 1)[0]
+        if parent in items or resolver.find(shape) is None:
+            continue
+        if patterns and not any(fnmatch.fnmatch(parent, x) or fnmatch.fnmatch(parent.rsplit('|', 1)[-1], x)
+                                for x in patterns):
+            continue
+        items.append(parent)
+    return items
+
+
+def bundle_path(root, scene):
+    '''
+    Returns the bundle the weights of scene go in with --bundle: root/<scene name>.wbundle
+    :param root:
+    :param scene:
+    :return:
+    '''
+    from utils import bundle_utils
+    return '%s/%s%s' % (root, os.path.splitext(os.path.basename(scene))[0], bundle_utils.EXTENSION)
+
+
+def export_scene(tools, items, root, overwrite, parallel=False, workers=None, incremental=False, compress=False,
+                 threshold=None, max_influences=None):
+    '''
+    Exports items under root, mirroring the scene hierarchy, or into root if it is a bundle (see utils.bundle_utils).
+    :param tools:
+    :param items:
+    :param root:
+    :param overwrite: see WeightTools.weight_export
+    :param parallel:
+    :param workers:
+    :param incremental: skip meshes whose skin hasn't changed since the last export (see utils.manifest_utils)
+    :param compress: write gzip compressed files (see utils.compress_utils)
+    :param threshold: leave weights below this out of the files (see utils.export_utils.sparsify)
+    :param max_influences: keep at most this many weights per vertex in the files
+    :return: summary from WeightTools.weight_export, or None if there was nothing to do.
+    '''
+    from utils import bundle_utils
+    from utils import compress_utils
+    if len(items) == 1 and not bundle_utils.is_bundle(root):
+        # weight_export takes a single item's path as the file to write.
+        file_path = '%s/%s.xml' % (root, items[0][1:].replace('|', '/').replace(':', '_'))
+        if compress:
+            file_path = compress_utils.compressed_path(file_path)
+        if compress_utils.existing(file_path) is not None and overwrite is False:
+            print ('Keeping %s' % file_path)
+            return {'items': 1, 'written': [], 'unchanged': [], 'seconds': 0.0, 'resolve_seconds': 0.0, 'sparse': None}
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        return tools.weight_export(path=file_path, items=items, overwrite=overwrite, incremental=incremental,
+                                   threshold=threshold, max_influences=max_influences)
+    return tools.weight_export(path=root, items=items, parallel=parallel, workers=workers, overwrite=overwrite,
+                               incremental=incremental, compress=compress, threshold=threshold,
+                               max_influences=max_influences)
+
+
+def process_scene(tools, action, scene, args, plan=None):
+    '''
+    Opens a scene and exports or imports the weights of its skinned meshes.
+    :param tools:
+    :param action: 'export' or 'import'
+    :param scene:
+    :param args: parsed command line
+    :param plan: remap plan for imports
+    :return: summary of the scene
+    '''
+    import maya.cmds as cmds
+    record = {'scene': scene, 'action': action, 'status': 'ok', 'error': None, 'items': [], 'result': None}
+    start_time = timer()
+    try:
+        cmds.file(scene, open=True, force=True)
+        items = skinned_items(tools, args.items)
+        root = bundle_path(args.root, scene) if args.bundle else args.root
+        record['root'] = root
+        record['items'] = items
+        if len(items) == 0:
+            record['status'] = 'empty'
+        elif action == 'export':
+            record['result'] = export_scene(tools, items, root, OVERWRITE[args.overwrite], args.parallel,
+                                            args.workers, args.incremental, args.compress, args.threshold,
+                                            args.max_influences)
+        else:
+            record['result'] = tools.weight_import(path=root, items=items, method=args.method,
+                                                   remap_plan=plan, interactive=False, neighbours=args.neighbours,
+                                                   normalize=args.normalize)
+            if args.save:
+                cmds.file(save=True, force=True)
+    # One bad scene shouldn't take the rest of the batch down with it.
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = '%s: %s' % (type(e).__name__, e)
+    record['seconds'] = timer() - start_time
+    return record
+
+
+def run(action, scenes, args):
+    '''
+    Processes every scene in turn.
+    :param action:
+    :param scenes:
+    :param args:
+    :return: summary of the batch
+    '''
+    import maya.cmds as cmds
+    from utils import remap_utils
+    from utils.weight_utils import WeightTools
+    tools = WeightTools()
+    plan = remap_utils.get_plan(args.remap_plan) if action == 'import' else None
+    tracing = args.trace or args.chrome_trace or args.profile
+    if tracing:
+        tools.tracer.start(profile=bool(args.profile))
+    started = time.strftime('%Y-%m-%dT%H:%M:%S')
+    start_time = timer()
+    records = []
+    for scene in scenes:
+        print ('%s %s' % (action.capitalize() + 'ing', scene))
+        with tools.tracer.span('scene', scene=scene):
+            records.append(process_scene(tools, action, scene, args, plan))
+            cmds.file(new=True, force=True)
+    summary = {'action': action,
+               'root': args.root,
+               'started': started,
+               'seconds': timer() - start_time,
+               'failed': len([x for x in records if x['status'] == 'failed']),
+               'scenes': records}
+    if tracing:
+        tools.tracer.stop()
+        summary['trace'] = save_trace(tools.tracer, args)
+    return summary
+
+
+def save_trace(tracer, args):
+    '''
+    Writes the trace of a batch wherever the command line asked for it.
+    :param tracer:
+    :param args:
+    :return: {'files': paths written, 'summary': seconds by span name}
+    '''
+    files = []
+    if args.trace:
+        files.append(tracer.save(args.trace))
+    if args.chrome_trace:
+        files.append(tracer.save_chrome(args.chrome_trace))
+    if args.profile:
+        files.append(tracer.save_profile(args.profile))
+    return {'files': files, 'summary': tracer.summary()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='mayapy -m weight_batch',
+                                     description='Export or import skin weights for a list of scenes without a UI.')
+    parser.add_argument('action', choices=['export', 'import'])
+    parser.add_argument('--root', required=True, help='weights folder the scene hierarchy is mirrored under')
+    parser.add_argument('--scenes', nargs='*', default=[], help='scene files')
+    parser.add_argument('--scene-list', help='file listing scene files, one per line')
+    parser.add_argument('--items', nargs='*', help='only meshes whose name matches one of these patterns')
+    parser.add_argument('--method', choices=METHODS, default='index', help='how imported weights are applied')
+    parser.add_argument('--neighbours', type=int, default=1,
+                        help='exported vertices blended by inverse distance with --method nearest')
+    parser.add_argument('--normalize', choices=NORMALIZE, default='auto',
+                        help='auto normalizes imported weights in memory or in one bulk pass, validate only reports '
+                             'vertices that do not sum to one')
+    parser.add_argument('--remap-plan', help='name or path of the remap plan for joints missing from skinClusters')
+    parser.add_argument('--overwrite', choices=sorted(OVERWRITE), default='all', help='existing files on export')
+    parser.add_argument('--parallel', action='store_true', help='write exported files on a process pool')
+    parser.add_argument('--workers', type=int, help='writer processes for --parallel')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip meshes whose weights are unchanged since their file was exported')
+    parser.add_argument('--compress', action='store_true', help='write exported files gzip compressed (.xml.gz)')
+    parser.add_argument('--threshold', type=float, help='leave exported weights below this out, renormalizing')
+    parser.add_argument('--max-influences', type=int, help='export at most this many weights per vertex')
+    parser.add_argument('--bundle', action='store_true',
+                        help='keep the weights of each scene in one <scene name>.wbundle file under --root')
+    parser.add_argument('--save', action='store_true', help='save each scene after importing')
+    parser.add_argument('--summary', help='write the JSON summary here instead of stdout')
+    parser.add_argument('--trace', help='write timing spans for every stage and mesh here as JSON')
+    parser.add_argument('--chrome-trace', help='write the timing spans here in Chrome trace format')
+    parser.add_argument('--profile', help='write cProfile statistics for the batch here')
+    args = parser.parse_args(argv)
+    args.root = args.root.replace('\\', '/').rstrip('/')
+    scenes = list(args.scenes)
+    if args.scene_list:
+        scenes.extend(read_scene_list(args.scene_list))
+    if len(scenes) == 0:
+        parser.error('No scenes given.')
+    if args.action == 'import' and not os.path.isdir(args.root):
+        parser.error('%s is not a folder.' % args.root)
+    initialize()
+    summary = run(args.action, scenes, args)
+    text = json.dumps(summary, indent=2, sort_keys=True)
+    if args.summary:
+        with open(args.summary, 'w') as output:
+            output.write(text)
+    else:
+        print (text)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
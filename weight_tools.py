@@ -1,5 +1,6 @@
 from PySide2 import QtGui, QtCore, QtWidgets
 from utils.weight_utils import WeightTools
+from utils import async_utils
 from shiboken2 import wrapInstance
 import ui.main_window as main_window
 import maya.OpenMayaUI as omui
@@ -22,6 +23,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.weight_export.clicked.connect(self.weight_export)
         self.ui.bind_from_file.clicked.connect(self.bind_to_file)
         self.ui.weight_import.clicked.connect(self.weight_import)
+        self.ui.cancel.clicked.connect(self.cancel_job)
+        # Background jobs run from Maya's idle events, a slice at a time, so the scene stays usable while they run.
+        self.idle_queue = async_utils.IdleQueue()
+        self.job = None
+        self.items = {}
 
     def show_window(self):
         parent = getMayaWindow()
@@ -30,15 +36,72 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def weight_export(self):
         wt= WeightTools()
-        wt.weight_export(path=None, batch=self.ui.batch_mode.isChecked())
+        self.run_job('Export', wt, wt.export_steps(path=None, batch=self.ui.batch_mode.isChecked()))
 
     def weight_import(self):
         wt= WeightTools()
-        wt.weight_import(path=None, batch=self.ui.batch_mode.isChecked())
+        self.run_job('Import', wt, wt.import_steps(path=None, batch=self.ui.batch_mode.isChecked()))
 
     def bind_to_file(self):
         wt= WeightTools()
-        wt.bind_from_file(path=None,batch=self.ui.batch_mode.isChecked())
+        self.run_job('Bind', wt, wt.bind_steps(path=None, batch=self.ui.batch_mode.isChecked()))
+
+    def run_job(self, name, tools, steps):
+        '''
+        Runs a generator of steps in the background when the Background box is checked, otherwise to the end before
+        returning. Either way each mesh shows up in the status list as it is worked on.
+        :param name:
+        :param tools: the WeightTools the steps belong to.
+        :param steps:
+        :return:
+        '''
+        if self.job is not None and not self.job.finished:
+            self.statusBar().showMessage('%s is still running.' % self.job.name)
+            return
+        self.ui.mesh_status.clear()
+        self.items = {}
+        tools.background = self.ui.background.isChecked()
+        self.job = async_utils.Job(name, steps, self.idle_queue, on_status=self.show_status, on_done=self.job_done)
+        if tools.background:
+            self.ui.cancel.setEnabled(True)
+            self.job.start()
+        else:
+            self.job.run()
+
+    def show_status(self, job, event):
+        mesh = event.get('mesh')
+        if mesh is not None:
+            item = self.items.get(mesh)
+            if item is None:
+                item = QtWidgets.QTreeWidgetItem(self.ui.mesh_status, [mesh.rsplit('|', 1)[-1], ''])
+                item.setToolTip(0, mesh)
+                self.items[mesh] = item
+            item.setText(1, event['state'])
+            if event.get('path'):
+                item.setToolTip(1, event['path'])
+            self.ui.mesh_status.scrollToItem(item)
+        done = sum([job.counts.get(x, 0) for x in ('done', 'skipped', 'failed')])
+        self.statusBar().showMessage('%s: %s/%s meshes, %s failed, %.1f meshes/s' % (
+            job.name, done, len(self.items), job.counts.get('failed', 0), job.throughput()))
+
+    def job_done(self, job):
+        self.ui.cancel.setEnabled(False)
+        if job.error is not None:
+            self.statusBar().showMessage('%s failed: %s' % (job.name, job.error))
+        elif job.cancelled:
+            self.statusBar().showMessage('%s cancelled.' % job.name)
+        else:
+            done = sum([job.counts.get(x, 0) for x in ('done', 'skipped', 'failed')])
+            self.statusBar().showMessage('%s finished %s meshes in %.2f seconds, %s failed.' % (
+                job.name, done, job.seconds, job.counts.get('failed', 0)))
+
+    def cancel_job(self):
+        if self.job is not None:
+            self.job.cancel()
+
+    def closeEvent(self, event):
+        self.cancel_job()
+        super(MainWindow, self).closeEvent(event)
 
 
 def run():